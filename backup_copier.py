@@ -0,0 +1,210 @@
+"""
+Concurrent backups of the workbooks of a run.
+
+On network storage a backup spends its time on per-file round trips (create,
+write, set times, close) rather than on bandwidth, so a BackupCopier backs up
+several files at once on a bounded pool of threads. A file whose backup already
+matches it (same size and mtime, or the same content hash when verifying) is
+not copied again. With verify every new copy is read back and compared with its
+source by hash.
+
+ready() hands on each file of a run as soon as its own backup is done, so a run
+can start editing while the rest of the tree is still being backed up; a file
+whose backup failed is never handed on, and so never edited.
+"""
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from run_cache import file_digest
+
+END = "end"
+DEFAULT_BACKUP_THREADS = 4
+# Backups queued per thread ahead of the files being handed on
+QUEUE_PER_THREAD = 4
+# ioctl request number of Linux FICLONE (reflink a whole file)
+FICLONE = 0x40049409
+# Filesystems with whole-second timestamps (FAT: two seconds) round the mtime of a copy
+COARSE_MTIME_NS = 2_000_000_000
+
+# Outcome of one backup -> how the summary names it
+OUTCOMES = {"copy": "copied", "reflink": "reflinked", "hardlink": "hard-linked", "current": "already up to date",
+            "kept": "kept from the interrupted run"}
+
+
+def _reflink(source_file, target_file):
+    """Clone source_file into a new target_file sharing its data blocks (copy-on-write). Linux only."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(source_file, "rb") as source, open(target_file, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        if os.path.exists(target_file):
+            os.remove(target_file)
+        return False
+    shutil.copystat(source_file, target_file)
+    return True
+
+
+def snapshot_file(source_file, target_file):
+    """
+    Make target_file a snapshot of source_file without copying its data where the
+    filesystem allows it: a reflink, else a hard link, else a plain copy.
+    Returns "reflink", "hardlink" or "copy".
+    """
+    if os.path.lexists(target_file):
+        if os.path.samefile(source_file, target_file):
+            return "hardlink"
+        os.remove(target_file)
+    if _reflink(source_file, target_file):
+        return "reflink"
+    try:
+        os.link(source_file, target_file)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(source_file, target_file)
+        return "copy"
+
+
+def same_stat(source, target):
+    """True when two os.stat results have the same size and (up to filesystem rounding) the same mtime."""
+    if source.st_size != target.st_size:
+        return False
+    if source.st_mtime_ns == target.st_mtime_ns:
+        return True
+    coarse = target.st_mtime_ns % 1_000_000_000 == 0
+    return coarse and abs(source.st_mtime_ns - target.st_mtime_ns) < COARSE_MTIME_NS
+
+
+class BackupCopier:
+    """
+    Back up the .xlsx files of source_dir into the same folder structure under
+    backup_dir, "copy"ing or "snapshot"ting them (see snapshot_file) on threads.
+    With keep_existing, files that already have a backup are left alone (when
+    resuming, those backups hold the content from before the interrupted run).
+    """
+
+    def __init__(self, source_dir, backup_dir, mode="copy", threads=DEFAULT_BACKUP_THREADS, verify=False,
+                 keep_existing=False):
+        if mode not in ("copy", "snapshot"):
+            raise ValueError(f"Unknown backup mode: {mode}")
+        self.source_dir = source_dir
+        self.backup_dir = backup_dir
+        self.mode = mode
+        self.threads = max(1, threads)
+        self.verify = verify
+        self.keep_existing = keep_existing
+        self.outcomes = {}
+        self.verified = 0
+        self.failed = 0
+        # Thread time spent backing up (see run_trace)
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._folders = set()
+
+    def target_for(self, source_file):
+        return os.path.join(self.backup_dir, os.path.relpath(source_file, self.source_dir))
+
+    def _make_folder(self, folder):
+        # Under the lock, so no thread copies into a folder another one is still creating
+        with self._lock:
+            if folder not in self._folders:
+                os.makedirs(folder, exist_ok=True)
+                self._folders.add(folder)
+
+    def _current(self, source_file, target_file):
+        """True when target_file already holds the content of source_file."""
+        try:
+            source, target = os.stat(source_file), os.stat(target_file)
+        except OSError:
+            return False
+        if self.verify:
+            return source.st_size == target.st_size and file_digest(source_file) == file_digest(target_file)
+        return same_stat(source, target)
+
+    def back_up(self, source_file):
+        """Back up one file and return its outcome (a key of OUTCOMES). Raises OSError on failure."""
+        started = time.perf_counter()
+        target_file = self.target_for(source_file)
+        try:
+            if self.keep_existing and os.path.exists(target_file):
+                return "kept"
+            self._make_folder(os.path.dirname(target_file))
+            if self.mode == "snapshot":
+                outcome = snapshot_file(source_file, target_file)
+            elif self._current(source_file, target_file):
+                return "current"
+            else:
+                shutil.copy2(source_file, target_file)
+                outcome = "copy"
+            # A hard link is the source itself; there is nothing to compare
+            if self.verify and outcome != "hardlink":
+                if file_digest(source_file) != file_digest(target_file):
+                    os.remove(target_file)
+                    raise OSError(f"the backup does not match {source_file}")
+                with self._lock:
+                    self.verified += 1
+            return outcome
+        finally:
+            with self._lock:
+                self.seconds += time.perf_counter() - started
+
+    def ready(self, files, log_widget, control=None):
+        """
+        Back up files (paths or FileEntry items) and yield each of them once its
+        backup is done, in the order the backups finish. A failed backup is logged
+        and the file is not yielded. A RunControl pauses or stops queueing backups.
+        """
+        pending = {}
+        files = iter(files)
+        more = True
+        pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="backup")
+        try:
+            while True:
+                while more and len(pending) < self.threads * QUEUE_PER_THREAD:
+                    item = next(files, None) if control is None or control.wait() else None
+                    if item is None:
+                        more = False
+                    else:
+                        pending[pool.submit(self.back_up, getattr(item, "path", item))] = item
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        outcome = future.result()
+                    except OSError as e:
+                        self.failed += 1
+                        log_widget.insert(END, f"❌ Backup failed, file left unchanged: {getattr(item, 'path', item)}: "
+                                               f"{e}\n", "error")
+                        continue
+                    self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+                    yield item
+        finally:
+            # Stopped early (cancelled, or the consumer gave up): drop the queued backups
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    def run(self, files, log_widget, control=None):
+        """Back up all files before returning."""
+        for _ in self.ready(files, log_widget, control):
+            pass
+
+    def log(self, log_widget):
+        total = sum(self.outcomes.values())
+        counts = ", ".join(f"{count} {OUTCOMES[outcome]}" for outcome, count in sorted(self.outcomes.items()))
+        message = f"ℹ Backed up {total} files" + (f" ({counts})" if counts else "")
+        if self.verify:
+            message += f"; {self.verified} new backups verified"
+        log_widget.insert(END, message + ".\n", "info")
+        if self.failed:
+            log_widget.insert(END, f"⚠ {self.failed} files could not be backed up and were left unchanged.\n", "warning")
+        else:
+            log_widget.insert(END, "✅ Backup completed!\n", "success")
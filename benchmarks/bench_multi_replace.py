@@ -0,0 +1,80 @@
+"""
+Benchmark: cost per cell of the rename-table matcher as the table grows.
+
+Compares the Aho-Corasick MultiReplacer with applying every entry with
+str.replace one after another (what chaining single Cell value fixer runs
+costs). The naive loop is skipped for large tables.
+
+    python benchmarks/bench_multi_replace.py [--cells 2000] [--sizes 1 10 100 1000 10000 100000]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multi_replace import MultiReplacer  # noqa: E402
+
+NAIVE_LIMIT = 10000
+
+
+def make_codes(count, rng):
+    codes = set()
+    while len(codes) < count:
+        codes.add("P-" + "".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(6)))
+    return sorted(codes)
+
+
+def make_cells(count, codes, rng, hit_rate=0.3):
+    cells = []
+    for _ in range(count):
+        words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(6)]
+        if rng.random() < hit_rate:
+            words.insert(rng.randint(0, len(words)), rng.choice(codes))
+        cells.append(" ".join(words))
+    return cells
+
+
+def naive_replace(cell, mapping):
+    updated = cell
+    for old, new in mapping.items():
+        if old in updated:
+            updated = updated.replace(old, new)
+    return updated if updated != cell else None
+
+
+def per_cell_micros(function, cells):
+    started = time.perf_counter()
+    for cell in cells:
+        function(cell)
+    return (time.perf_counter() - started) / len(cells) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cells", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    print(f"{'entries':>8} {'build s':>9} {'automaton us/cell':>18} {'naive us/cell':>14}")
+    for size in args.sizes:
+        codes = make_codes(size, rng)
+        mapping = {code: code.replace("P-", "N-") for code in codes}
+        cells = make_cells(args.cells, codes, rng)
+        started = time.perf_counter()
+        replacer = MultiReplacer(mapping)
+        build = time.perf_counter() - started
+        automaton = per_cell_micros(replacer.replace, cells)
+        if size <= NAIVE_LIMIT:
+            naive = f"{per_cell_micros(lambda cell: naive_replace(cell, mapping), cells):14.2f}"
+        else:
+            naive = f"{'skipped':>14}"
+        print(f"{size:>8} {build:>9.3f} {automaton:>18.2f} {naive}")
+
+
+if __name__ == "__main__":
+    main()
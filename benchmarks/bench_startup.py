@@ -0,0 +1,73 @@
+"""
+Benchmark: startup cost of the engine and the GUI.
+
+Each measurement runs in a fresh interpreter and is repeated; the median is
+reported. "import" is the time to import the engine modules (functions,
+xml_engine, manifest). "first window" is the time from interpreter start until
+launch_gui has built and drawn its window; it is skipped when no display is
+available.
+
+    python benchmarks/bench_startup.py [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_CODE = """
+import time
+started = time.perf_counter()
+import functions, xml_engine, manifest
+print(time.perf_counter() - started)
+"""
+
+# mainloop is replaced so the script exits once the first window has been drawn
+WINDOW_CODE = """
+import time
+started = time.perf_counter()
+import tkinter
+
+def first_window(self, n=0):
+    self.update()
+    print(time.perf_counter() - started)
+    self.destroy()
+
+tkinter.Tk.mainloop = first_window
+import xlsx_GUI
+xlsx_GUI.launch_gui()
+"""
+
+
+def measure(code, repeat):
+    """Return (in-process seconds, wall seconds including interpreter startup) medians, or None."""
+    inside, wall = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if process.returncode != 0:
+            return None, process.stderr.strip().splitlines()[-1:]
+        inside.append(float(process.stdout.split()[-1]))
+        wall.append(elapsed)
+    return (statistics.median(inside), statistics.median(wall)), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'measurement':>14} {'in-process':>12} {'wall':>10}")
+    for name, code in (("import", IMPORT_CODE), ("first window", WINDOW_CODE)):
+        times, error = measure(code, args.repeat)
+        if times is None:
+            print(f"{name:>14}   skipped: {' '.join(error) or 'failed'}")
+        else:
+            print(f"{name:>14} {times[0] * 1000:>10.1f}ms {times[1] * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark suite: throughput of the directory drivers on synthetic trees.
+
+For every scenario a tree is generated with synthetic_tree.py, and every
+benchmark runs on a fresh copy of it --repeat times; the median time and the
+highest peak memory are kept. Results are written as JSON with files/s, cells/s
+and peak RSS, and two result files can be compared to flag regressions.
+
+    python benchmarks/bench_suite.py run [--scenario many-small ...] [--repeat 3] [--output results.json]
+    python benchmarks/bench_suite.py compare BASELINE.json CANDIDATE.json [--threshold 0.1]
+
+compare exits with 1 when a benchmark of the candidate is slower, or needs more
+memory, than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_tree import TARGET_KEY, TARGET_TEXT, TreeSpec, generate_tree, sample_cells  # noqa: E402
+
+SCENARIOS = {
+    "many-small": TreeSpec(files=200, sheets=1, rows=20, columns=5),
+    "few-large": TreeSpec(files=4, sheets=3, rows=2000, columns=8),
+    "pipe-heavy": TreeSpec(files=50, rows=200, pipe_fraction=0.9, hit_rate=0.5),
+    "long-strings": TreeSpec(files=50, rows=100, length=400),
+}
+# Cells fed to each per-cell helper
+CELL_SAMPLE = 20000
+DEFAULT_THRESHOLD = 0.10
+
+
+class Quiet:
+    """Log widget, progress bar and percent label that discard everything."""
+
+    def insert(self, *args):
+        pass
+
+    def delete(self, *args):
+        pass
+
+    def __setitem__(self, key, value):
+        pass
+
+    def config(self, **options):
+        pass
+
+    def grid(self):
+        pass
+
+    def update_idletasks(self):
+        pass
+
+
+def measure(run, prepare=None, repeat=3):
+    """Time run() repeat times, calling prepare() untimed before each; return (median seconds, peak RSS)."""
+    from memory_budget import peak_rss, reset_peak_rss
+    times, peaks = [], []
+    for _ in range(repeat):
+        if prepare:
+            prepare()
+        reset_peak_rss()
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+        peaks.append(peak_rss() or 0)
+    return statistics.median(times), max(peaks) or None
+
+
+def result(seconds, peak, files, cells):
+    return {
+        "seconds": round(seconds, 6), "files": files, "cells": cells,
+        "files_per_second": round(files / seconds, 2) if files and seconds else None,
+        "cells_per_second": round(cells / seconds, 2) if seconds else None,
+        "peak_rss": peak,
+    }
+
+
+def run_scenario(spec, engine="openpyxl", workers=1, repeat=3):
+    """Run every benchmark on a tree generated from spec and return {benchmark: result}."""
+    from functions import (backup_excel_files, process_excel_files, process_value_in_directory, update_key_in_cell,
+                           remove_key_value_pair_from_cell, replace_value_in_cell)
+    from scope import parse_scope
+    quiet = Quiet()
+    cells = spec.files * spec.sheets * spec.rows * spec.columns
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="xlsx_bench_")
+    try:
+        pristine = os.path.join(scratch, "pristine")
+        work = os.path.join(scratch, "work")
+        backup = os.path.join(scratch, "backup")
+        generate_tree(pristine, spec)
+
+        def fresh_copy():
+            shutil.rmtree(work, ignore_errors=True)
+            shutil.copytree(pristine, work)
+
+        def empty_backup():
+            shutil.rmtree(backup, ignore_errors=True)
+
+        seconds, peak = measure(lambda: backup_excel_files(pristine, backup, quiet), empty_backup, repeat)
+        results["backup_excel_files"] = result(seconds, peak, spec.files, cells)
+        seconds, peak = measure(lambda: process_excel_files(work, None, TARGET_KEY, "2.0", False, quiet, quiet, quiet,
+                                                            engine, workers, popup=False), fresh_copy, repeat)
+        results["process_excel_files"] = result(seconds, peak, spec.files, cells)
+        # Only the first column of the first sheet, as when the metadata lives in one place
+        seconds, peak = measure(lambda: process_excel_files(work, None, TARGET_KEY, "2.0", False, quiet, quiet, quiet,
+                                                            engine, workers, popup=False,
+                                                            scope=parse_scope("Sheet1", "A")), fresh_copy, repeat)
+        results["process_excel_files_scoped"] = result(seconds, peak, spec.files, spec.files * spec.rows)
+        seconds, peak = measure(lambda: process_value_in_directory(work, TARGET_TEXT, "Hi", quiet, quiet, quiet,
+                                                                   engine=engine, workers=workers), fresh_copy, repeat)
+        results["process_value_in_directory"] = result(seconds, peak, spec.files, cells)
+
+        sample = sample_cells(CELL_SAMPLE, spec)
+        helpers = {
+            "update_key_in_cell": lambda cell: update_key_in_cell(cell, TARGET_KEY, "2.0", False),
+            "remove_key_value_pair_from_cell": lambda cell: remove_key_value_pair_from_cell(cell, TARGET_KEY),
+            "replace_value_in_cell": lambda cell: replace_value_in_cell(cell, TARGET_TEXT, "Hi"),
+        }
+        for name, helper in helpers.items():
+            seconds, peak = measure(lambda: [helper(cell) for cell in sample], repeat=repeat)
+            results[name] = result(seconds, peak, 0, len(sample))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def run(args):
+    from functions import VERSION
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "version": VERSION,
+        "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+        "engine": args.engine, "workers": args.workers, "repeat": args.repeat, "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        spec = SCENARIOS[name]
+        print(f"{name}: {spec.files} files, {spec.files * spec.sheets * spec.rows * spec.columns} cells", file=sys.stderr)
+        results = run_scenario(spec, args.engine, args.workers, args.repeat)
+        report["scenarios"][name] = {"spec": spec._asdict(), "results": results}
+        for benchmark, outcome in results.items():
+            rate = f"{outcome['files_per_second']:>10.1f} files/s" if outcome["files_per_second"] else " " * 18
+            print(f"  {benchmark:<32} {outcome['seconds']:>9.3f}s {rate} {outcome['cells_per_second']:>12.0f} cells/s",
+                  file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+def compare_reports(baseline, candidate, threshold=DEFAULT_THRESHOLD):
+    """Yield (scenario, benchmark, time ratio, memory ratio, regressed) for the benchmarks both reports ran."""
+    for scenario, base in baseline["scenarios"].items():
+        other = candidate["scenarios"].get(scenario)
+        if other is None:
+            continue
+        for benchmark, before in base["results"].items():
+            after = other["results"].get(benchmark)
+            if after is None:
+                continue
+            time_ratio = after["seconds"] / before["seconds"] if before["seconds"] else None
+            memory_ratio = after["peak_rss"] / before["peak_rss"] if before["peak_rss"] and after["peak_rss"] else None
+            regressed = any(ratio is not None and ratio > 1 + threshold for ratio in (time_ratio, memory_ratio))
+            yield scenario, benchmark, time_ratio, memory_ratio, regressed
+
+
+def compare(args):
+    reports = []
+    for path in (args.baseline, args.candidate):
+        with open(path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+    regressions = 0
+    print(f"{'scenario':<14} {'benchmark':<32} {'time':>8} {'memory':>8}")
+    for scenario, benchmark, time_ratio, memory_ratio, regressed in compare_reports(*reports, args.threshold):
+        regressions += regressed
+        change = " ".join(f"{(ratio - 1) * 100:>+7.1f}%" if ratio is not None else f"{'n/a':>8}"
+                          for ratio in (time_ratio, memory_ratio))
+        print(f"{scenario:<14} {benchmark:<32} {change}{'  REGRESSION' if regressed else ''}")
+    print(f"{regressions} regressions over {args.threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                            help="run only this scenario (repeatable; default: all)")
+    run_parser.add_argument("--engine", choices=("openpyxl", "xml"), default="openpyxl")
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--output", help="result file (default: stdout)")
+    compare_parser = commands.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="relative slowdown or memory growth that counts as a regression "
+                                     "(default: %(default)s)")
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
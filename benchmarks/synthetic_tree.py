@@ -0,0 +1,93 @@
+"""
+Generate a reproducible tree of synthetic workbooks for the benchmarks.
+
+Every populated cell is either a pipe record ("Key1=v|Key2=v|...|") or plain
+text. pipe_fraction of the cells are pipe records; hit_rate of the pipe records
+hold TARGET_KEY and hit_rate of the plain cells hold TARGET_TEXT, so the share of
+cells a run changes is set independently of the tree size. The same seed and
+parameters always give the same cell contents.
+
+    python benchmarks/synthetic_tree.py DIRECTORY [--files 100] [--sheets 1] [--rows 100] [--columns 5]
+        [--pipe-fraction 0.5] [--hit-rate 0.1] [--length 24] [--seed 42]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The key and text the benchmark runs look for
+TARGET_KEY = "VersionsNr"
+TARGET_TEXT = "Hello"
+# Files per sub-folder, so trees are not one flat directory
+FILES_PER_FOLDER = 50
+
+TreeSpec = namedtuple("TreeSpec", ["files", "sheets", "rows", "columns", "pipe_fraction", "hit_rate", "length", "seed"],
+                      defaults=(100, 1, 100, 5, 0.5, 0.1, 24, 42))
+TreeSpec.__doc__ = "Parameters of a synthetic tree; cells per tree = files * sheets * rows * columns."
+
+
+def _word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(max(1, length)))
+
+
+def _pipe_cell(rng, spec):
+    keys = [f"Key{number}" for number in rng.sample(range(1, 30), 3)]
+    if rng.random() < spec.hit_rate:
+        keys.insert(rng.randint(0, len(keys)), TARGET_KEY)
+    value_length = max(1, spec.length // len(keys) - 6)
+    return "".join(f"{key}={_word(rng, value_length)}|" for key in keys)
+
+
+def _text_cell(rng, spec):
+    text = _word(rng, spec.length)
+    if rng.random() < spec.hit_rate:
+        position = rng.randint(0, len(text))
+        text = text[:position] + TARGET_TEXT + text[position:]
+    return text
+
+
+def generate_tree(directory, spec=TreeSpec()):
+    """Write spec.files workbooks under directory and return their paths."""
+    import openpyxl
+    rng = random.Random(spec.seed)
+    paths = []
+    for number in range(spec.files):
+        folder = os.path.join(directory, f"folder{number // FILES_PER_FOLDER:03d}")
+        os.makedirs(folder, exist_ok=True)
+        workbook = openpyxl.Workbook(write_only=True)
+        for sheet_number in range(spec.sheets):
+            sheet = workbook.create_sheet(f"Sheet{sheet_number + 1}")
+            for _ in range(spec.rows):
+                sheet.append([_pipe_cell(rng, spec) if rng.random() < spec.pipe_fraction else _text_cell(rng, spec)
+                              for _ in range(spec.columns)])
+        path = os.path.join(folder, f"book{number:05d}.xlsx")
+        workbook.save(path)
+        paths.append(path)
+    return paths
+
+
+def sample_cells(count, spec=TreeSpec()):
+    """count cell strings drawn like the cells of a generated tree, for the per-cell benchmarks."""
+    rng = random.Random(spec.seed)
+    return [_pipe_cell(rng, spec) if rng.random() < spec.pipe_fraction else _text_cell(rng, spec)
+            for _ in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory")
+    for field, default in TreeSpec._field_defaults.items():
+        parser.add_argument("--" + field.replace("_", "-"), type=type(default), default=default)
+    args = parser.parse_args(argv)
+    spec = TreeSpec(**{field: getattr(args, field) for field in TreeSpec._fields})
+    paths = generate_tree(args.directory, spec)
+    print(f"Wrote {len(paths)} workbooks ({spec.files * spec.sheets * spec.rows * spec.columns} cells) "
+          f"to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
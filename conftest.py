@@ -0,0 +1,12 @@
+import shutil
+import tempfile
+
+import pytest
+
+
+# Fixture for temporary directory to hold Excel files.
+@pytest.fixture
+def temp_excel_dir():
+    dirpath = tempfile.mkdtemp()
+    yield dirpath
+    shutil.rmtree(dirpath)
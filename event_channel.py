@@ -0,0 +1,171 @@
+"""
+Thread-safe channel between a processing thread and the Tk main loop.
+
+The directory drivers in functions.py talk to a log widget, a progress bar and a
+percent label. An EventChannel hands them stand-ins for those three (.log,
+.progress and .label) that only push events onto a queue, so the worker thread
+never touches Tk. On the Tk thread a WidgetPump drains the queue on a timer:
+
+* log lines of one tick are inserted with a single Text.insert call,
+* only the last progress value and percent text of a tick are applied,
+* the Text widget keeps at most max_lines lines, while every line also goes
+  to a full log file.
+
+Events are tuples: ("log", text, tag), ("clear",), ("progress", option, value),
+("percent", text), ("show", target) and ("popup", message).
+"""
+import os
+import queue
+
+END = "end"
+# Lines kept in a log widget; older lines are only in the log file
+MAX_LOG_LINES = 2000
+PUMP_INTERVAL_MS = 100
+# Upper bound of events handled per tick so the window stays responsive
+MAX_EVENTS_PER_TICK = 5000
+
+
+class EventChannel:
+    """Queue of GUI events with widget stand-ins for the processing thread."""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self.log = ChannelLog(self)
+        self.progress = ChannelProgress(self)
+        self.label = ChannelLabel(self)
+
+    def put(self, *event):
+        self._queue.put(event)
+
+    def popup(self, message):
+        self.put("popup", message)
+
+    def drain(self, limit=MAX_EVENTS_PER_TICK):
+        """Return up to limit queued events, oldest first."""
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+
+class ChannelLog:
+    def __init__(self, channel):
+        self._channel = channel
+
+    def insert(self, index, text, tag=None):
+        self._channel.put("log", text, tag)
+
+    def delete(self, *args):
+        self._channel.put("clear")
+
+
+class ChannelProgress:
+    def __init__(self, channel):
+        self._channel = channel
+        self._options = {}
+
+    def __setitem__(self, option, value):
+        self._options[option] = value
+        self._channel.put("progress", option, value)
+
+    def __getitem__(self, option):
+        return self._options.get(option)
+
+    def grid(self):
+        self._channel.put("show", "progress")
+
+    def update_idletasks(self):
+        pass
+
+
+class ChannelLabel:
+    def __init__(self, channel):
+        self._channel = channel
+
+    def config(self, text=""):
+        self._channel.put("percent", text)
+
+    def grid(self):
+        self._channel.put("show", "label")
+
+
+class WidgetPump:
+    """Apply the events of an EventChannel to real widgets; runs on the Tk thread."""
+
+    def __init__(self, root, channel, log_widget, progress_bar, percent_label, log_path=None,
+                 max_lines=MAX_LOG_LINES, popup=None):
+        self.root = root
+        self.channel = channel
+        self.log_widget = log_widget
+        self.progress_bar = progress_bar
+        self.percent_label = percent_label
+        self.log_path = log_path
+        self.max_lines = max_lines
+        self.popup = popup
+        self._log_file = None
+
+    def start(self, interval=PUMP_INTERVAL_MS):
+        def tick():
+            self.flush()
+            self.root.after(interval, tick)
+        self.root.after(interval, tick)
+
+    def flush(self):
+        pending = []
+        progress = {}
+        percent = None
+        shown = set()
+        popups = []
+        for event in self.channel.drain():
+            kind = event[0]
+            if kind == "log":
+                pending.extend((event[1], event[2] or ()))
+                self._write_log(event[1])
+            elif kind == "clear":
+                pending = []
+                self.log_widget.delete("1.0", END)
+            elif kind == "progress":
+                progress[event[1]] = event[2]
+            elif kind == "percent":
+                percent = event[1]
+            elif kind == "show":
+                shown.add(event[1])
+            elif kind == "popup":
+                popups.append(event[1])
+        if pending:
+            self.log_widget.insert(END, *pending)
+            self._trim()
+        if "progress" in shown:
+            self.progress_bar.grid()
+        if "label" in shown:
+            self.percent_label.grid()
+        for option, value in progress.items():
+            self.progress_bar[option] = value
+        if percent is not None:
+            self.percent_label.config(text=percent)
+        if self._log_file:
+            self._log_file.flush()
+        for message in popups:
+            if self.popup:
+                self.popup(message)
+
+    def _trim(self):
+        lines = int(self.log_widget.index("end-1c").split(".")[0])
+        if lines > self.max_lines:
+            self.log_widget.delete("1.0", f"{lines - self.max_lines + 1}.0")
+
+    def _write_log(self, text):
+        if not self.log_path:
+            return
+        if self._log_file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            self._log_file = open(self.log_path, "a", encoding="utf-8")
+        self._log_file.write(text)
+
+    def close(self):
+        if self._log_file:
+            self._log_file.close()
+            self._log_file = None
@@ -0,0 +1,99 @@
+"""
+Single-pass discovery of the workbooks under a directory.
+
+A FileIndex walks the tree once with os.scandir and remembers every .xlsx file
+it finds together with its size and mtime. The first iteration streams entries
+as they are discovered, so a run can start processing (and report progress)
+before the walk is over; later iterations replay the stored entries without
+touching the file system again. Backup, counting, the run cache and the
+processing drivers of one run all share the same index.
+"""
+import os
+import time
+from collections import namedtuple
+
+EXCEL_SUFFIX = ".xlsx"
+
+FileEntry = namedtuple("FileEntry", ["path", "size", "mtime_ns"])
+
+
+def scan_excel_files(directory_path, exclude=None):
+    """
+    Yield a FileEntry for every .xlsx file under directory_path, files of a folder
+    before its subfolders, skipping the folder exclude (e.g. the backup folder).
+    Symlinked folders are not followed and unreadable folders are skipped, like os.walk.
+    """
+    excluded = os.path.normcase(os.path.abspath(exclude)) if exclude else None
+    pending = [directory_path]
+    while pending:
+        folder = pending.pop()
+        try:
+            with os.scandir(folder) as entries:
+                subfolders = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if excluded is None or os.path.normcase(os.path.abspath(entry.path)) != excluded:
+                                subfolders.append(entry.path)
+                        elif entry.name.endswith(EXCEL_SUFFIX) and entry.is_file():
+                            stat = entry.stat()
+                            yield FileEntry(entry.path, stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        pending.extend(reversed(subfolders))
+
+
+class FileIndex:
+    """The .xlsx files under a directory, discovered lazily by one scandir walk."""
+
+    def __init__(self, directory_path, exclude=None):
+        self.directory_path = directory_path
+        self.exclude = exclude
+        self.entries = []
+        # Seconds spent walking the tree so far (see run_trace)
+        self.scan_seconds = 0.0
+        self._scan = scan_excel_files(directory_path, exclude)
+
+    @classmethod
+    def of_entries(cls, directory_path, entries):
+        """A complete index of the given FileEntry items, e.g. the files a key_index.KeyIndex lists for a key."""
+        index = cls(directory_path)
+        index.entries = list(entries)
+        index._scan = None
+        return index
+
+    def subset(self, keep):
+        """
+        An index of the entries for which keep(entry) is true. It is discovered
+        as this index is walked, so a run can start on it before the walk is over.
+        """
+        index = FileIndex(self.directory_path, self.exclude)
+        index._scan = (entry for entry in self if keep(entry))
+        return index
+
+    @property
+    def complete(self):
+        """True once the walk has finished and len() is the final file count."""
+        return self._scan is None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        # Replay what is known, then continue the walk where it stopped
+        position = 0
+        while True:
+            while position < len(self.entries):
+                yield self.entries[position]
+                position += 1
+            if self._scan is None:
+                return
+            started = time.perf_counter()
+            entry = next(self._scan, None)
+            self.scan_seconds += time.perf_counter() - started
+            if entry is None:
+                self._scan = None
+            else:
+                self.entries.append(entry)
@@ -1,218 +1,1405 @@
-import openpyxl
+import io
 import os
-import re
-import requests
-import webbrowser
+import json
 import threading
+import time
 import shutil
-from tkinter import END, Toplevel, Label, Button, messagebox, filedialog
+import csv
+import tempfile
+import xml_engine
+from pipe_record import PipeRecord
+from functools import lru_cache
+from multi_replace import MultiReplacer
+from run_cache import RunCache, DEFAULT_CACHE_PATH, operation_fingerprint
+from file_index import FileIndex, scan_excel_files
+from run_trace import NULL_TIMER, FileTimer, RunTrace
+from run_journal import RunJournal, DEFAULT_JOURNAL_DIR
+from key_index import KeyIndex, DEFAULT_INDEX_PATH, key_files
+from scope import parse_scope
+from backup_copier import DEFAULT_BACKUP_THREADS, BackupCopier, snapshot_file
+from safe_write import durable_replace, write_replacement
+from staged_pipeline import StagedPipeline
+from shards import ShardResults, describe_shard, shard_files
+import run_control
+from run_control import Cancelled, RunControl
+from memory_budget import (STREAMING_FOOTPRINT, engine_for, estimate_memory, format_size, parse_size, peak_rss,
+                           reset_peak_rss)
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 
+# Same value as tkinter.END; tkinter itself is only imported by the GUI helpers so
+# the engine also runs where Tk is not available (see xlsx_cli.py)
+END = "end"
 GITHUB_REPO = "Maksymilianx/Excel_word_changer"
 FALLBACK_VERSION = "1.2.0"
+ENGINES = ("openpyxl", "xml")
+BACKUP_MODES = ("copy", "snapshot", "lazy")
+# Written into the backup folder by lazy backups, one row per backed up file
+BACKUP_MANIFEST = "backup_manifest.csv"
 
-def fetch_latest_version():
-    """Fetch the latest release tag from GitHub."""
+# The latest release tag is remembered here so startup never waits on the network
+VERSION_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".xlsx_fixer", "latest_version.json")
+VERSION_CACHE_TTL = 24 * 60 * 60
+# Full GUI session logs (the log widgets only keep the last lines)
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".xlsx_fixer", "logs")
+
+def _request_latest_version():
+    """Ask GitHub for the latest release tag. Returns None when it cannot be reached."""
+    import requests  # about 0.1s to import, so only loaded for this call
     url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
     try:
         response = requests.get(url, timeout=5)
         response.raise_for_status()
         return response.json().get("tag_name", FALLBACK_VERSION)
     except requests.RequestException:
-        return FALLBACK_VERSION
+        return None
+
+def fetch_latest_version():
+    """Fetch the latest release tag from GitHub."""
+    return _request_latest_version() or FALLBACK_VERSION
+
+def read_cached_version(max_age=None, cache_path=VERSION_CACHE_PATH):
+    """Return the cached release tag, or None if there is none or it is older than max_age seconds."""
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        version, checked = cached["version"], float(cached["checked"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if max_age is not None and time.time() - checked > max_age:
+        return None
+    return version
 
-VERSION = fetch_latest_version()
+def refresh_latest_version(max_age=VERSION_CACHE_TTL, cache_path=VERSION_CACHE_PATH):
+    """
+    Return the latest release tag, asking GitHub only when the cached tag is older
+    than max_age seconds. Meant to run off the main thread (see launch_gui).
+    """
+    version = read_cached_version(max_age, cache_path)
+    if version is not None:
+        return version
+    version = _request_latest_version()
+    if version is None:
+        return read_cached_version(cache_path=cache_path) or FALLBACK_VERSION
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "checked": time.time()}, f)
+    except OSError:
+        pass
+    return version
+
+# Cached at the last check, whatever its age; refreshed in the background by the GUI
+VERSION = read_cached_version() or FALLBACK_VERSION
 
 def clean_pipes(text):
     """
-    Process the input text line-by-line:
+    Normalize pipe-separated text line-by-line:
     - Collapse sequences like "|   |" into a single pipe.
     - Remove any leading pipe at the beginning of each line.
-    - If a line ends with a pipe and the next line starts with a pipe, remove the extra leading pipe.
-    """
-    lines = text.splitlines()
-    new_lines = []
-    for line in lines:
-        line = re.sub(r'\|\s*\|', '|', line)
-        if line.startswith('|'):
-            line = line[1:]
-        new_lines.append(line)
-    for i in range(len(new_lines) - 1):
-        if new_lines[i].endswith('|') and new_lines[i+1].startswith('|'):
-            new_lines[i+1] = new_lines[i+1][1:]
-    return "\n".join(new_lines)
+    - Keep a trailing pipe at the end of a line.
+    """
+    return str(PipeRecord(text))
 
 def remove_key_value_pair_from_cell(cell_value, key):
-    pattern = r'\|?' + re.escape(key) + r'=[^|]*\|?'
-    new_value = re.sub(pattern, '|', cell_value)
-    new_value = clean_pipes(new_value).strip('|')
+    record = PipeRecord(cell_value)
+    record.remove(key)
+    record.strip()
+    new_value = str(record)
     return new_value if new_value != cell_value else None
 
-def search_replace_or_remove_key(file_path, key, new_value, remove_key, log_widget, key_found):
+def update_keys_in_cell(cell_value, updates, matched=None):
+    """
+    Apply several (key, new_value, remove_key) updates to a pipe-separated cell with
+    a single parse and a single write-back. Returns the new cell text, or None when
+    the cell does not change. The indexes of the updates whose key was found are
+    added to matched. A removal that would leave the cell empty is skipped.
+    """
+    record = PipeRecord(cell_value)
+    applied = False
+    for index, (key, new_value, remove_key) in enumerate(updates):
+        if key not in record:
+            continue
+        before = record.copy() if remove_key else None
+        if applied:
+            # Match what applying the updates one after another would read back
+            record.read_back()
+        if remove_key:
+            record.remove(key)
+            record.strip()
+            if record.is_empty():
+                record = before
+                continue
+        else:
+            record.set(key, new_value)
+        applied = True
+        if matched is not None:
+            matched.add(index)
+    if not applied:
+        return None
+    updated_cell = str(record)
+    return updated_cell if updated_cell != cell_value else None
+
+def update_key_in_cell(cell_value, key, new_value, remove_key):
+    """
+    Return cell_value with key set to new_value (or removed when remove_key is set),
+    or None when the cell does not hold the key.
+    """
+    return update_keys_in_cell(cell_value, [(key, new_value, remove_key)])
+
+def replace_value_in_cell(cell_value, old_value, new_value):
+    """Return cell_value with old_value replaced by new_value, or None when old_value does not occur."""
+    if old_value in cell_value:
+        return cell_value.replace(old_value, new_value)
+    return None
+
+def save_workbook(workbook, file_path, before_replace=None):
+    """
+    Save workbook to a new file next to file_path, sync it and move it into place
+    (see safe_write), so a crash never leaves a truncated workbook. The original
+    inode is never written to, so hard-linked snapshot backups keep the old
+    content. before_replace, if given, is called right before the move.
+    """
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(file_path)))
+    os.close(fd)
     try:
-        workbook = openpyxl.load_workbook(file_path)
-        found = False
+        workbook.save(temp_path)
+        shutil.copymode(file_path, temp_path)
+        if before_replace:
+            before_replace()
+        durable_replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def new_coverage():
+    """Counters of what a scoped edit read (see scoped_cells)."""
+    return {"sheets": 0, "sheets_skipped": 0, "cells": 0}
+
+def scoped_cells(sheet, scope=None, coverage=None):
+    """
+    Yield the non-empty string cells of an openpyxl sheet inside scope (see
+    scope.Scope), or all of them without one. Only the rows and columns around
+    the scope are read; a sheet outside it is not read at all. coverage, a dict,
+    counts the "sheets" read, the "sheets_skipped" and the "cells" yielded.
+    """
+    area = None
+    if scope is None:
+        rows = sheet.iter_rows()
+    else:
+        coverage = coverage if coverage is not None else new_coverage()
+        if scope.selects_sheet(sheet.title):
+            header_row = next(sheet.iter_rows(min_row=1, max_row=1), ()) if scope.headers else ()
+            area = scope.area(scope.header_columns((cell.column, cell.value) for cell in header_row
+                                                   if cell.value is not None))
+        if area is None or area.empty:
+            coverage["sheets_skipped"] += 1
+            return
+        coverage["sheets"] += 1
+        min_col, min_row, max_col, max_row = area.bounds(sheet.max_column, sheet.max_row)
+        rows = sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col)
+    for row in rows:
+        for cell in row:
+            if cell.value and isinstance(cell.value, str):
+                if area is not None:
+                    if not area.contains(cell.column, cell.row):
+                        continue
+                    coverage["cells"] += 1
+                yield cell
+
+def edit_string_cells(file_path, transform, engine="openpyxl", before_replace=None, timer=NULL_TIMER, checkpoint=None,
+                      scope=None, coverage=None, source=None, sink=None):
+    """
+    Apply transform to every non-empty string cell of a workbook and save it if anything changed.
+
+    transform returns the new cell text or None to leave the cell alone. With the
+    "openpyxl" engine the workbook is loaded and saved by openpyxl; the "xml" engine
+    streams only the string parts of the .xlsx package (see xml_engine). Returns the
+    number of changed cells (distinct strings for the "xml" engine). before_replace
+    is called once the new file is written, just before it replaces the original.
+    timer (see run_trace.FileTimer) records the time of each stage and the cells scanned.
+    checkpoint is called between sheets and before saving; when it raises (see
+    run_control.RunControl.checkpoint) the file is left unchanged.
+    With a scope (see scope.Scope) only the cells inside it are edited, counted in
+    coverage as in scoped_cells. The xml engine then counts changed cells, and it
+    skips the parts of sheets outside the scope; openpyxl still loads every sheet.
+    With source (a binary file object holding the file's content) the workbook is
+    read from it, and with sink the new workbook is handed to sink as bytes
+    instead of being saved; before_replace is then left to whoever saves them.
+    """
+    transform = timer.timed("modify", transform, "cells_scanned")
+    if engine == "xml" and scope is not None:
+        return xml_engine.rewrite_scoped_cells(file_path, lambda value: transform(value) if value else None, scope,
+                                               before_replace, timer, checkpoint, coverage, source, sink)
+    if engine == "xml":
+        return xml_engine.rewrite_string_cells(file_path, lambda value: transform(value) if value else None,
+                                               before_replace, timer, checkpoint, source, sink)
+    if engine != "openpyxl":
+        raise ValueError(f"Unknown engine: {engine}")
+    import openpyxl  # not needed by the "xml" engine, and slow to import
+    with timer.stage("load"):
+        workbook = openpyxl.load_workbook(source or file_path)
+    changed = 0
+    with timer.stage("scan"):
         for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            for row in sheet.iter_rows():
-                for cell in row:
-                    if cell.value and isinstance(cell.value, str):
-                        original_value = cell.value
-                        if remove_key:
-                            updated_cell = remove_key_value_pair_from_cell(cell.value, key)
-                        else:
-                            pattern = rf"\|?{key}=[^|]*\|?"
-                            updated_cell = re.sub(pattern, f"|{key}={new_value}|", cell.value)
-                            if updated_cell:
-                                updated_cell = clean_pipes(updated_cell)
-                        if updated_cell and updated_cell != original_value:
-                            found = True
-                            key_found[0] = True
-                            cell.value = updated_cell
-        if found:
-            workbook.save(file_path)
-            log_widget.insert(END, f"✅ Updated: {file_path}\n", "success")
+            if checkpoint:
+                checkpoint()
+            for cell in scoped_cells(workbook[sheet_name], scope, coverage):
+                updated_cell = transform(cell.value)
+                if updated_cell is not None:
+                    cell.value = updated_cell
+                    changed += 1
+    if changed and checkpoint:
+        checkpoint()
+    if changed and sink:
+        with timer.stage("save"):
+            package = io.BytesIO()
+            workbook.save(package)
+        sink(package.getvalue())
+    elif changed:
+        with timer.stage("save"):
+            save_workbook(workbook, file_path, before_replace)
+    return changed
+
+def preview_string_cells(file_path, transform, checkpoint=None, scope=None, coverage=None, source=None):
+    """
+    Yield (sheet, coordinate, before, after) for every string cell transform would
+    change, without writing anything. The workbook is read with openpyxl in
+    read-only mode, so rows are streamed instead of loading the whole sheet, and
+    sheets outside scope are never parsed (see scoped_cells). source, a binary
+    file object holding the file's content, is read instead of the file.
+    """
+    import openpyxl
+    workbook = openpyxl.load_workbook(source or file_path, read_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            if checkpoint:
+                checkpoint()
+            for cell in scoped_cells(sheet, scope, coverage):
+                updated_cell = transform(cell.value)
+                if updated_cell is not None:
+                    yield sheet.title, cell.coordinate, cell.value, updated_cell
+    finally:
+        workbook.close()
+
+FileResult = namedtuple("FileResult", ["path", "changed", "cells", "error", "skipped", "seconds", "hits", "backup",
+                                       "cached", "preview", "peak_rss", "engine", "trace", "resumed", "cancelled",
+                                       "coverage"],
+                        defaults=(False, 0.0, (), None, False, None, None, None, None, False, False, None))
+
+# Larger rename tables are not worth a literal-by-literal pre-scan
+PRESCAN_MAX_LITERALS = 64
+
+def key_operation(key, new_value, remove_key):
+    """Describe a Flat file fixer edit as a picklable operation tuple."""
+    return ("key", key, new_value, bool(remove_key))
+
+def value_operation(old_value, new_value):
+    """Describe a Cell value fixer edit as a picklable operation tuple."""
+    return ("value", old_value, new_value)
+
+def mapping_operation(pairs):
+    """
+    Describe a rename table (old -> new pairs) applied simultaneously to each cell
+    by an Aho-Corasick automaton; see multi_replace for the overlap rule.
+    """
+    return ("mapping", tuple(dict(pairs).items()))
+
+@lru_cache(maxsize=4)
+def _replacer_for(pairs):
+    # Built once per run (and once per pool worker), not once per file
+    return MultiReplacer(pairs)
+
+def scoped_operation(operation, scope):
+    """
+    Limit an operation tuple to the cells inside a scope (see scope.Scope); the
+    scope becomes part of the operation, so cache entries and journals of scoped
+    and unscoped runs are kept apart. Without a scope the operation is returned as is.
+    """
+    return operation if scope is None else ("scoped", scope, operation)
+
+def split_scope(operation):
+    """(scope or None, operation without its scope) of an operation tuple."""
+    if operation[0] == "scoped":
+        return operation[1], operation[2]
+    return None, operation
+
+def batch_operation(operations):
+    """Combine several operation tuples into one that is applied to each cell in order."""
+    return ("batch", tuple(operations))
+
+def describe_operation(operation):
+    kind = operation[0]
+    if kind == "key":
+        _, key, new_value, remove_key = operation
+        return f"remove '{key}'" if remove_key else f"set '{key}' = '{new_value}'"
+    if kind == "value":
+        return f"replace '{operation[1]}' with '{operation[2]}'"
+    if kind == "mapping":
+        return f"rename table of {len(operation[1])} entries"
+    if kind == "scoped":
+        return f"{describe_operation(operation[2])} in {operation[1].describe()}"
+    return f"{len(operation[1])} operations"
+
+def operation_steps(operation):
+    """Descriptions of the operations a FileResult's hits refer to, by index."""
+    if operation[0] == "scoped":
+        return operation_steps(operation[2])
+    if operation[0] == "batch":
+        return [describe_operation(step) for step in operation[1]]
+    return [describe_operation(operation)]
+
+def _batch_steps(operations):
+    """
+    Split a batch into steps of (operation indexes, transform(value, hits)). Runs of
+    key operations share one pipe-record parse per cell, unless a new value contains
+    a pipe or line break and would be re-read differently by the next operation.
+    """
+    groups = []
+    for index, step in enumerate(operations):
+        shares_record = step[0] == "key" and not any(char in step[2] for char in "|\r\n")
+        if shares_record and groups and groups[-1][1] is not None:
+            groups[-1][0].append(index)
+            groups[-1][1].append(step[1:])
+        else:
+            groups.append(([index], [step[1:]] if shares_record else None, step))
+    return [(indexes, _record_step(updates) if updates is not None else _single_step(cell_transform(step)))
+            for indexes, updates, step in groups]
+
+def _single_step(transform):
+    def apply(value, hits):
+        result = transform(value)
+        if result is not None:
+            hits.add(0)
+        return result
+    return apply
+
+def _record_step(updates):
+    return lambda value, hits: update_keys_in_cell(value, updates, hits)
+
+def cell_transform(operation, hits=None):
+    """
+    Build the per-cell transform for an operation tuple. For a batch, the indexes of
+    the operations that changed at least one cell are added to hits.
+    """
+    kind = operation[0]
+    if kind == "batch":
+        steps = _batch_steps(operation[1])
+
+        def apply_all(value):
+            updated = None
+            for indexes, transform in steps:
+                step_hits = set()
+                result = transform(value if updated is None else updated, step_hits)
+                if result is not None:
+                    updated = result
+                if hits is not None:
+                    hits.update(indexes[i] for i in step_hits)
+            return updated
+        return apply_all
+    if kind == "key":
+        _, key, new_value, remove_key = operation
+        return lambda value: update_key_in_cell(value, key, new_value, remove_key)
+    if kind == "value":
+        _, old_value, new_value = operation
+        return lambda value: replace_value_in_cell(value, old_value, new_value)
+    if kind == "mapping":
+        return _replacer_for(operation[1]).replace
+    if kind == "scoped":
+        # The scope itself is applied by the engines (see edit_string_cells)
+        return cell_transform(operation[2], hits)
+    raise ValueError(f"Unknown operation: {kind}")
+
+def operation_literals(operation):
+    """
+    Return the strings of which a cell must contain at least one for operation to
+    change it, or None when the operation cannot be pre-filtered.
+    """
+    kind = operation[0]
+    if kind == "batch":
+        literals = []
+        for step in operation[1]:
+            step_literals = operation_literals(step)
+            if step_literals is None:
+                return None
+            literals.extend(step_literals)
+        return literals if len(literals) <= PRESCAN_MAX_LITERALS else None
+    if kind == "key":
+        key = operation[1]
+        if not key:
+            return None
+        return [f"{key}="]
+    if kind == "value":
+        return [operation[1]] if operation[1] else None
+    if kind == "mapping":
+        olds = [old for old, _ in operation[1] if old]
+        return olds if 0 < len(olds) <= PRESCAN_MAX_LITERALS else None
+    if kind == "scoped":
+        return operation_literals(operation[2])
+    return None
+
+def lazy_backup_path(file_path, lazy_backup):
+    """Backup location of file_path for a (source_dir, backup_dir) lazy backup pair."""
+    source_dir, backup_dir = lazy_backup
+    return os.path.join(backup_dir, os.path.relpath(file_path, source_dir))
+
+def _preview_file(file_path, operation, preview_dir, started, checkpoint=None, coverage=None, source=None):
+    """Write the cells operation would change to a CSV part file in preview_dir."""
+    scope, operation = split_scope(operation)
+    hits = set()
+    cells = 0
+    fd, part_path = tempfile.mkstemp(suffix=".part", dir=preview_dir)
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as part:
+            writer = csv.writer(part)
+            for sheet, coordinate, before, after in preview_string_cells(file_path, cell_transform(operation, hits),
+                                                                         checkpoint, scope, coverage, source):
+                writer.writerow([file_path, sheet, coordinate, before, after])
+                cells += 1
+    except Exception:
+        os.remove(part_path)
+        raise
+    if not cells:
+        os.remove(part_path)
+        part_path = None
+    return FileResult(file_path, False, cells, None, False, time.perf_counter() - started, tuple(sorted(hits)),
+                      preview=part_path)
+
+def process_file(file_path, operation, engine="openpyxl", prescan=True, lazy_backup=None, preview_dir=None,
+                 trace=False, profile_dir=None, control=None, data=None, sink=None):
+    """
+    Apply an operation to a single workbook and return a FileResult.
+    With prescan, files whose raw XML cannot contain the search literal are skipped
+    without being loaded. Errors are caught and reported in the result so one bad
+    file never stops a run; this is also the unit of work handed to pool workers.
+    With lazy_backup, a (source_dir, backup_dir) pair, the file is snapshotted into
+    the backup folder just before it is overwritten, and only if it changes.
+    With preview_dir the file is only read (whatever the engine): the cells that
+    would change are written to a part file there, named by FileResult.preview.
+    The result carries the peak memory of the process while the file was handled
+    (see memory_budget.peak_rss) and the engine that edited it. With trace, it also
+    carries the time of every stage and the bytes and cells handled (see run_trace);
+    with profile_dir the file runs under cProfile and the profile is saved there.
+    With a RunControl (in pool workers, the one installed for the run) a pause
+    holds the file between sheets and a cancel abandons it before it is saved.
+    data, the file's content already read into memory, is used instead of reading
+    the file, and with sink the edited workbook is handed to sink as bytes rather
+    than saved (see staged_pipeline); lazy_backup is then the saver's job too.
+    """
+    control = control or run_control.worker_control
+    checkpoint = control.checkpoint if control else None
+    reset_peak_rss()
+    timer = FileTimer() if trace else NULL_TIMER
+    profile_path = None
+    if profile_dir is None:
+        result = _process_file(file_path, operation, engine, prescan, lazy_backup, preview_dir, timer, checkpoint, data,
+                               sink)
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        result = profiler.runcall(_process_file, file_path, operation, engine, prescan, lazy_backup, preview_dir, timer,
+                                  checkpoint, data, sink)
+        fd, profile_path = tempfile.mkstemp(prefix=os.path.basename(file_path) + "-", suffix=".prof", dir=profile_dir)
+        os.close(fd)
+        profiler.dump_stats(profile_path)
+    if trace:
+        timer.count("cells_changed", result.cells)
+        details = timer.as_dict()
+        if profile_path:
+            details["profile"] = profile_path
+        result = result._replace(trace=details)
+    return result._replace(peak_rss=peak_rss(),
+                           engine=engine if not (result.skipped or result.preview or result.error or
+                                                 result.cancelled) else None)
+
+def _process_file(file_path, operation, engine, prescan, lazy_backup, preview_dir, timer, checkpoint, data=None,
+                  sink=None):
+    started = time.perf_counter()
+
+    def source():
+        # Every reader gets its own view of the bytes read ahead
+        return io.BytesIO(data) if data is not None else None
+
+    scope = split_scope(operation)[0]
+    coverage = new_coverage() if scope is not None else None
+    try:
+        timer.count("bytes_read", os.path.getsize(file_path))
+        literals = operation_literals(operation) if prescan else None
+        if literals:
+            with timer.stage("prescan"):
+                if not xml_engine.may_contain(source() or file_path, literals):
+                    return FileResult(file_path, False, 0, None, True, time.perf_counter() - started)
+    except Exception:
+        # Unreadable as a zip: let the edit engine report the error
+        pass
+    if preview_dir is not None:
+        try:
+            with timer.stage("scan"):
+                result = _preview_file(file_path, operation, preview_dir, started, checkpoint, coverage, source())
+            return result._replace(coverage=_coverage_counts(coverage))
+        except Cancelled:
+            return FileResult(file_path, False, 0, None, False, time.perf_counter() - started, cancelled=True)
+        except Exception as e:
+            return FileResult(file_path, False, 0, str(e), False, time.perf_counter() - started)
+    backup = []
+
+    def back_up():
+        with timer.stage("backup"):
+            target = lazy_backup_path(file_path, lazy_backup)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            snapshot_file(file_path, target)
+            backup.append(target)
+
+    try:
+        hits = set()
+        cells = edit_string_cells(file_path, cell_transform(operation, hits), engine,
+                                  back_up if lazy_backup else None, timer, checkpoint, scope, coverage, source(), sink)
+        if cells and not sink:
+            timer.count("bytes_written", os.path.getsize(file_path))
+        return FileResult(file_path, cells > 0, cells, None, False, time.perf_counter() - started, tuple(sorted(hits)),
+                          backup[0] if backup else None, coverage=_coverage_counts(coverage))
+    except Cancelled:
+        return FileResult(file_path, False, 0, None, False, time.perf_counter() - started, cancelled=True)
+    except Exception as e:
+        return FileResult(file_path, False, 0, str(e), False, time.perf_counter() - started,
+                          backup=backup[0] if backup else None)
+
+def _coverage_counts(coverage):
+    # (sheets read, sheets skipped, cells read) of a scoped edit, for FileResult.coverage
+    return None if coverage is None else (coverage["sheets"], coverage["sheets_skipped"], coverage["cells"])
+
+def log_file_result(result, operation, log_widget):
+    operation = split_scope(operation)[1]
+    if result.resumed:
+        return
+    if result.cancelled:
+        log_widget.insert(END, f"⏹ Stopped before saving, left unchanged: {result.path}\n", "warning")
+        return
+    if result.preview:
+        log_widget.insert(END, f"🔍 Would change {result.cells} cells in: {result.path}\n", "success")
+        return
+    if operation[0] in ("key", "batch", "mapping"):
+        if result.error:
+            log_widget.insert(END, f"❌ Error processing {result.path}: {result.error}\n", "error")
+        elif result.changed:
+            log_widget.insert(END, f"✅ Updated: {result.path}\n", "success")
+    else:
+        _, old_value, new_value = operation
+        if result.error:
+            log_widget.insert(END, f"❌ Error processing cells in {result.path}: {result.error}\n", "error")
+        elif result.changed:
+            log_widget.insert(END, f"✅ Processed cells replacing '{old_value}' with '{new_value}' in: {result.path}\n", "success")
+        else:
+            log_widget.insert(END, f"⚠ No cells containing '{old_value}' found in: {result.path}\n", "warning")
+
+def _save_staged(file_path, data, result, lazy_backup, control):
+    """Write stage of a staged run (see staged_pipeline): save the workbook process_file handed on as data."""
+    if control is not None and control.cancelled:
+        return result._replace(changed=False, cells=0, cancelled=True)
+    started = time.perf_counter()
+    backup = []
+
+    def back_up():
+        target = lazy_backup_path(file_path, lazy_backup)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        snapshot_file(file_path, target)
+        backup.append(target)
+
+    try:
+        write_replacement(file_path, data, back_up if lazy_backup else None)
     except Exception as e:
-        log_widget.insert(END, f"❌ Error processing {file_path}: {e}\n", "error")
+        return result._replace(changed=False, cells=0, error=str(e), backup=backup[0] if backup else None)
+    if result.trace is not None:
+        stages = dict(result.trace["stages"])
+        stages["save"] = round(stages.get("save", 0.0) + time.perf_counter() - started, 6)
+        result = result._replace(trace=dict(result.trace, stages=stages, bytes_written=len(data)))
+    return result._replace(backup=backup[0] if backup else None)
+
+# The operation of the run a pool worker process belongs to (see _install_worker)
+_worker_operation = None
 
-def backup_excel_files(source_dir, backup_dir, log_widget):
+def _install_worker(operation, control):
     """
-    Copy all .xlsx files from source_dir (including subfolders) to backup_dir,
-    preserving the folder structure. Create the backup directory if it doesn't exist.
+    ProcessPoolExecutor initializer: hand the operation of the run (a rename table
+    may hold 100k pairs) to each worker once instead of pickling it with every file.
     """
+    global _worker_operation
+    _worker_operation = operation
+    if control is not None:
+        # Pool workers check the control of the run between sheets too
+        run_control.install_worker_control(control)
+
+def _process_in_worker(file_path, *args):
+    return process_file(file_path, _worker_operation, *args)
+
+class _WorkerPool:
+    """
+    The worker processes of a run. A worker that dies (e.g. killed for running out
+    of memory) breaks the whole ProcessPoolExecutor and fails every file in flight
+    with it. The pool is then started again and those files are rerun one at a
+    time, so only the file that takes its worker down is reported as failed.
+    """
+
+    def __init__(self, workers, operation, control=None):
+        self.workers = workers
+        self.setup = (operation, control)
+        # Future -> (file path, estimated memory, process_file arguments after the operation)
+        self.futures = {}
+        self.reserved = 0
+        self._pool = self._start()
+
+    def _start(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_install_worker, initargs=self.setup)
+
+    def _restart(self):
+        self._pool.shutdown(wait=True)
+        self._pool = self._start()
+
+    def submit(self, file_path, estimate, args):
+        """Start a file; yields (file path, future) of the files in flight if the pool has broken meanwhile."""
+        try:
+            future = self._pool.submit(_process_in_worker, *args)
+        except BrokenProcessPool:
+            yield from self._recover([])
+            future = self._pool.submit(_process_in_worker, *args)
+        self.futures[future] = (file_path, estimate, args)
+        self.reserved += estimate
+
+    def wait(self):
+        """Wait for files to finish and yield their (file path, future)."""
+        done, _ = wait(self.futures, return_when=FIRST_COMPLETED)
+        yield from self._finished(done)
+
+    def _finished(self, done):
+        broken = []
+        for future in done:
+            file_path, estimate, args = self.futures.pop(future)
+            self.reserved -= estimate
+            if future.cancelled():
+                continue
+            if isinstance(future.exception(), BrokenProcessPool):
+                broken.append((file_path, args))
+            else:
+                yield file_path, future
+        if broken:
+            yield from self._recover(broken)
+
+    def _recover(self, broken):
+        # Files that finished before the worker died keep their results; the rest failed with it
+        done, _ = wait(self.futures)
+        for future in done:
+            file_path, estimate, args = self.futures.pop(future)
+            self.reserved -= estimate
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                broken.append((file_path, args))
+            elif not future.cancelled():
+                yield file_path, future
+        self._restart()
+        for file_path, args in broken:
+            future = self._pool.submit(_process_in_worker, *args)
+            wait([future])
+            if isinstance(future.exception(), BrokenProcessPool):
+                self._restart()
+            yield file_path, future
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+def _resumed(journal, file_path):
+    """
+    The FileResult of a file the interrupted run finished. It carries what that
+    run did, so a resumed run still knows which operations matched.
+    """
+    entry = journal.finished_entry(file_path)
+    return FileResult(file_path, bool(entry.get("changed")), entry.get("cells", 0), None,
+                      hits=tuple(entry.get("hits", ())), resumed=True)
+
+def run_file_jobs(file_paths, operation, engine="openpyxl", workers=1, prescan=True, lazy_backup=None, cache=None,
+                  preview_dir=None, memory_budget=None, trace=None, journal=None, control=None, pipeline=None):
+    """
+    Yield a FileResult for every file path (or FileEntry of a FileIndex). With
+    workers > 1 the files are handed to a pool of worker processes and the results
+    are yielded as they complete; a worker process that dies fails only the file it
+    was processing (see _WorkerPool). With a RunCache, files it knows need no change are
+    not processed at all and the outcome of every processed file is recorded in it.
+    With a memory_budget in bytes, files too large for openpyxl within the budget are
+    streamed with the xml engine, and the pool only starts another file while the
+    estimated memory of the files in flight fits in the budget (see memory_budget).
+    With a RunTrace, every file records its stage timings (see run_trace). With a
+    RunJournal, files an interrupted run already finished are not processed again
+    and every finished file is appended to the journal. With a RunControl, a pause
+    holds the run before the next file and a cancel stops it: files not started
+    yet are not yielded, and files in flight stop before they are saved. With a
+    StagedPipeline and a single worker, the next files are read while one is
+    edited and edited files are saved while the next is edited (see staged_pipeline).
+    """
+    tracing = trace is not None
+    profile_dir = trace.profile_dir if tracing else None
+    fingerprint = operation_fingerprint(operation) if cache is not None else None
+
+    def cached(item, file_path):
+        if cache is None:
+            return False
+        # A FileEntry already carries the size and mtime from the directory walk
+        return cache.is_unchanged(file_path, fingerprint, getattr(item, "size", None), getattr(item, "mtime_ns", None))
+
+    def recorded(result):
+        if result.cancelled:
+            # Not finished: neither cached as unchanged nor journaled
+            return result
+        if cache is not None:
+            cache.record(result, fingerprint)
+        if journal is not None:
+            journal.record(result)
+        return result
+
+    def planned(item, file_path):
+        """(engine, estimated memory) for one file."""
+        if preview_dir is not None:
+            # A dry run reads every file in read-only mode, which streams the rows
+            return engine, STREAMING_FOOTPRINT
+        size = getattr(item, "size", None)
+        if size is None:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                size = 0
+        file_engine = engine_for(engine, size, memory_budget)
+        return file_engine, estimate_memory(size, file_engine)
+
+    def collected(future, file_path):
+        try:
+            return recorded(future.result())
+        except BrokenProcessPool:
+            return FileResult(file_path, False, 0, "the worker process died while processing this file "
+                                                   "(e.g. out of memory)")
+        except Exception as e:
+            return FileResult(file_path, False, 0, str(e) or type(e).__name__)
+
+    def staged_jobs():
+        for item in file_paths:
+            if control is not None and not control.wait():
+                return
+            file_path = getattr(item, "path", item)
+            if journal is not None and journal.is_finished(file_path):
+                yield "done", _resumed(journal, file_path)
+            elif cached(item, file_path):
+                yield "done", FileResult(file_path, False, 0, None, cached=True)
+            else:
+                file_engine, _ = planned(item, file_path)
+                size = getattr(item, "size", None)
+                yield "file", file_path, size if size is not None else os.path.getsize(file_path), file_engine
+
+    def staged_edit(file_path, data, file_engine):
+        output = []
+        result = process_file(file_path, operation, file_engine, prescan, None, preview_dir, tracing, profile_dir,
+                              control, data, output.append)
+        return result, output[0] if output else None
+
+    if workers <= 1 and pipeline is not None:
+        for result in pipeline.run(staged_jobs(), staged_edit,
+                                   lambda file_path, data, result: _save_staged(file_path, data, result, lazy_backup,
+                                                                                control)):
+            yield recorded(result)
+        return
+    if workers <= 1:
+        for item in file_paths:
+            if control is not None and not control.wait():
+                return
+            file_path = getattr(item, "path", item)
+            if journal is not None and journal.is_finished(file_path):
+                yield _resumed(journal, file_path)
+            elif cached(item, file_path):
+                yield FileResult(file_path, False, 0, None, cached=True)
+            else:
+                file_engine, _ = planned(item, file_path)
+                yield recorded(process_file(file_path, operation, file_engine, prescan, lazy_backup, preview_dir,
+                                            tracing, profile_dir, control))
+        return
+    pool = _WorkerPool(workers, operation, control)
+    try:
+        for item in file_paths:
+            if control is not None and not control.wait():
+                break
+            file_path = getattr(item, "path", item)
+            if journal is not None and journal.is_finished(file_path):
+                yield _resumed(journal, file_path)
+                continue
+            elif cached(item, file_path):
+                yield FileResult(file_path, False, 0, None, cached=True)
+                continue
+            file_engine, estimate = planned(item, file_path)
+            # Let running files finish until this one fits in the memory budget
+            while memory_budget and pool.futures and pool.reserved + estimate > memory_budget:
+                for done_path, future in pool.wait():
+                    yield collected(future, done_path)
+            for done_path, future in pool.submit(file_path, estimate, (file_path, file_engine, prescan, lazy_backup,
+                                                                       preview_dir, tracing, profile_dir)):
+                yield collected(future, done_path)
+        if control is not None and control.cancelled:
+            pool.cancel()
+        while pool.futures:
+            for done_path, future in pool.wait():
+                yield collected(future, done_path)
+    finally:
+        pool.shutdown()
+
+class RunSummary:
+    """Accumulate FileResults of a run and log the pre-scan, scope and memory statistics at the end."""
+
+    def __init__(self, engine="openpyxl"):
+        self.engine = engine
+        self.files = 0
+        self.skipped = 0
+        self.scan_seconds = 0.0
+        self.edited = 0
+        self.edit_seconds = 0.0
+        self.cached = 0
+        self.resumed = 0
+        self.cancelled = 0
+        self.streamed = 0
+        self.peak_rss = 0
+        self.peak_path = None
+        self.scoped = 0
+        self.scope_sheets = 0
+        self.scope_sheets_skipped = 0
+        self.scope_cells = 0
+
+    def add(self, result):
+        self.files += 1
+        if result.coverage:
+            self.scoped += 1
+            self.scope_sheets += result.coverage[0]
+            self.scope_sheets_skipped += result.coverage[1]
+            self.scope_cells += result.coverage[2]
+        if result.engine and result.engine != self.engine:
+            self.streamed += 1
+        if result.peak_rss and result.peak_rss > self.peak_rss:
+            self.peak_rss, self.peak_path = result.peak_rss, result.path
+        if result.resumed:
+            self.resumed += 1
+        elif result.cancelled:
+            self.cancelled += 1
+        elif result.cached:
+            self.cached += 1
+        elif result.skipped:
+            self.skipped += 1
+            self.scan_seconds += result.seconds
+        else:
+            self.edited += 1
+            self.edit_seconds += result.seconds
+
+    def time_saved(self):
+        """Estimated seconds saved by the pre-scan, or None when no file was fully processed."""
+        if not self.edited:
+            return None
+        return max(0.0, self.skipped * self.edit_seconds / self.edited - self.scan_seconds)
+
+    def log(self, log_widget):
+        if self.resumed:
+            log_widget.insert(END, f"ℹ Skipped {self.resumed} of {self.files} files finished by the interrupted run.\n", "info")
+        if self.cached:
+            log_widget.insert(END, f"ℹ Cache skipped {self.cached} of {self.files} files unchanged since an identical run.\n", "info")
+        if self.streamed:
+            log_widget.insert(END, f"ℹ Streamed {self.streamed} large files with the xml engine to stay within the memory budget.\n", "info")
+        if self.peak_rss:
+            log_widget.insert(END, f"ℹ Peak memory {format_size(self.peak_rss)} while processing {self.peak_path}.\n", "info")
+        if self.scoped:
+            log_widget.insert(END, f"ℹ Scope: read {self.scope_cells} string cells in {self.scope_sheets} sheets of "
+                                   f"{self.scoped} files; {self.scope_sheets_skipped} sheets outside the scope were "
+                                   f"skipped.\n", "info")
+        if not self.skipped:
+            return
+        message = f"ℹ Pre-scan skipped {self.skipped} of {self.files} files"
+        saved = self.time_saved()
+        if saved is not None:
+            message += f" (about {saved:.1f}s saved)"
+        log_widget.insert(END, message + ".\n", "info")
+
+def log_cancelled(log_widget, summary, file_index, journal=None):
+    """Say what a cancelled run got through and what it left alone."""
+    finished = summary.files - summary.cancelled
+    message = f"⏹ Run cancelled after {finished} files."
+    if summary.cancelled:
+        message += f" {summary.cancelled} files were stopped before saving and are unchanged."
+    if file_index.complete:
+        message += f" {len(file_index) - finished - summary.cancelled} files were not started."
+    else:
+        message += " The rest of the folder was not processed."
+    if journal:
+        message += " Resume the run to continue where it stopped."
+    log_widget.insert(END, message + "\n", "warning")
+
+def update_progress(progress_bar, percent_label, processed, total_files, complete=True):
+    """
+    Show processed of total_files. While the directory walk is still running
+    (complete is False) total_files is only the number found so far.
+    """
+    progress_bar["maximum"] = total_files
+    progress_bar["value"] = processed
+    if complete:
+        percent = int((processed / total_files) * 100)
+        percent_label.config(text=f"{percent}%")
+    else:
+        percent_label.config(text=f"{processed} files (still looking for more...)")
+    progress_bar.update_idletasks()
+
+def no_files_found(log_widget, progress_bar, percent_label):
+    log_widget.insert(END, "❌ No Excel files found.\n", "error")
+    progress_bar["value"] = 0
+    percent_label.config(text="")
+
+def search_replace_or_remove_key(file_path, key, new_value, remove_key, log_widget, key_found, engine="openpyxl"):
+    operation = key_operation(key, new_value, remove_key)
+    result = process_file(file_path, operation, engine)
+    log_file_result(result, operation, log_widget)
+    if result.changed:
+        key_found[0] = True
+    return result.cells
+
+def open_backup_dir(backup_dir, log_widget):
     if not os.path.exists(backup_dir):
         os.makedirs(backup_dir, exist_ok=True)
         log_widget.insert(END, f"ℹ Created backup directory: {backup_dir}\n", "info")
     else:
         log_widget.insert(END, f"ℹ Using existing backup directory: {backup_dir}\n", "info")
-    for root, _, files in os.walk(source_dir):
-        # Exclude the backup folder (compare absolute paths)
-        if os.path.abspath(root) == os.path.abspath(backup_dir):
-            continue
-        for file in files:
-            if file.endswith('.xlsx'):
-                source_file = os.path.join(root, file)
-                rel_path = os.path.relpath(root, source_dir)
-                target_folder = os.path.join(backup_dir, rel_path)
-                os.makedirs(target_folder, exist_ok=True)
-                target_file = os.path.join(target_folder, file)
-                shutil.copy2(source_file, target_file)
-                log_widget.insert(END, f"Backup: {source_file} -> {target_file}\n", "info")
-
-def process_excel_files(directory_path, backup_dir, key, new_value, remove_key, log_widget, progress_bar, percent_label):
-    log_widget.delete(1.0, END)
-    log_widget.insert(END, f"🔄 Processing files in {directory_path}...\n", "info")
-    total_files = 0
-    for root, dirs, files in os.walk(directory_path):
-        if backup_dir:
-            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != os.path.abspath(backup_dir)]
-        for file in files:
-            if file.endswith('.xlsx'):
-                total_files += 1
-    if total_files == 0:
-        log_widget.insert(END, "❌ No Excel files found.\n", "error")
-        progress_bar["value"] = 0
-        percent_label.config(text="")
+
+def backup_excel_files(source_dir, backup_dir, log_widget, mode="copy", file_index=None, keep_existing=False,
+                       control=None, threads=DEFAULT_BACKUP_THREADS, verify=False):
+    """
+    Copy all .xlsx files from source_dir (including subfolders) to backup_dir,
+    preserving the folder structure. Create the backup directory if it doesn't exist.
+    file_index (a FileIndex of source_dir) saves a separate directory walk.
+    In "snapshot" mode files are reflinked or hard-linked instead of copied; edits
+    always write a new file, so the snapshot keeps the original content.
+    threads files are backed up at once, backups that already match their file
+    are not copied again, and with verify every copy is checked against its
+    source (see backup_copier). With keep_existing, files that already have a
+    backup are left alone (when resuming, those backups hold the content from
+    before the interrupted run). A RunControl can pause or stop the backup.
+    """
+    copier = BackupCopier(source_dir, backup_dir, mode, threads, verify, keep_existing)
+    open_backup_dir(backup_dir, log_widget)
+    copier.run(file_index if file_index is not None else scan_excel_files(source_dir, backup_dir), log_widget, control)
+    if control is not None and control.cancelled:
+        log_widget.insert(END, "⏹ Backup cancelled.\n", "warning")
+        return copier
+    copier.log(log_widget)
+    return copier
+
+def backup_dir_for(directory, backup_dir_value=""):
+    """Backup folder of directory, as resolve_backup_dir picks it, without logging."""
+    if not backup_dir_value or os.path.abspath(backup_dir_value) == os.path.abspath(directory):
+        return os.path.join(directory, "Backup")
+    return backup_dir_value
+
+def resolve_backup_dir(directory, backup_dir_value, log_widget):
+    """Backup folder to use for directory: the one from Settings, or a 'Backup' subfolder."""
+    if not backup_dir_value:
+        log_widget.insert(END, "ℹ No backup directory specified in Settings. Using default 'Backup' folder inside the processing directory.\n", "info")
+        return os.path.join(directory, "Backup")
+    if os.path.abspath(backup_dir_value) == os.path.abspath(directory):
+        log_widget.insert(END, "⚠ Backup directory is the same as processing directory. Using a subfolder 'Backup' instead.\n", "warning")
+        return os.path.join(directory, "Backup")
+    return backup_dir_value
+
+def prepare_backup(directory, backup_dir, log_widget, backup_mode="copy", preview_path=None,
+                   threads=DEFAULT_BACKUP_THREADS, verify=False):
+    """
+    Set up the backup of directory for a run and return the BackupCopier that
+    takes it, or None when nothing is backed up up front (dry runs, and lazy
+    backups, which are taken file by file during the run). The copier is handed
+    to the run as its backup_stage: each file is edited as soon as its own
+    backup is done, and its backup time is recorded as the run's "backup"
+    stage. threads backups are taken at once, and with verify each new backup
+    is compared with its file. The run keeps existing backups when it resumes an
+    interrupted run (see resume_backups).
+    """
+    if preview_path:
+        log_widget.insert(END, "🔍 Dry run: no file will be backed up or saved.\n", "info")
         return
-    progress_bar["maximum"] = total_files
+    if backup_mode == "lazy":
+        log_widget.insert(END, f"ℹ Changed files will be backed up to {backup_dir} just before they are saved.\n", "info")
+        return
+    open_backup_dir(backup_dir, log_widget)
+    log_widget.insert(END, f"🔄 Backing up files with {max(1, threads)} threads; each file is processed once its backup "
+                           f"is done...\n", "info")
+    return BackupCopier(directory, backup_dir, backup_mode, threads, verify)
+
+def resume_backups(backup_stage, journal):
+    """
+    Keep the existing backups only when the run resumes an interrupted run of the
+    same operation: those backups hold the files as they were before it changed
+    them. Any other run, resume set or not, backs up the files as they are now.
+    """
+    if backup_stage:
+        backup_stage.keep_existing = bool(journal and journal.finished)
+
+class BackupManifest:
+    """
+    Record the files a lazy backup copied, so they can be restored. Rows are
+    appended to BACKUP_MANIFEST in the backup folder as source,backup,backed_up_at.
+    """
+
+    def __init__(self, directory_path, backup_dir):
+        if not backup_dir:
+            raise ValueError("Lazy backups need a backup directory.")
+        self.lazy_backup = (directory_path, backup_dir)
+        self.path = os.path.join(backup_dir, BACKUP_MANIFEST)
+        self.count = 0
+
+    def add(self, result):
+        if not result.backup:
+            return
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["source", "backup", "backed_up_at"])
+            writer.writerow([os.path.abspath(result.path), os.path.abspath(result.backup),
+                             time.strftime("%Y-%m-%dT%H:%M:%S")])
+        self.count += 1
+
+    def log(self, log_widget):
+        if self.count:
+            log_widget.insert(END, f"ℹ Backed up {self.count} changed files, listed in {self.path}.\n", "info")
+        else:
+            log_widget.insert(END, "ℹ No file changed, nothing was backed up.\n", "info")
+
+PREVIEW_FIELDS = ["file", "sheet", "cell", "before", "after"]
+
+class PreviewReport:
+    """
+    Dry-run report of every cell a run would change, written as CSV or, for a
+    .jsonl path, as JSON lines. Each workbook's rows arrive as a part file (see
+    process_file) that is streamed into the report and deleted, so memory use
+    does not grow with the size of the run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(self.directory, exist_ok=True)
+        self.jsonl = path.lower().endswith(".jsonl")
+        self._out = open(path, "w", newline="", encoding="utf-8")
+        self._writer = None if self.jsonl else csv.writer(self._out)
+        if self._writer:
+            self._writer.writerow(PREVIEW_FIELDS)
+        self.files = 0
+        self.cells = 0
+
+    def add(self, result):
+        if not result.preview:
+            return
+        with open(result.preview, newline="", encoding="utf-8") as part:
+            for row in csv.reader(part):
+                if self._writer:
+                    self._writer.writerow(row)
+                else:
+                    self._out.write(json.dumps(dict(zip(PREVIEW_FIELDS, row)), ensure_ascii=False) + "\n")
+        os.remove(result.preview)
+        self._out.flush()
+        self.files += 1
+        self.cells += result.cells
+
+    def log(self, log_widget):
+        log_widget.insert(END, f"🔍 Dry run: {self.cells} cells in {self.files} files would change. "
+                               f"No file was saved; the changes are listed in {self.path}.\n", "info")
+
+    def close(self):
+        self._out.close()
+
+def dry_run_report_path(directory):
+    """Default dry-run report location for the GUI: a time-stamped CSV in the processing directory."""
+    return os.path.join(directory, time.strftime("dry_run_%Y%m%d-%H%M%S.csv"))
+
+def run_directory(directory_path, operation, log_widget, progress_bar, percent_label, backup_dir=None, engine="openpyxl", workers=1, prescan=True, backup_mode="copy", cache_path=None, on_result=None, file_index=None, preview_path=None, memory_budget=None, trace=None, journal_dir=None, resume=False, control=None, backup_stage=None, pipeline=None, shard=None, shard_results=None):
+    """
+    Apply an operation tuple to every workbook under directory_path (or to those
+    of one shard, see shards) and log the outcome. The directory drivers below
+    only build their operation and say what did not match. Returns (failed,
+    matched): failed is True when an error stopped the run (it is logged), and
+    matched holds the indexes of the operation_steps that matched a file, or is
+    None when the run did not get to the end (error, cancel or no files).
+    """
+    if workers > 1:
+        log_widget.insert(END, f"ℹ Using {workers} worker processes.\n", "info")
     progress_bar["value"] = 0
-    key_found = [False]
     processed = 0
     progress_bar.grid()
     percent_label.grid()
+    scope, _ = split_scope(operation)
+    if scope is not None:
+        log_widget.insert(END, f"ℹ Only editing {scope.describe()}.\n", "info")
+    summary = RunSummary(engine)
+    report = cache = journal = results = None
+    complete = False
+    matched = set()
     try:
-        for root, dirs, files in os.walk(directory_path):
-            if backup_dir:
-                dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != os.path.abspath(backup_dir)]
-            for file in files:
-                if file.endswith('.xlsx'):
-                    file_path = os.path.join(root, file)
-                    search_replace_or_remove_key(file_path, key, new_value, remove_key, log_widget, key_found)
-                    processed += 1
-                    progress_bar["value"] = processed
-                    percent = int((processed / total_files) * 100)
-                    percent_label.config(text=f"{percent}%")
-                    progress_bar.update_idletasks()
-        if not key_found[0]:
-            log_widget.insert(END, f"⚠ Warning: The key '{key}' was not found in any file.\n", "warning")
-            show_custom_warning_popup(f"The key '{key}' was not found in any file.")
-        log_widget.insert(END, "✅ Process completed!\n", "success")
+        file_index = file_index or FileIndex(directory_path, backup_dir)
+        if shard:
+            file_index = shard_files(file_index, shard)
+            log_widget.insert(END, f"ℹ Shard {describe_shard(shard)}: only the files of this shard are processed.\n",
+                              "info")
+        # A dry run writes nothing: no lazy backups and no cache entries
+        report = PreviewReport(preview_path) if preview_path else None
+        backups = BackupManifest(directory_path, backup_dir) if backup_mode == "lazy" and not report else None
+        cache = RunCache(cache_path) if cache_path and not report else None
+        fingerprint = operation_fingerprint(operation)
+        journal = RunJournal(journal_dir, directory_path, fingerprint, resume, shard) if journal_dir and not report \
+            else None
+        resume_backups(backup_stage, journal)
+        results = ShardResults(shard_results, shard, directory_path, fingerprint, operation_steps(operation),
+                               resume) if shard and shard_results else None
+        if journal:
+            journal.log(log_widget)
+        for result in run_file_jobs(backup_stage.ready(file_index, log_widget, control) if backup_stage else file_index,
+                                    operation, engine, workers, prescan,
+                                    backups and backups.lazy_backup, cache,
+                                    report and report.directory, memory_budget, trace, journal, control,
+                                    pipeline):
+            log_file_result(result, operation, log_widget)
+            if on_result:
+                on_result(result)
+            summary.add(result)
+            if backups:
+                backups.add(result)
+            if report:
+                report.add(result)
+            if trace:
+                trace.add(result)
+            if results:
+                results.add(result)
+            # Only batches report hits; a single operation matched when it changed (or would change) the file
+            matched.update(result.hits or ((0,) if result.changed or result.preview else ()))
+            processed += 1
+            update_progress(progress_bar, percent_label, processed, len(file_index), file_index.complete)
+        complete = not (control and control.cancelled)
     except Exception as e:
         log_widget.insert(END, f"❌ An error occurred: {e}\n", "error")
+        return True, None
+    finally:
+        if cache:
+            cache.close()
+        if report:
+            report.close()
+        if journal:
+            journal.close(complete)
+        if results:
+            results.close(complete)
+    if not complete:
+        summary.log(log_widget)
+        log_cancelled(log_widget, summary, file_index, journal)
+        return False, None
+    if not processed:
+        no_files_found(log_widget, progress_bar, percent_label)
+        return False, None
+    update_progress(progress_bar, percent_label, processed, len(file_index))
+    summary.log(log_widget)
+    if backup_stage:
+        backup_stage.log(log_widget)
+    if pipeline:
+        pipeline.log(log_widget)
+    if results:
+        results.log(log_widget)
+    if backups:
+        backups.log(log_widget)
+    if report:
+        report.log(log_widget)
+    if trace:
+        trace.stage("discover", file_index.scan_seconds)
+        if backup_stage:
+            trace.stage("backup", backup_stage.seconds)
+        trace.log(log_widget)
+    return False, matched
 
-def process_value_cells(file_path, old_value, new_value, log_widget):
-    try:
-        workbook = openpyxl.load_workbook(file_path)
-        updated = False
-        for sheet in workbook.sheetnames:
-            ws = workbook[sheet]
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value and isinstance(cell.value, str) and old_value in cell.value:
-                        cell.value = cell.value.replace(old_value, new_value)
-                        updated = True
-        if updated:
-            workbook.save(file_path)
-            log_widget.insert(END, f"✅ Processed cells replacing '{old_value}' with '{new_value}' in: {file_path}\n", "success")
-        else:
-            log_widget.insert(END, f"⚠ No cells containing '{old_value}' found in: {file_path}\n", "warning")
-    except Exception as e:
-        log_widget.insert(END, f"❌ Error processing cells in {file_path}: {e}\n", "error")
-
-def process_value_in_directory(directory_path, old_value, new_value, log_widget, progress_bar, percent_label, backup_dir=None):
-    total_files = 0
-    for root, dirs, files in os.walk(directory_path):
-        if backup_dir:
-            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != os.path.abspath(backup_dir)]
-        for file in files:
-            if file.endswith('.xlsx'):
-                total_files += 1
-    if total_files == 0:
-        log_widget.insert(END, "❌ No Excel files found.\n", "error")
-        progress_bar["value"] = 0
-        percent_label.config(text="")
-        return
-    progress_bar["maximum"] = total_files
-    progress_bar["value"] = 0
-    processed = 0
-    progress_bar.grid()
-    percent_label.grid()
-    for root, dirs, files in os.walk(directory_path):
-        if backup_dir:
-            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != os.path.abspath(backup_dir)]
-        for file in files:
-            if file.endswith('.xlsx'):
-                file_path = os.path.join(root, file)
-                process_value_cells(file_path, old_value, new_value, log_widget)
-                processed += 1
-                progress_bar["value"] = processed
-                percent = int((processed / total_files) * 100)
-                percent_label.config(text=f"{percent}%")
-                progress_bar.update_idletasks()
-    log_widget.insert(END, "✅ Value replacement completed!\n", "success")
-
-def start_value_replacement(directory, old_value, new_value, log_widget, progress_bar, percent_label, backup_dir_value):
+def process_excel_files(directory_path, backup_dir, key, new_value, remove_key, log_widget, progress_bar, percent_label, engine="openpyxl", workers=1, popup=True, scope=None, shard=None, **options):
+    """
+    Set key to new_value, or remove it, in every workbook; options are those of
+    run_directory. Returns False when an error stopped the run.
+    """
+    log_widget.delete(1.0, END)
+    log_widget.insert(END, f"🔄 Processing files in {directory_path}...\n", "info")
+    operation = scoped_operation(key_operation(key, new_value, remove_key), scope)
+    failed, matched = run_directory(directory_path, operation, log_widget, progress_bar, percent_label, backup_dir,
+                                    engine, workers, shard=shard, **options)
+    if matched is None:
+        return not failed
+    if not matched and shard:
+        # Other shards may hold the key: only merging their results tells (see shards.merge_shards)
+        log_widget.insert(END, f"ℹ The key '{key}' was not found in this shard.\n", "info")
+    elif not matched:
+        key_not_found(key, log_widget, popup)
+    log_widget.insert(END, "✅ Process completed!\n", "success")
+    return True
+
+def key_not_found(key, log_widget, popup=True):
+    log_widget.insert(END, f"⚠ Warning: The key '{key}' was not found in any file.\n", "warning")
+    if popup:
+        # popup may be a callable that shows the warning on the Tk thread (see event_channel)
+        (popup if callable(popup) else show_custom_warning_popup)(f"The key '{key}' was not found in any file.")
+
+def narrow_to_key(file_index, key, index_path, log_widget, trace=None, control=None):
+    """
+    Refresh the key index at index_path for the directory of file_index (see
+    key_index) and return a FileIndex of just the files that hold key. Only the
+    files changed since the last refresh are read. With a RunTrace the refresh
+    is recorded as the run's "index" stage.
+    """
+    log_widget.insert(END, "🔎 Updating the key index...\n", "info")
+    with KeyIndex(index_path) as index:
+        stats = index.refresh(file_index, control=control)
+        targets = key_files(file_index, key, index)
+    targets.scan_seconds = file_index.scan_seconds
+    if trace:
+        trace.stage("index", stats.seconds - file_index.scan_seconds)
+    log_widget.insert(END, f"ℹ Key index: {len(targets)} of {stats.files} files hold the key '{key}' "
+                           f"({stats.indexed} files read in {stats.seconds:.2f}s).\n", "info")
+    return targets
+
+def process_value_cells(file_path, old_value, new_value, log_widget, engine="openpyxl"):
+    operation = value_operation(old_value, new_value)
+    result = process_file(file_path, operation, engine)
+    log_file_result(result, operation, log_widget)
+    return result.cells
+
+def process_value_in_directory(directory_path, old_value, new_value, log_widget, progress_bar, percent_label, backup_dir=None, engine="openpyxl", workers=1, scope=None, **options):
+    """
+    Replace old_value with new_value in every string cell of every workbook;
+    options are those of run_directory. Returns False when an error stopped the run.
+    """
+    operation = scoped_operation(value_operation(old_value, new_value), scope)
+    failed, matched = run_directory(directory_path, operation, log_widget, progress_bar, percent_label, backup_dir,
+                                    engine, workers, **options)
+    if matched is not None:
+        log_widget.insert(END, "✅ Value replacement completed!\n", "success")
+    return not failed
+
+def process_batch_in_directory(directory_path, operations, log_widget, progress_bar, percent_label, backup_dir=None, engine="openpyxl", workers=1, scope=None, shard=None, **options):
+    """
+    Apply a list of operations (see manifest.py) to every workbook with a single
+    directory walk and a single load/save per file; options are those of
+    run_directory. Returns False when an error stopped the run.
+    """
+    log_widget.insert(END, f"🔄 Applying {len(operations)} operations to files in {directory_path}...\n", "info")
+    operation = scoped_operation(batch_operation(operations), scope)
+    failed, matched = run_directory(directory_path, operation, log_widget, progress_bar, percent_label, backup_dir,
+                                    engine, workers, shard=shard, **options)
+    if matched is None:
+        return not failed
+    for index, step in enumerate(operations):
+        if index not in matched and shard:
+            log_widget.insert(END, f"ℹ {describe_operation(step)} did not match any file of this shard.\n", "info")
+        elif index not in matched:
+            log_widget.insert(END, f"⚠ Warning: {describe_operation(step)} did not match any file.\n", "warning")
+    log_widget.insert(END, "✅ Batch completed!\n", "success")
+    return True
+
+def staged_pipeline(staged, workers):
+    """A StagedPipeline for a staged run; runs with worker processes overlap files already."""
+    return StagedPipeline() if staged and workers <= 1 else None
+
+def start_value_replacement(directory, old_value, new_value, log_widget, progress_bar, percent_label, backup_dir_value, *, engine="openpyxl", workers=1, mapping_path="", backup_mode="copy", cache_path=None, preview_path=None, memory_budget=None, trace_path=None, profile_slowest=0, journal_dir=None, resume=False, control=None, scope_fields=None, backup_threads=DEFAULT_BACKUP_THREADS, verify_backups=False, staged=False):
     """
     For the Value Replacer: Validate the directory, determine the backup directory,
-    perform backup, and then process value replacement.
+    perform backup, and then process value replacement. With a rename table
+    (mapping_path) all of its entries are replaced in a single pass instead.
+    With preview_path nothing is backed up or saved; the cells that would change
+    are written to that report (see PreviewReport). With trace_path the stage
+    timings of the run are written there (see RunTrace), and with profile_slowest
+    the cProfile profiles of that many of the slowest files are kept beside it.
+    With journal_dir every finished file is journaled there (see RunJournal), and
+    resume skips the files an interrupted run of the same replacement finished.
+    A RunControl pauses or cancels the run from another thread (see run_control).
+    scope_fields, the (sheet globs, columns, ranges) typed in Settings, limits the
+    run to those cells (see scope.parse_scope). Backups are taken backup_threads
+    at a time while the run edits the files already backed up, and with
+    verify_backups every new backup is checked against its file. staged runs a
+    single-worker run as a staged pipeline that reads, edits and saves different
+    files at once (see staged_pipeline).
     """
+    from manifest import load_mapping  # manifest builds on this module
     if not os.path.exists(directory):
         log_widget.insert(END, "❌ Please select a valid processing directory.\n", "error")
         return
-    backup_dir = backup_dir_value
-    if not backup_dir:
-        backup_dir = os.path.join(directory, "Backup")
-        log_widget.insert(END, "ℹ No backup directory specified in Settings. Using default 'Backup' folder inside the processing directory.\n", "info")
-    elif os.path.abspath(backup_dir) == os.path.abspath(directory):
-        log_widget.insert(END, "⚠ Backup directory is the same as processing directory. Using a subfolder 'Backup' instead.\n", "warning")
-        backup_dir = os.path.join(directory, "Backup")
-    log_widget.insert(END, "🔄 Backing up files...\n", "info")
-    backup_excel_files(directory, backup_dir, log_widget)
-    log_widget.insert(END, "✅ Backup completed!\n", "success")
-    progress_bar.grid()
-    percent_label.grid()
-    process_value_in_directory(directory, old_value, new_value, log_widget, progress_bar, percent_label, backup_dir)
+    scope = read_scope(scope_fields, log_widget)
+    if scope is False:
+        return
+    operations = None
+    if mapping_path:
+        try:
+            operations = [mapping_operation(load_mapping(mapping_path))]
+        except (OSError, ValueError) as e:
+            log_widget.insert(END, f"❌ Could not read rename table: {e}\n", "error")
+            return
+    backup_dir = resolve_backup_dir(directory, backup_dir_value, log_widget)
+    file_index = FileIndex(directory, backup_dir)
+    trace = RunTrace(trace_path, profile_slowest) if trace_path else None
+    try:
+        backup_stage = prepare_backup(directory, backup_dir, log_widget, backup_mode, preview_path, backup_threads,
+                                      verify_backups)
+        progress_bar.grid()
+        percent_label.grid()
+        if operations:
+            process_batch_in_directory(directory, operations, log_widget, progress_bar, percent_label, backup_dir, engine,
+                                       workers, backup_mode=backup_mode, cache_path=cache_path, file_index=file_index,
+                                       preview_path=preview_path, memory_budget=memory_budget, trace=trace,
+                                       journal_dir=journal_dir, resume=resume, control=control, scope=scope,
+                                       backup_stage=backup_stage, pipeline=staged_pipeline(staged, workers))
+        else:
+            process_value_in_directory(directory, old_value, new_value, log_widget, progress_bar, percent_label, backup_dir,
+                                       engine, workers, backup_mode=backup_mode, cache_path=cache_path,
+                                       file_index=file_index, preview_path=preview_path, memory_budget=memory_budget,
+                                       trace=trace, journal_dir=journal_dir, resume=resume, control=control, scope=scope,
+                                       backup_stage=backup_stage, pipeline=staged_pipeline(staged, workers))
+    finally:
+        if trace:
+            trace.close()
+
+def start_batch(directory, manifest_path, log_widget, progress_bar, percent_label, backup_dir_value, *, engine="openpyxl", workers=1, backup_mode="copy", cache_path=None, preview_path=None, memory_budget=None, trace_path=None, profile_slowest=0, journal_dir=None, resume=False, control=None, scope_fields=None, backup_threads=DEFAULT_BACKUP_THREADS, verify_backups=False, staged=False):
+    """
+    For the Batch tab: load the manifest, back up the directory once and apply
+    every operation of the manifest in a single pass. trace_path, profile_slowest,
+    journal_dir, resume, control, scope_fields, backup_threads, verify_backups and
+    staged work as in start_value_replacement.
+    """
+    from manifest import load_manifest  # manifest builds on this module
+    if not directory or not os.path.exists(directory):
+        log_widget.insert(END, "❌ Please select a valid processing directory.\n", "error")
+        return
+    scope = read_scope(scope_fields, log_widget)
+    if scope is False:
+        return
+    try:
+        operations = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        log_widget.insert(END, f"❌ Could not read manifest: {e}\n", "error")
+        return
+    backup_dir = resolve_backup_dir(directory, backup_dir_value, log_widget)
+    file_index = FileIndex(directory, backup_dir)
+    trace = RunTrace(trace_path, profile_slowest) if trace_path else None
+    try:
+        backup_stage = prepare_backup(directory, backup_dir, log_widget, backup_mode, preview_path, backup_threads,
+                                      verify_backups)
+        progress_bar.grid()
+        percent_label.grid()
+        process_batch_in_directory(directory, operations, log_widget, progress_bar, percent_label, backup_dir, engine,
+                                   workers, backup_mode=backup_mode, cache_path=cache_path, file_index=file_index,
+                                   preview_path=preview_path, memory_budget=memory_budget, trace=trace,
+                                   journal_dir=journal_dir, resume=resume, control=control, scope=scope,
+                                   backup_stage=backup_stage, pipeline=staged_pipeline(staged, workers))
+    finally:
+        if trace:
+            trace.close()
 
 def show_custom_warning_popup(message):
+    from tkinter import Toplevel, Label, Button
     popup = Toplevel()
     popup.title("Warning")
     popup.geometry("300x100")
@@ -227,50 +1414,140 @@ def show_custom_warning_popup(message):
     popup.grab_set()
 
 def check_for_updates():
+    from tkinter import messagebox
     latest_version = fetch_latest_version()
     if latest_version > VERSION:
         messagebox.showinfo("Update Available", f"A new version ({latest_version}) is available!\nVisit GitHub to download.")
     else:
         messagebox.showinfo("Up to Date", "You are using the latest version.")
 
+def parse_worker_count(text):
+    """Turn the worker count typed in Settings into a positive int, defaulting to a single worker."""
+    try:
+        return max(1, int(text))
+    except (TypeError, ValueError):
+        return 1
+
+def toggle_pause(control, button):
+    """Pause button of a tab: pause the running job, or resume it when it is paused."""
+    if control.paused:
+        control.resume()
+        button.config(text="Pause")
+    else:
+        control.pause()
+        button.config(text="Resume")
+
+def cancel_run(control, pause_button):
+    """Cancel button of a tab: stop the running job (a paused one too) before its next file or sheet."""
+    control.cancel()
+    pause_button.config(text="Pause")
+
+def read_scope(scope_fields, log_widget):
+    """
+    Parse the (sheet globs, columns, ranges) of a run into a Scope, or None when
+    they are all empty. Logs the problem and returns False when they are invalid.
+    """
+    if not scope_fields:
+        return None
+    try:
+        scope = parse_scope(*scope_fields)
+    except ValueError as e:
+        log_widget.insert(END, f"❌ Invalid scope: {e}\n", "error")
+        return False
+    return scope
+
+def trace_file_path():
+    """Default timing trace location for the GUI: a time-stamped JSON file next to the session logs."""
+    return os.path.join(LOG_DIR, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+
+def parse_memory_budget(text):
+    """Turn the memory budget typed in Settings (e.g. "4G") into bytes, or None for no budget."""
+    try:
+        return parse_size(text) or None
+    except ValueError:
+        return None
+
+def clear_run_cache(cache_path=DEFAULT_CACHE_PATH):
+    from tkinter import messagebox
+    with RunCache(cache_path) as cache:
+        removed = cache.invalidate()
+    messagebox.showinfo("Cache Cleared", f"Removed {removed} cache entries.")
+
+def browse_file(entry_widget, filetypes):
+    from tkinter import filedialog
+    file_path = filedialog.askopenfilename(filetypes=filetypes)
+    if file_path:
+        entry_widget.delete(0, END)
+        entry_widget.insert(0, file_path)
+
 def browse_directory(entry_widget):
+    from tkinter import filedialog
     directory = filedialog.askdirectory()
     if directory:
         entry_widget.delete(0, END)
         entry_widget.insert(0, directory)
 
 def open_github_link():
+    import webbrowser
     webbrowser.open("https://github.com/Maksymilianx/Excel_word_changer")
 
-def start_processing(directory_entry, key_entry, value_entry, remove_key_var, log_widget, progress_bar, percent_label, backup_dir_value):
+def start_processing(directory_entry, key_entry, value_entry, remove_key_var, log_widget, progress_bar, percent_label, backup_dir_value, *, engine="openpyxl", workers=1, backup_mode="copy", cache_path=None, popup=True, preview_path=None, memory_budget=None, trace_path=None, profile_slowest=0, journal_dir=None, resume=False, control=None, scope_fields=None, backup_threads=DEFAULT_BACKUP_THREADS, verify_backups=False, key_index_path=None, staged=False):
+    """
+    For the Flat file fixer: read and validate the form on the Tk thread, then back up
+    and process the directory on a worker thread. log_widget, progress_bar and
+    percent_label are only written to, so the GUI passes EventChannel stand-ins.
+    With preview_path the run is a dry run; trace_path, profile_slowest, journal_dir,
+    resume, control, scope_fields, backup_threads, verify_backups and staged work as
+    in start_value_replacement. With key_index_path only the files a key index
+    lists for the key are backed up and processed (see narrow_to_key).
+    """
     directory = directory_entry.get()
     key = key_entry.get()
     new_value = value_entry.get()
     remove_key = remove_key_var.get()
-    backup_dir = backup_dir_value  # Passed in as parameter
     if not directory or not os.path.exists(directory):
         log_widget.insert(END, "❌ Please select a valid processing directory.\n", "error")
         return
-    if not backup_dir:
-        backup_dir = os.path.join(directory, "Backup")
-        log_widget.insert(END, "ℹ No backup directory specified in Settings. Using default 'Backup' folder inside the processing directory.\n", "info")
-    elif os.path.abspath(backup_dir) == os.path.abspath(directory):
-        log_widget.insert(END, "⚠ Backup directory is the same as processing directory. Using a subfolder 'Backup' instead.\n", "warning")
-        backup_dir = os.path.join(directory, "Backup")
+    backup_dir = resolve_backup_dir(directory, backup_dir_value, log_widget)
     if not key:
         log_widget.insert(END, "❌ Please enter a key to search for.\n", "error")
         return
     if not remove_key and not new_value:
         log_widget.insert(END, "❌ Please enter a new value or check the 'Remove Key' option.\n", "error")
         return
-    if remove_key:
+    scope = read_scope(scope_fields, log_widget)
+    if scope is False:
+        return
+    if remove_key and not preview_path:
+        from tkinter import messagebox
         confirm = messagebox.askyesno("Confirm Deletion", f"Are you sure you want to remove '{key}' and its value?")
         if not confirm:
             log_widget.insert(END, "⚠ Deletion canceled by user.\n", "warning")
             return
-    log_widget.insert(END, "🔄 Backing up files...\n", "info")
-    backup_excel_files(directory, backup_dir, log_widget)
-    log_widget.insert(END, "✅ Backup completed!\n", "success")
-    progress_bar.grid()
-    percent_label.grid()
-    threading.Thread(target=process_excel_files, args=(directory, backup_dir, key, new_value, remove_key, log_widget, progress_bar, percent_label)).start()
+
+    def run():
+        file_index = FileIndex(directory, backup_dir)
+        trace = RunTrace(trace_path, profile_slowest) if trace_path else None
+        try:
+            if key_index_path:
+                file_index = narrow_to_key(file_index, key, key_index_path, log_widget, trace, control)
+                if control and control.cancelled:
+                    return
+                if not len(file_index):
+                    key_not_found(key, log_widget, popup)
+                    return
+            backup_stage = prepare_backup(directory, backup_dir, log_widget, backup_mode, preview_path,
+                                          backup_threads, verify_backups)
+            progress_bar.grid()
+            percent_label.grid()
+            process_excel_files(directory, backup_dir, key, new_value, remove_key, log_widget, progress_bar,
+                                percent_label, engine, workers, backup_mode=backup_mode, cache_path=cache_path,
+                                popup=popup, file_index=file_index, preview_path=preview_path,
+                                memory_budget=memory_budget, trace=trace, journal_dir=journal_dir, resume=resume,
+                                control=control, scope=scope, backup_stage=backup_stage,
+                                pipeline=staged_pipeline(staged, workers))
+        finally:
+            if trace:
+                trace.close()
+
+    threading.Thread(target=run).start()
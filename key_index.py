@@ -0,0 +1,270 @@
+"""
+Persistent inventory of the pipe-record keys of the workbooks under a directory.
+
+Finding where a key such as "VersionsNr" lives otherwise takes a full pass over
+every workbook. A KeyIndex records, per file, every key=value field of its
+string cells (file, sheet, cell, key, value) and, when asked for, the text of
+every string cell. A refresh only reads the files whose size or mtime changed
+since they were indexed and drops the files that are gone, so after the first
+build it costs little more than a directory walk. Runs can then open only the
+files that hold their key, and a lookup answers in milliseconds:
+
+    python key_index.py build DIRECTORY [--values]
+    python key_index.py query KEY [--directory DIRECTORY] [--locations | --values]
+    python key_index.py text TEXT [--directory DIRECTORY]
+    python key_index.py keys [--directory DIRECTORY]
+
+Keys are found the way the Flat file fixer matches them (see pipe_record), so a
+file the index does not list for a key has no cell the key could change.
+"""
+import argparse
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from file_index import FileIndex
+from pipe_record import PipeRecord
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".xlsx_fixer", "key_index.sqlite3")
+# Bump when what is recorded per file changes; an index of another version is rebuilt
+INDEX_VERSION = 1
+# Files read between commits, so an interrupted build keeps most of its work
+COMMIT_EVERY = 50
+
+RefreshStats = namedtuple("RefreshStats", ["files", "indexed", "removed", "errors", "seconds"])
+
+
+def read_inventory(file_path, with_values=False):
+    """
+    Return the (sheet, cell, key, value) fields and, with_values, the (sheet,
+    cell, text) string cells of a workbook. It is read with openpyxl in
+    read-only mode, so rows are streamed instead of loading whole sheets.
+    """
+    import openpyxl  # slow to import, and only needed when files are (re)indexed
+    fields, cells = [], []
+    workbook = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows():
+                for cell in row:
+                    if not cell.value or not isinstance(cell.value, str):
+                        continue
+                    if with_values:
+                        cells.append((sheet.title, cell.coordinate, cell.value))
+                    if "=" in cell.value:
+                        fields.extend((sheet.title, cell.coordinate, key, value)
+                                      for key, value in PipeRecord(cell.value).items())
+    finally:
+        workbook.close()
+    return fields, cells
+
+
+def _prefix(directory):
+    return os.path.join(os.path.abspath(directory), "")
+
+
+class KeyIndex:
+    """SQLite store of the keys (and optionally the string cells) of indexed workbooks."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            self._db.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS fields;"
+                                   " DROP TABLE IF EXISTS cells;")
+            self._db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " with_values INTEGER NOT NULL, error TEXT, indexed REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS fields ("
+            " path TEXT NOT NULL, sheet TEXT NOT NULL, cell TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS fields_key ON fields (key);"
+            "CREATE INDEX IF NOT EXISTS fields_path ON fields (path);"
+            "CREATE TABLE IF NOT EXISTS cells ("
+            " path TEXT NOT NULL, sheet TEXT NOT NULL, cell TEXT NOT NULL, text TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS cells_text ON cells (text);"
+            "CREATE INDEX IF NOT EXISTS cells_path ON cells (path);")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _forget(self, file_path):
+        for table in ("files", "fields", "cells"):
+            self._db.execute(f"DELETE FROM {table} WHERE path = ?", (file_path,))
+
+    def _index_file(self, entry, with_values):
+        file_path = os.path.abspath(entry.path)
+        self._forget(file_path)
+        error = None
+        try:
+            fields, cells = read_inventory(entry.path, with_values)
+        except Exception as e:
+            # Indexed as holding nothing; it is read again once it changes
+            error, fields, cells = str(e) or type(e).__name__, [], []
+        self._db.executemany("INSERT INTO fields VALUES (?, ?, ?, ?, ?)",
+                             [(file_path,) + field for field in fields])
+        self._db.executemany("INSERT INTO cells VALUES (?, ?, ?, ?)", [(file_path,) + cell for cell in cells])
+        self._db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                         (file_path, entry.size, entry.mtime_ns, int(with_values), error, time.time()))
+        return error
+
+    def refresh(self, file_index, with_values=False, control=None):
+        """
+        Bring the index of the directory of file_index (a FileIndex) up to date:
+        read the files that are new or whose size or mtime changed, and forget the
+        files that are gone. with_values also records every string cell; files
+        indexed with their cells keep them when they change. A RunControl pauses
+        or stops the refresh between files; what was read so far is kept.
+        Returns RefreshStats.
+        """
+        started = time.perf_counter()
+        prefix = _prefix(file_index.directory_path)
+        known = {path: (size, mtime_ns, bool(values)) for path, size, mtime_ns, values in self._db.execute(
+            "SELECT path, size, mtime_ns, with_values FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+        files = indexed = 0
+        errors = []
+        for entry in file_index:
+            if control is not None and not control.wait():
+                break
+            files += 1
+            file_path = os.path.abspath(entry.path)
+            stored = known.pop(file_path, None)
+            if stored and stored[:2] == (entry.size, entry.mtime_ns) and (stored[2] or not with_values):
+                continue
+            error = self._index_file(entry, with_values or bool(stored and stored[2]))
+            if error:
+                errors.append((entry.path, error))
+            indexed += 1
+            if indexed % COMMIT_EVERY == 0:
+                self._db.commit()
+        removed = 0
+        if file_index.complete:
+            for file_path in known:
+                self._forget(file_path)
+            removed = len(known)
+        self._db.commit()
+        return RefreshStats(files, indexed, removed, errors, time.perf_counter() - started)
+
+    def _where(self, directory):
+        if directory is None:
+            return "", ()
+        prefix = _prefix(directory)
+        return " AND substr(path, 1, ?) = ?", (len(prefix), prefix)
+
+    def files_with_key(self, key, directory=None):
+        """Sorted absolute paths of the indexed files (under directory) that hold key."""
+        where, parameters = self._where(directory)
+        return [row[0] for row in self._db.execute(
+            f"SELECT DISTINCT path FROM fields WHERE key = ?{where} ORDER BY path", (key,) + parameters)]
+
+    def locations(self, key, directory=None):
+        """(path, sheet, cell, value) of every field holding key."""
+        where, parameters = self._where(directory)
+        return self._db.execute(f"SELECT path, sheet, cell, value FROM fields WHERE key = ?{where}"
+                                f" ORDER BY path, rowid", (key,) + parameters).fetchall()
+
+    def key_values(self, key, directory=None):
+        """(value, fields, files) of every distinct value of key, most common first."""
+        where, parameters = self._where(directory)
+        return self._db.execute(f"SELECT value, COUNT(*), COUNT(DISTINCT path) FROM fields WHERE key = ?{where}"
+                                f" GROUP BY value ORDER BY COUNT(*) DESC, value", (key,) + parameters).fetchall()
+
+    def keys(self, directory=None):
+        """(key, fields, files) of every indexed key, in key order."""
+        where, parameters = self._where(directory)
+        return self._db.execute(f"SELECT key, COUNT(*), COUNT(DISTINCT path) FROM fields WHERE 1{where}"
+                                f" GROUP BY key ORDER BY key", parameters).fetchall()
+
+    def files_with_text(self, text, directory=None):
+        """
+        Sorted paths of the indexed files (under directory) with a string cell
+        containing text. Only files indexed with their values are searched.
+        """
+        where, parameters = self._where(directory)
+        # instr, unlike LIKE, matches case-sensitively like the Value Replacer
+        return [row[0] for row in self._db.execute(
+            f"SELECT DISTINCT path FROM cells WHERE instr(text, ?) > 0{where} ORDER BY path", (text,) + parameters)]
+
+    def unreadable_files(self, directory=None):
+        """Sorted paths of the indexed files (under directory) that could not be read."""
+        where, parameters = self._where(directory)
+        return [row[0] for row in self._db.execute(
+            f"SELECT path FROM files WHERE error IS NOT NULL{where} ORDER BY path", parameters)]
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+def key_files(file_index, key, key_index):
+    """
+    A complete FileIndex of the files of file_index that hold key, from a
+    KeyIndex refreshed for that directory, in the order file_index found them.
+    Files the index could not read are kept, so the run reports their error.
+    """
+    paths = set(key_index.files_with_key(key, file_index.directory_path))
+    paths.update(key_index.unreadable_files(file_index.directory_path))
+    return FileIndex.of_entries(file_index.directory_path,
+                                [entry for entry in file_index if os.path.abspath(entry.path) in paths])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the index of the keys in a tree of workbooks.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="index database (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index the workbooks under DIRECTORY, reading only changed files")
+    build.add_argument("directory")
+    build.add_argument("--values", action="store_true", help="also index the text of every string cell")
+    build.add_argument("--backup-dir", default="", help="backup folder to leave out (default: DIRECTORY/Backup)")
+    query = commands.add_parser("query", help="list the files that hold KEY")
+    query.add_argument("key")
+    shown = query.add_mutually_exclusive_group()
+    shown.add_argument("--locations", action="store_true", help="list every sheet and cell with its value")
+    shown.add_argument("--values", action="store_true", help="list the distinct values of KEY")
+    text = commands.add_parser("text", help="list the files with a cell containing TEXT (needs build --values)")
+    text.add_argument("text")
+    keys = commands.add_parser("keys", help="list every indexed key with the number of files holding it")
+    for command in (query, text, keys):
+        command.add_argument("--directory", help="only files under this folder")
+    args = parser.parse_args(argv)
+    with KeyIndex(args.index) as index:
+        started = time.perf_counter()
+        if args.command == "build":
+            from functions import backup_dir_for  # functions builds on this module
+            # Leave out the backup folder like a run does, or the next run drops all of it again
+            backup_dir = backup_dir_for(args.directory, args.backup_dir)
+            stats = index.refresh(FileIndex(args.directory, backup_dir), args.values)
+            for file_path, error in stats.errors:
+                print(f"Could not read {file_path}: {error}")
+            print(f"Indexed {stats.indexed} of {stats.files} files ({stats.removed} removed) "
+                  f"in {stats.seconds:.2f}s.")
+            return
+        if args.command == "query" and args.locations:
+            rows = [f"{path}\t{sheet}!{cell}\t{value}" for path, sheet, cell, value
+                    in index.locations(args.key, args.directory)]
+        elif args.command == "query" and args.values:
+            rows = [f"{value}\t{fields} cells\t{files} files" for value, fields, files
+                    in index.key_values(args.key, args.directory)]
+        elif args.command == "query":
+            rows = index.files_with_key(args.key, args.directory)
+        elif args.command == "text":
+            rows = index.files_with_text(args.text, args.directory)
+        else:
+            rows = [f"{key}\t{fields} cells\t{files} files" for key, fields, files in index.keys(args.directory)]
+        for row in rows:
+            print(row)
+        print(f"{len(rows)} results in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Batch manifests: many key edits and value replacements applied in one run.
+
+A manifest is a CSV file with the header ``action,key,value,old,new`` or a JSON
+list of objects with the same fields. Supported actions:
+
+* ``set``     - set ``key`` to ``value`` (Flat file fixer)
+* ``remove``  - remove ``key`` and its value (Flat file fixer)
+* ``replace`` - replace the text ``old`` with ``new`` (Cell value fixer)
+
+Operations are applied to each cell in manifest order.
+
+A rename table for the Cell value fixer is a CSV file with the header
+``old,new`` or a JSON object mapping old to new text. All of its entries are
+replaced simultaneously in one scan of each cell (see multi_replace).
+"""
+import csv
+import json
+import os
+
+from functions import key_operation, value_operation
+
+MANIFEST_FIELDS = ["action", "key", "value", "old", "new"]
+
+
+def _row_text(row, where):
+    """The fields of a manifest row as text; JSON numbers are taken as written, like in load_mapping."""
+    text = {}
+    for field in MANIFEST_FIELDS:
+        value = row.get(field)
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"{where}: '{field}' must be text or a number")
+        text[field] = "" if value is None else str(value)
+    return text
+
+
+def _row_operation(row, where):
+    row = _row_text(row, where)
+    action = row["action"].strip().lower()
+    if action == "set":
+        if not row.get("key") or not row.get("value"):
+            raise ValueError(f"{where}: 'set' needs a key and a value")
+        return key_operation(row["key"], row["value"], False)
+    if action == "remove":
+        if not row.get("key"):
+            raise ValueError(f"{where}: 'remove' needs a key")
+        return key_operation(row["key"], "", True)
+    if action == "replace":
+        if not row.get("old"):
+            raise ValueError(f"{where}: 'replace' needs an old value")
+        return value_operation(row["old"], row["new"])
+    raise ValueError(f"{where}: unknown action '{action}'")
+
+
+def parse_manifest_rows(rows):
+    """Turn manifest rows (dicts) into a list of operation tuples."""
+    operations = [_row_operation(row, f"entry {number}") for number, row in enumerate(rows, start=1)]
+    if not operations:
+        raise ValueError("The manifest contains no operations")
+    return operations
+
+
+def load_manifest(path):
+    """Read a CSV or JSON manifest file and return its operation tuples."""
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, encoding="utf-8") as f:
+            rows = json.load(f)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("A JSON manifest must be a list of objects")
+        return parse_manifest_rows(rows)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return parse_manifest_rows(list(csv.DictReader(f)))
+
+
+def load_mapping(path):
+    """Read a CSV or JSON rename table and return its (old, new) pairs."""
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        if not isinstance(table, dict):
+            raise ValueError("A JSON rename table must be an object of old: new pairs")
+        pairs = [(str(old), str(new)) for old, new in table.items()]
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            pairs = [(row.get("old") or "", row.get("new") or "") for row in csv.DictReader(f)]
+    for number, (old, _) in enumerate(pairs, start=1):
+        if not old:
+            raise ValueError(f"entry {number}: missing old value")
+    if not pairs:
+        raise ValueError("The rename table contains no entries")
+    return pairs
@@ -0,0 +1,85 @@
+"""
+Memory accounting for runs over very large workbooks.
+
+openpyxl keeps every cell of a loaded workbook as a Python object, which costs
+roughly OPENPYXL_MEMORY_FACTOR times the size of the .xlsx file; a 500 MB
+workbook can need many GB. The xml engine streams the package through a
+bounded buffer and needs about the same small amount whatever the file size.
+
+With a memory budget (in bytes) a run
+
+* edits a file with the streaming xml engine when its openpyxl estimate alone
+  does not fit in the budget, and
+* only hands another file to the worker pool while the estimates of the files
+  in flight fit in the budget (a single file always runs).
+
+peak_rss() reports the peak resident set size of the process. On Linux the peak
+is reset before every file, so it is the peak of that file alone; elsewhere it
+is the peak of the worker process so far.
+"""
+import re
+import sys
+
+# Resident memory per byte of .xlsx when openpyxl loads the whole workbook
+OPENPYXL_MEMORY_FACTOR = 50
+# Resident memory of a worker streaming a file (interpreter, buffers, spooled parts)
+STREAMING_FOOTPRINT = 64 * 1024 * 1024
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def parse_size(text):
+    """Turn "512M", "4 GB", "1.5g" or a plain byte count into bytes. Raises ValueError."""
+    match = _SIZE.match(str(text))
+    if not match:
+        raise ValueError(f"Not a memory size: {text!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def estimate_memory(size, engine):
+    """Rough resident memory needed to process a workbook of size bytes with engine."""
+    if engine == "openpyxl":
+        return STREAMING_FOOTPRINT + size * OPENPYXL_MEMORY_FACTOR
+    return STREAMING_FOOTPRINT
+
+
+def engine_for(engine, size, budget):
+    """The engine to use for a file of size bytes: openpyxl falls back to xml when it would not fit in budget."""
+    if budget and engine == "openpyxl" and estimate_memory(size, engine) > budget:
+        return "xml"
+    return engine
+
+
+def reset_peak_rss():
+    """Start a new peak for peak_rss(). Only possible on Linux; elsewhere this does nothing."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where it cannot be read (Windows)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,94 @@
+"""
+Multi-pattern substitution with an Aho-Corasick automaton.
+
+A MultiReplacer is built once from an old -> new mapping and then replaces every
+mapping entry in a single left-to-right scan of each string, no matter how many
+entries the mapping has.
+
+Overlapping matches are resolved leftmost-longest: scanning from the left, the
+match that starts earliest wins, and among matches starting at the same position
+the longest one wins. Replaced text is never scanned again, so replacements do
+not chain (with {"A": "B", "B": "C"}, "AB" becomes "BC").
+"""
+
+
+class MultiReplacer:
+    """Replace all keys of a mapping with their values in one pass over a string."""
+
+    def __init__(self, mapping):
+        self.mapping = {old: new for old, new in dict(mapping).items() if old}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern in self.mapping:
+            self._add(pattern)
+        self._link()
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = (len(pattern),)
+
+    def _link(self):
+        """Compute failure links breadth-first and merge the outputs along them."""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                if out[fail[next_state]]:
+                    out[next_state] = out[next_state] + out[fail[next_state]]
+
+    def find(self, text):
+        """
+        Return the non-overlapping (start, end) spans of the leftmost-longest
+        matches in text.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        longest = {}
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for length in out[state]:
+                    start = index - length + 1
+                    if longest.get(start, 0) < length:
+                        longest[start] = length
+        spans = []
+        position = 0
+        for start in sorted(longest):
+            if start >= position:
+                position = start + longest[start]
+                spans.append((start, position))
+        return spans
+
+    def replace(self, text):
+        """Return text with every match replaced, or None when nothing matched."""
+        spans = self.find(text)
+        if not spans:
+            return None
+        pieces = []
+        position = 0
+        for start, end in spans:
+            pieces.append(text[position:start])
+            pieces.append(self.mapping[text[start:end]])
+            position = end
+        pieces.append(text[position:])
+        return "".join(pieces)
@@ -0,0 +1,138 @@
+"""
+Parser for pipe-separated key/value cells such as "a=1|b=2|c=3|".
+
+A PipeRecord gives an ordered key/value view of a cell built in one pass over
+its text. Keys are set or removed against that view and the cell is written
+back once. Serialization follows clean_pipes: empty or whitespace-only fields
+between pipes are dropped, a leading pipe is dropped and a trailing pipe is
+kept. Each line of a multi-line cell is its own record line. Unlike the old
+single regex pass, runs of several empty fields collapse completely.
+
+Keys are compared literally: "b" matches the field "b=2" (leading whitespace
+ignored) but not "ab=2" or "a=b=2". Whitespace before a field that starts its
+line (no pipe before it) is kept as a field of its own when the field is set or
+removed, as the old code did: "  a=1|" becomes "  |a=9|".
+"""
+
+
+class _Line:
+    __slots__ = ("fields", "trailing", "leading")
+
+    def __init__(self, fields, trailing, leading):
+        self.fields = fields
+        self.trailing = trailing
+        # The first field starts the line, with no pipe before it
+        self.leading = leading
+
+
+def _parse_line(line):
+    parts = line.split("|")
+    if len(parts) == 1:
+        return _Line([line] if line else [], False, bool(line))
+    fields = [parts[0]] if parts[0] else []
+    fields.extend(part for part in parts[1:-1] if part.strip())
+    if parts[-1]:
+        fields.append(parts[-1])
+    return _Line(fields, not parts[-1], bool(parts[0]))
+
+
+def _field_key(field):
+    key, separator, _ = field.lstrip().partition("=")
+    return key if separator else None
+
+
+def _indent(line, index, field):
+    """The whitespace a set or removed field leaves behind: only that of a field starting its line."""
+    if index or not line.leading:
+        return []
+    indent = field[:len(field) - len(field.lstrip())]
+    return [indent] if indent else []
+
+
+class PipeRecord:
+    """Ordered, compact key/value view of a pipe-separated cell."""
+
+    def __init__(self, text):
+        self._lines = [_parse_line(line) for line in text.splitlines()]
+
+    def __str__(self):
+        return "\n".join("|".join(line.fields) + ("|" if line.trailing and line.fields else "")
+                         for line in self._lines)
+
+    def items(self):
+        """Return the (key, value) pairs of all key=value fields, in order."""
+        pairs = []
+        for line in self._lines:
+            for field in line.fields:
+                key, separator, value = field.lstrip().partition("=")
+                if separator:
+                    pairs.append((key, value))
+        return pairs
+
+    def get(self, key, default=None):
+        for item_key, value in self.items():
+            if item_key == key:
+                return value
+        return default
+
+    def __contains__(self, key):
+        return any(_field_key(field) == key for line in self._lines for field in line.fields)
+
+    def set(self, key, value):
+        """Set every occurrence of key to value. Returns False when the key is not in the record."""
+        found = False
+        for line in self._lines:
+            fields = []
+            for index, field in enumerate(line.fields):
+                if _field_key(field) != key:
+                    fields.append(field)
+                    continue
+                fields.extend(_indent(line, index, field))
+                fields.append(f"{key}={value}")
+                found = True
+                if index == len(line.fields) - 1:
+                    line.trailing = True
+            line.fields = fields
+        return found
+
+    def remove(self, key):
+        """Remove every occurrence of key. Returns False when the key is not in the record."""
+        found = False
+        for line in self._lines:
+            kept = []
+            for index, field in enumerate(line.fields):
+                if _field_key(field) == key:
+                    kept.extend(_indent(line, index, field))
+                else:
+                    kept.append(field)
+            if any(_field_key(field) == key for field in line.fields):
+                found = True
+                if _field_key(line.fields[-1]) == key:
+                    line.trailing = True
+                line.fields = kept
+        return found
+
+    def strip(self):
+        """Drop the pipe at the very end of the cell, like str.strip('|') on its text."""
+        if self._lines and self._lines[-1].fields:
+            self._lines[-1].trailing = False
+
+    def read_back(self):
+        """
+        Make the record what its written text would parse to: an empty last line is
+        lost, and the first field of every line now starts it.
+        """
+        if len(self._lines) > 1 and not self._lines[-1].fields:
+            self._lines.pop()
+        elif len(self._lines) == 1 and not self._lines[0].fields:
+            self._lines.clear()
+        for line in self._lines:
+            line.leading = bool(line.fields)
+
+    def is_empty(self):
+        return not str(self)
+
+    def copy(self):
+        record = PipeRecord("")
+        record._lines = [_Line(list(line.fields), line.trailing, line.leading) for line in self._lines]
+        return record
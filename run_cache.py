@@ -0,0 +1,147 @@
+"""
+Persistent cache of files a run left unchanged.
+
+Nightly runs apply the same operations to mostly unchanged trees. The cache
+remembers, per file and operation, that the file had no match (or was already
+in the target state) together with its size, mtime and content hash, so the
+next identical run can skip it without opening the workbook. A file whose
+mtime changed but whose content hash is the same still counts as unchanged.
+
+Entries live in a small SQLite database. The least recently used entries are
+evicted once the cache holds more than max_entries rows. Clear it with
+
+    python run_cache.py clear [DIRECTORY]
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".xlsx_fixer", "run_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 200_000
+# Bump when the meaning of an operation changes, so old entries stop matching
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def operation_fingerprint(operation):
+    """Stable digest of an operation tuple (see functions.key_operation and friends)."""
+    return hashlib.sha256(repr((CACHE_VERSION, operation)).encode("utf-8")).hexdigest()
+
+
+def file_digest(file_path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunCache:
+    """SQLite store of (file, operation) pairs known to need no change."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS unchanged ("
+            " path TEXT NOT NULL, operation TEXT NOT NULL, size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL, used REAL NOT NULL,"
+            " PRIMARY KEY (path, operation))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS unchanged_used ON unchanged (used)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_unchanged(self, file_path, fingerprint, size=None, mtime_ns=None):
+        """
+        True when file_path is known to need no change by the operation with this
+        operation_fingerprint, which a run computes once. size and mtime_ns, when
+        the caller already has them, save a stat call.
+        """
+        file_path = os.path.abspath(file_path)
+        row = self._db.execute("SELECT size, mtime_ns, digest FROM unchanged WHERE path = ? AND operation = ?",
+                               (file_path, fingerprint)).fetchone()
+        if row is None:
+            return False
+        cached_size, cached_mtime_ns, digest = row
+        try:
+            if size is None or mtime_ns is None:
+                stat = os.stat(file_path)
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            if size != cached_size:
+                return False
+            if mtime_ns != cached_mtime_ns and file_digest(file_path) != digest:
+                return False
+        except OSError:
+            return False
+        self._db.execute("UPDATE unchanged SET mtime_ns = ?, used = ? WHERE path = ? AND operation = ?",
+                         (mtime_ns, time.time(), file_path, fingerprint))
+        return True
+
+    def record(self, result, fingerprint):
+        """
+        Store the outcome of a FileResult of the operation with this fingerprint.
+        Files processed without error and left unchanged are cached; any other
+        outcome drops the entry.
+        """
+        file_path = os.path.abspath(result.path)
+        if result.error or result.changed:
+            self._db.execute("DELETE FROM unchanged WHERE path = ? AND operation = ?", (file_path, fingerprint))
+            return
+        try:
+            stat = os.stat(file_path)
+            digest = file_digest(file_path)
+        except OSError:
+            return
+        self._db.execute("INSERT OR REPLACE INTO unchanged VALUES (?, ?, ?, ?, ?, ?)",
+                         (file_path, fingerprint, stat.st_size, stat.st_mtime_ns, digest, time.time()))
+
+    def evict(self):
+        """Drop the least recently used entries beyond max_entries."""
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM unchanged WHERE rowid IN"
+                             " (SELECT rowid FROM unchanged ORDER BY used LIMIT ?)", (excess,))
+
+    def invalidate(self, directory=None):
+        """Forget every entry, or only those of files under directory. Returns the number removed."""
+        if directory is None:
+            cursor = self._db.execute("DELETE FROM unchanged")
+        else:
+            prefix = os.path.join(os.path.abspath(directory), "")
+            cursor = self._db.execute("DELETE FROM unchanged WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+        self._db.commit()
+        return cursor.rowcount
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM unchanged").fetchone()[0]
+
+    def close(self):
+        self.evict()
+        self._db.commit()
+        self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the cache of files left unchanged by earlier runs.")
+    parser.add_argument("command", choices=("clear", "stats"))
+    parser.add_argument("directory", nargs="?", help="clear only the entries of files under this folder")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="cache database (default: %(default)s)")
+    args = parser.parse_args(argv)
+    with RunCache(args.cache) as cache:
+        if args.command == "clear":
+            print(f"Removed {cache.invalidate(args.directory)} cache entries.")
+        else:
+            print(f"{len(cache)} cache entries in {args.cache}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Cooperative pause and cancel for a running job.
+
+A RunControl is shared by the thread that started a run (the GUI buttons or the
+CLI's Ctrl+C handler) and the code doing the work. The work checks it between
+files and, inside a file, between sheets (or string parts with the xml engine):
+
+* while paused, the checks block until the run is resumed or cancelled,
+* once cancelled, no new file is started and a file that is being edited stops
+  before it is saved, so it is left exactly as it was (Cancelled is raised).
+
+The state lives in multiprocessing events, so the pool workers of a run see it
+too: install_worker_control is the initializer of their ProcessPoolExecutor.
+"""
+import multiprocessing
+import signal
+
+
+class Cancelled(Exception):
+    """Raised inside a file when the run is cancelled; the file is not saved."""
+
+
+class RunControl:
+    def __init__(self):
+        self._cancelled = multiprocessing.Event()
+        self._running = multiprocessing.Event()
+        self._running.set()
+
+    def start(self):
+        """Reset for a new run and return self, so a GUI button can hand the control to it."""
+        self._cancelled.clear()
+        self._running.set()
+        return self
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Wake up a paused run so it can stop
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def wait(self):
+        """Block while the run is paused. Returns False once it is cancelled."""
+        self._running.wait()
+        return not self._cancelled.is_set()
+
+    def checkpoint(self):
+        """Like wait, but raises Cancelled; called between the sheets of a file."""
+        if not self.wait():
+            raise Cancelled()
+
+
+# The control of the run a pool worker process belongs to
+worker_control = None
+
+
+def install_worker_control(control):
+    """ProcessPoolExecutor initializer: make control visible to process_file in the worker."""
+    global worker_control
+    worker_control = control
+    # Ctrl+C reaches the whole process group; the parent turns it into a cancel
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
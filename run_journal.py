@@ -0,0 +1,90 @@
+"""
+Append-only journal of the files a run has finished, for resuming long runs.
+
+Every directory run writes one JSON line per finished file to a journal named
+after the directory and the operation, and syncs it to disk. A run that
+completes deletes its journal, so a journal left behind means the run was
+interrupted (crash, kill, power cut). Started again with resume, the same
+operation on the same directory skips every file the journal lists as finished
+without error and picks up where the interrupted run stopped. A line cut short
+by the crash is ignored; that file is simply processed again.
+"""
+import hashlib
+import json
+import os
+import time
+
+END = "end"
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".xlsx_fixer", "journals")
+
+
+def journal_path(journal_dir, directory, fingerprint, shard=None):
+    """The journal of the operation with this operation_fingerprint (see run_cache) over directory."""
+    key = f"{os.path.normcase(os.path.abspath(directory))}\n{fingerprint}"
+    if shard is not None:
+        # Shards of one run started on the same machine each keep their own journal
+        key += f"\n{tuple(shard)}"
+    return os.path.join(journal_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:24] + ".jsonl")
+
+
+def read_finished(path):
+    """
+    Absolute path -> journal entry (changed, cells, hits) of the files a journal
+    lists as finished without error.
+    """
+    finished = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "path" in entry and not entry.get("error"):
+                    finished[entry["path"]] = entry
+    except OSError:
+        pass
+    return finished
+
+
+class RunJournal:
+    """The journal of one run of the operation with this fingerprint over directory, or of one shard of it (see shards)."""
+
+    def __init__(self, journal_dir, directory, fingerprint, resume=False, shard=None):
+        self.path = journal_path(journal_dir, directory, fingerprint, shard)
+        # An interrupted run of the same operation left its journal behind
+        self.interrupted = os.path.exists(self.path)
+        self.finished = read_finished(self.path) if resume and self.interrupted else {}
+        os.makedirs(journal_dir, exist_ok=True)
+        self._file = open(self.path, "a" if self.finished else "w", encoding="utf-8")
+        if not self.finished:
+            self._write({"directory": os.path.abspath(directory), "started": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    def is_finished(self, file_path):
+        return os.path.abspath(file_path) in self.finished
+
+    def finished_entry(self, file_path):
+        """What the interrupted run did to a finished file: its journal entry."""
+        return self.finished[os.path.abspath(file_path)]
+
+    def record(self, result):
+        self._write({"path": os.path.abspath(result.path), "changed": result.changed, "cells": result.cells,
+                     "error": result.error, "hits": list(result.hits or ())})
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def log(self, log_widget):
+        if self.finished:
+            log_widget.insert(END, f"ℹ Resuming an interrupted run: {len(self.finished)} files were already finished.\n", "info")
+        elif self.interrupted:
+            log_widget.insert(END, "ℹ A previous run of this operation was interrupted; it was started over. "
+                                   "Use resume to skip the files it had finished.\n", "info")
+
+    def close(self, complete=False):
+        """Close the journal; a complete run deletes it, an interrupted one keeps it for resuming."""
+        self._file.close()
+        if complete:
+            os.remove(self.path)
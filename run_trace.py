@@ -0,0 +1,157 @@
+"""
+Per-stage timing of a run.
+
+While a file is processed a FileTimer records where its time goes:
+
+* prescan  - the raw XML search of xml_engine.may_contain
+* load     - openpyxl.load_workbook
+* scan     - walking the cells (or streaming the string parts with the xml engine)
+* modify   - the cell transforms themselves (not counted in scan)
+* backup   - the lazy backup taken right before the save
+* save     - writing the new file and moving it into place
+
+together with bytes read and written and cells scanned and changed. The timer
+travels back from worker processes as a plain dict in FileResult.trace. A
+RunTrace adds the run-wide stages (discover, i.e. the directory walk, and the
+up-front backup), logs a summary and writes everything to a JSON trace file.
+With profile_slowest, every file is run under cProfile and the profiles of the
+N slowest files are kept next to the trace (open them with pstats or snakeviz).
+"""
+import heapq
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+END = "end"
+FILE_STAGES = ("prescan", "load", "scan", "modify", "backup", "save")
+COUNTERS = ("bytes_read", "bytes_written", "cells_scanned", "cells_changed")
+
+
+class FileTimer:
+    """Stage times and counters of one file."""
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - started
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def timed(self, name, function, counter=None):
+        """Wrap function so its calls add to stage name (and count one counter each)."""
+        def wrapper(*args):
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.stages[name] += time.perf_counter() - started
+                if counter:
+                    self.counters[counter] += 1
+        return wrapper
+
+    def as_dict(self):
+        stages = dict(self.stages)
+        # Transforms run inside the scan and lazy backups inside the save; count them once
+        for outer, inner in (("scan", "modify"), ("save", "backup")):
+            if outer in stages and inner in stages:
+                stages[outer] = max(0.0, stages[outer] - stages[inner])
+        return {"stages": {name: round(seconds, 6) for name, seconds in stages.items()}, **self.counters}
+
+
+class NullTimer:
+    """A FileTimer that records nothing, used when a run is not traced."""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def count(self, name, amount=1):
+        pass
+
+    def timed(self, name, function, counter=None):
+        return function
+
+
+NULL_TIMER = NullTimer()
+
+
+def _megabytes(size):
+    return f"{size / 1e6:.1f} MB"
+
+
+class RunTrace:
+    """Collect the FileResult traces of a run and write them to a JSON file."""
+
+    def __init__(self, path, profile_slowest=0):
+        self.path = path
+        self.profile_slowest = profile_slowest
+        self.profile_dir = None
+        if profile_slowest:
+            self.profile_dir = os.path.splitext(path)[0] + "_profiles"
+            os.makedirs(self.profile_dir, exist_ok=True)
+        self.started = time.time()
+        self.run_stages = defaultdict(float)
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.files = []
+        # (seconds, profile path) of the slowest profiled files, smallest first
+        self._slowest = []
+
+    def stage(self, name, seconds):
+        """Add seconds of a run-wide stage (discover, index or backup)."""
+        self.run_stages[name] += seconds
+
+    def add(self, result):
+        trace = result.trace
+        if trace is None:
+            return
+        for name, seconds in trace["stages"].items():
+            self.stages[name] += seconds
+        for name in COUNTERS:
+            self.counters[name] += trace.get(name, 0)
+        entry = {"path": result.path, "seconds": round(result.seconds, 6), "changed": result.changed,
+                 "skipped": result.skipped, "error": result.error, **trace}
+        # Only the profiles of the slowest files survive; they are listed in the trace as "slowest"
+        profile = entry.pop("profile", None)
+        self.files.append(entry)
+        if profile:
+            heapq.heappush(self._slowest, (result.seconds, profile))
+            if len(self._slowest) > self.profile_slowest:
+                _, dropped = heapq.heappop(self._slowest)
+                os.remove(dropped)
+
+    def log(self, log_widget):
+        stages = defaultdict(float, self.stages)
+        for name, seconds in self.run_stages.items():
+            stages[name] += seconds
+        timings = ", ".join(f"{name} {stages[name]:.2f}s" for name in ("discover", "index") + FILE_STAGES if name in stages)
+        log_widget.insert(END, f"⏱ Time per stage: {timings or 'nothing recorded'}.\n", "info")
+        log_widget.insert(END, f"⏱ Read {_megabytes(self.counters['bytes_read'])}, wrote "
+                               f"{_megabytes(self.counters['bytes_written'])}; scanned {self.counters['cells_scanned']} "
+                               f"cells, changed {self.counters['cells_changed']}.\n", "info")
+        if self._slowest:
+            log_widget.insert(END, f"⏱ Profiles of the {len(self._slowest)} slowest files: {self.profile_dir}\n", "info")
+        log_widget.insert(END, f"⏱ Timing trace: {self.path}\n", "info")
+
+    def close(self):
+        """Write the trace file. Profiles of files that were kept are listed in slowest."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "seconds": round(time.time() - self.started, 3),
+                "run_stages": {name: round(seconds, 6) for name, seconds in self.run_stages.items()},
+                "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                "counters": dict(self.counters),
+                "slowest": [profile for _, profile in sorted(self._slowest, reverse=True)],
+                "files": self.files,
+            }, f, indent=1)
@@ -0,0 +1,62 @@
+"""
+Crash-safe replacement of files.
+
+A workbook is never rewritten in place: the new content goes to a temporary
+file in the same directory, which is flushed to disk with fsync and then moved
+over the original with os.replace (atomic on POSIX and Windows). The directory
+is synced as well, so the rename itself survives a power cut. Whenever a run is
+killed, each workbook is either the old or the new one, never a truncated mix.
+"""
+import os
+import shutil
+import tempfile
+
+
+def fsync_file(path):
+    # Windows only flushes handles opened for writing
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path):
+    """Flush the entries of a directory; a no-op where directories cannot be opened (Windows)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def durable_replace(temp_path, target_path):
+    """Flush temp_path to disk, move it over target_path and flush the directory entry."""
+    fsync_file(temp_path)
+    os.replace(temp_path, target_path)
+    fsync_directory(os.path.dirname(os.path.abspath(target_path)))
+
+
+def write_replacement(file_path, data, before_replace=None):
+    """
+    Replace file_path with the bytes data, crash-safely like durable_replace: the
+    bytes go to a temporary file next to it that takes over its permissions.
+    before_replace, if given, is called right before the move.
+    """
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(file_path)))
+    try:
+        with os.fdopen(fd, "wb") as temp:
+            temp.write(data)
+        shutil.copymode(file_path, temp_path)
+        if before_replace:
+            before_replace()
+        durable_replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
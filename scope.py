@@ -0,0 +1,197 @@
+"""
+Scope of a run: the sheets, columns and cell ranges of each workbook it may edit.
+
+Pipe-encoded metadata usually lives in one sheet and one column; a scope lets a
+run read just those instead of every cell of every sheet. A scope combines
+
+* sheet name globs ("Config", "Data*"), matched without regard to case,
+* columns, by letter ("B") or by the header text in their first row
+  ("Metadata"); a column named by its header covers the cells below the header,
+  and a header that looks like column letters is given in quotes ('"ID"'),
+* A1 ranges ("B2:D50", "B:B", "2:100", "C7").
+
+A cell is inside the scope when its sheet matches one of the globs, it lies in
+one of the columns and in one of the ranges; a part that is left out places no
+limit. The engines skip whole sheets outside the scope (the xml engine without
+reading their part of the package) and only read the rows and columns around it.
+"""
+import fnmatch
+import re
+from collections import namedtuple
+
+# Column XFD, the last one Excel allows
+MAX_COLUMN = 16384
+
+_LETTERS = re.compile(r"^[A-Z]{1,3}$")
+_BOUND = re.compile(r"^\$?([A-Z]{1,3})?\$?(\d+)?$")
+_REFERENCE = re.compile(r"^\$?([A-Z]{1,3})\$?(\d+)$")
+
+
+def column_index(letters):
+    """1-based index of column letters ("A" -> 1, "AA" -> 27)."""
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index
+
+
+def split_reference(reference):
+    """(column, row) of a cell reference such as "B12", or None if it is not one."""
+    match = _REFERENCE.match(reference.upper())
+    if not match:
+        return None
+    return column_index(match.group(1)), int(match.group(2))
+
+
+def _items(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item.strip() for item in value if item and item.strip()]
+
+
+def _parse_bound(text, source):
+    match = _BOUND.match(text)
+    if not text or not match:
+        raise ValueError(f"Not an A1 range: {source}")
+    column, row = match.groups()
+    if row is not None and int(row) < 1:
+        raise ValueError(f"Not an A1 range: {source}")
+    return column_index(column) if column else None, int(row) if row else None
+
+
+def parse_range(text):
+    """
+    Turn an A1 range into (min_col, min_row, max_col, max_row), with None for an
+    open side: "B2:D50", "B:D" (whole columns), "2:100" (whole rows) or "C7".
+    """
+    first, colon, last = text.upper().partition(":")
+    first_column, first_row = _parse_bound(first.strip(), text)
+    last_column, last_row = _parse_bound(last.strip(), text) if colon else (first_column, first_row)
+    if (first_column is None) != (last_column is None) or (first_row is None) != (last_row is None):
+        raise ValueError(f"Not an A1 range: {text}")
+    if first_column is not None and max(first_column, last_column) > MAX_COLUMN:
+        raise ValueError(f"Not an A1 range: {text}")
+    if first_column is not None and first_column > last_column:
+        first_column, last_column = last_column, first_column
+    if first_row is not None and first_row > last_row:
+        first_row, last_row = last_row, first_row
+    return first_column, first_row, last_column, last_row
+
+
+def parse_scope(sheets=(), columns=(), ranges=()):
+    """
+    Build a Scope from sheet globs, columns and ranges, each a list or a comma-separated
+    string (as typed in the GUI). Returns None when all of them are empty.
+    Raises ValueError for a range that is not in A1 notation.
+    """
+    letters, headers = [], []
+    for column in _items(columns):
+        if len(column) > 1 and column[0] == column[-1] and column[0] in "\"'":
+            headers.append(column[1:-1].strip().casefold())
+        elif _LETTERS.match(column.upper()) and column_index(column) <= MAX_COLUMN:
+            letters.append(column_index(column))
+        else:
+            headers.append(column.casefold())
+    scope = Scope(tuple(sheet.casefold() for sheet in _items(sheets)), tuple(sorted(set(letters))),
+                  tuple(headers), tuple(parse_range(text) for text in _items(ranges)))
+    return scope if any(scope) else None
+
+
+class Scope(namedtuple("Scope", ["sheets", "columns", "headers", "ranges"])):
+    """
+    Sheet globs (case-folded), column indexes, case-folded header names and
+    (min_col, min_row, max_col, max_row) ranges; see parse_scope. A tuple, so it
+    is picklable and becomes part of the fingerprint of a scoped operation.
+    """
+    __slots__ = ()
+
+    def selects_sheet(self, name):
+        return not self.sheets or any(fnmatch.fnmatchcase(name.casefold(), glob) for glob in self.sheets)
+
+    def header_columns(self, cells):
+        """Indexes of the columns whose header is named by the scope, from (column, text) pairs of row 1."""
+        if not self.headers:
+            return ()
+        return tuple(column for column, text in cells
+                     if isinstance(text, str) and text.strip().casefold() in self.headers)
+
+    def area(self, header_columns=()):
+        return SheetArea(self, header_columns)
+
+    def describe(self):
+        parts = []
+        if self.sheets:
+            parts.append("sheets " + ", ".join(self.sheets))
+        if self.columns or self.headers:
+            parts.append("columns " + ", ".join([_column_letters(column) for column in self.columns] +
+                                                [f'"{header}"' for header in self.headers]))
+        if self.ranges:
+            parts.append("ranges " + ", ".join(_range_text(bounds) for bounds in self.ranges))
+        return "; ".join(parts)
+
+
+class SheetArea:
+    """The cells of one sheet inside a scope, once the header columns of the sheet are known."""
+
+    def __init__(self, scope, header_columns=()):
+        # Column index -> first row of the column inside the scope
+        self.columns = None
+        if scope.columns or scope.headers:
+            self.columns = dict.fromkeys(scope.columns, 1)
+            for column in header_columns:
+                self.columns.setdefault(column, 2)
+        self.ranges = scope.ranges
+
+    @property
+    def empty(self):
+        """True when no cell of the sheet can be inside (none of the named headers is there)."""
+        return self.columns is not None and not self.columns
+
+    def contains(self, column, row):
+        if self.columns is not None:
+            first_row = self.columns.get(column)
+            if first_row is None or row < first_row:
+                return False
+        return not self.ranges or any(
+            (min_col is None or min_col <= column <= max_col) and (min_row is None or min_row <= row <= max_row)
+            for min_col, min_row, max_col, max_row in self.ranges)
+
+    def bounds(self, max_column=None, max_row=None):
+        """
+        (min_col, min_row, max_col, max_row) of the smallest box around the area,
+        clipped to the size of the sheet when it is known; a max is None when open.
+        """
+        low_col, low_row, high_col, high_row = 1, 1, max_column, max_row
+        if self.columns:
+            low_col = max(low_col, min(self.columns))
+            high_col = _lowest(high_col, max(self.columns))
+            low_row = max(low_row, min(self.columns.values()))
+        if self.ranges:
+            low_col = max(low_col, min(bounds[0] or 1 for bounds in self.ranges))
+            low_row = max(low_row, min(bounds[1] or 1 for bounds in self.ranges))
+            if all(bounds[2] is not None for bounds in self.ranges):
+                high_col = _lowest(high_col, max(bounds[2] for bounds in self.ranges))
+            if all(bounds[3] is not None for bounds in self.ranges):
+                high_row = _lowest(high_row, max(bounds[3] for bounds in self.ranges))
+        return low_col, low_row, high_col, high_row
+
+
+def _lowest(limit, value):
+    return value if limit is None else min(limit, value)
+
+
+def _column_letters(index):
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def _range_text(bounds):
+    min_col, min_row, max_col, max_row = bounds
+    first = (_column_letters(min_col) if min_col else "") + (str(min_row) if min_row else "")
+    last = (_column_letters(max_col) if max_col else "") + (str(max_row) if max_row else "")
+    return first if first == last and min_col and min_row else f"{first}:{last}"
@@ -0,0 +1,252 @@
+"""
+Sharded runs: split one huge tree of workbooks across machines and merge their results.
+
+A shard spec "I/N" picks a deterministic part of the workbooks under a
+directory, so N nodes (or N processes on one machine) can each run the same
+operation over their own part:
+
+* hash (default): a file belongs to shard hash(relative path) % N. Every node
+  streams its own walk and starts at once, and a file stays in its shard when
+  other files come and go.
+* size: files are dealt out largest first to the shard with the fewest bytes so
+  far, so every shard gets about the same amount of work. The whole tree is
+  walked before the first file is edited, and all nodes must see the same tree.
+
+Paths are taken relative to the directory with "/" separators, so nodes that
+mount the share in different places agree on the shards. Each shard writes a
+result file (ShardResults): a header naming the shard and the operation, one
+JSON line per file and a summary once the shard is done. merge_shards combines
+the result files of all shards into one report with totals and, per operation,
+whether it matched any file anywhere, which no single shard can tell:
+
+    python xlsx_cli.py set DIRECTORY KEY VALUE --shard 2/8 --shard-results shard2.jsonl
+    python xlsx_cli.py merge shard*.jsonl --report merged.json
+"""
+import hashlib
+import heapq
+import json
+import os
+import platform
+import time
+from collections import namedtuple
+
+from file_index import FileIndex
+
+END = "end"
+SHARD_METHODS = ("hash", "size")
+# Bump when the layout of result files changes
+RESULTS_VERSION = 1
+COUNTED = ("changed", "skipped", "cached", "resumed", "cancelled")
+
+# Shard index (1 to count) of count, picked by method (see SHARD_METHODS)
+ShardSpec = namedtuple("ShardSpec", ["index", "count", "method"])
+
+
+def parse_shard(text, method=SHARD_METHODS[0]):
+    """Parse a shard spec such as "2/8"; raises ValueError naming what is wrong."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"'{text}' is not of the form I/N, e.g. 2/8") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"there is no shard {index} of {count}; shards are numbered 1 to {count}")
+    if method not in SHARD_METHODS:
+        raise ValueError(f"unknown shard method '{method}'; use {' or '.join(SHARD_METHODS)}")
+    return ShardSpec(index, count, method)
+
+
+def describe_shard(spec):
+    return f"{spec.index}/{spec.count} (by {spec.method})"
+
+
+def relative_path(directory, file_path):
+    return os.path.relpath(file_path, directory).replace(os.sep, "/")
+
+
+def hash_shard(relative, count):
+    """The shard (1 to count) of a relative path with the hash method."""
+    digest = hashlib.blake2b(relative.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+def size_shards(entries, directory, count):
+    """Path -> shard (1 to count) of every FileEntry, dealing the largest files first to the lightest shard."""
+    # (bytes, files, shard) of every shard; ties go to the lower shard
+    loads = [(0, 0, shard) for shard in range(1, count + 1)]
+    assigned = {}
+    for entry in sorted(entries, key=lambda entry: (-entry.size, relative_path(directory, entry.path))):
+        size, files, shard = heapq.heappop(loads)
+        assigned[entry.path] = shard
+        heapq.heappush(loads, (size + entry.size, files + 1, shard))
+    return assigned
+
+
+def shard_files(file_index, spec):
+    """A FileIndex of the files of file_index (a FileIndex) that belong to shard spec."""
+    directory = file_index.directory_path
+    if spec.method == "hash":
+        return file_index.subset(lambda entry: hash_shard(relative_path(directory, entry.path), spec.count)
+                                 == spec.index)
+    assigned = size_shards(list(file_index), directory, spec.count)
+    shard = FileIndex.of_entries(directory, [entry for entry in file_index if assigned[entry.path] == spec.index])
+    shard.scan_seconds = file_index.scan_seconds
+    return shard
+
+
+def default_results_path(spec):
+    return f"shard-{spec.index}-of-{spec.count}.jsonl"
+
+
+def _read_header(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+class ShardResults:
+    """
+    The result file of one shard of a run of the operation with this fingerprint
+    (see run_cache.operation_fingerprint). steps are the descriptions of the
+    operations whose hits FileResults report (see cell_transform). Resuming the
+    same shard of the same operation appends to the file it left behind.
+    """
+
+    def __init__(self, path, spec, directory, fingerprint, steps, resume=False):
+        self.path = path
+        self.spec = spec
+        self.directory = os.path.abspath(directory)
+        self.steps = list(steps)
+        self.files = 0
+        self.started = time.perf_counter()
+        header = {"version": RESULTS_VERSION, "shard": spec.index, "shards": spec.count, "method": spec.method,
+                  "operation": fingerprint, "operations": self.steps,
+                  "directory": self.directory, "host": platform.node(),
+                  "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        previous = _read_header(path) if resume else None
+        same_run = previous is not None and all(previous.get(field) == header[field] for field in
+                                                ("version", "shard", "shards", "method", "operation"))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a" if same_run else "w", encoding="utf-8")
+        if not same_run:
+            self._write(header)
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def add(self, result):
+        self.files += 1
+        hits = list(result.hits or ())
+        if not hits and len(self.steps) == 1 and (result.changed or result.preview):
+            # Only batches report hits; a single operation matched when it changed (or would change) the file
+            hits = [0]
+        entry = {"path": relative_path(self.directory, result.path), "cells": result.cells, "error": result.error,
+                 "hits": hits}
+        entry.update((field, bool(getattr(result, field))) for field in COUNTED)
+        self._write(entry)
+
+    def close(self, complete=False):
+        """Write the summary line; only a complete shard counts as done when merging."""
+        self._write({"summary": {"files": self.files, "seconds": round(time.perf_counter() - self.started, 3)},
+                     "complete": complete})
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def log(self, log_widget):
+        log_widget.insert(END, f"ℹ Shard {describe_shard(self.spec)}: {self.files} files; results written to "
+                               f"{self.path}. Merge the results of all {self.spec.count} shards to see the totals.\n",
+                          "info")
+
+
+def read_results(path):
+    """(header, path -> entry, complete) of a shard result file."""
+    header, entries, complete = None, {}, False
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short when the shard was killed
+                continue
+            if number == 0:
+                if not isinstance(entry, dict) or entry.get("version") != RESULTS_VERSION:
+                    raise ValueError(f"{path} is not a shard result file of this version")
+                header = entry
+            elif "summary" in entry:
+                complete = entry["complete"]
+            elif entry.get("resumed") and entry["path"] in entries:
+                # Finished by the interrupted run, whose line tells what it did
+                continue
+            else:
+                entries[entry["path"]] = entry
+    if header is None:
+        raise ValueError(f"{path} is empty")
+    return header, entries, complete
+
+
+def merge_shards(paths):
+    """
+    Merge the result files of the shards of one run into a report dict. Raises
+    ValueError for files of different runs or a shard given twice. The "found"
+    of an operation is None while shards are missing or did not finish.
+    """
+    shards = {}
+    first = None
+    for path in paths:
+        header, entries, complete = read_results(path)
+        if first is None:
+            first = header
+        elif any(header[field] != first[field] for field in ("shards", "method", "operation")):
+            raise ValueError(f"{path} is from a different run than {paths[0]}")
+        if header["shard"] in shards:
+            raise ValueError(f"shard {header['shard']} is given twice: {shards[header['shard']][0]} and {path}")
+        shards[header["shard"]] = (path, entries, complete)
+    if first is None:
+        raise ValueError("no shard results to merge")
+    totals = dict.fromkeys(("files", "cells", "errors") + COUNTED, 0)
+    matched = [0] * len(first["operations"])
+    failed = []
+    for shard, (path, entries, complete) in sorted(shards.items()):
+        for entry in entries.values():
+            totals["files"] += 1
+            totals["cells"] += entry["cells"]
+            for field in COUNTED:
+                totals[field] += entry[field]
+            if entry["error"]:
+                totals["errors"] += 1
+                failed.append({"shard": shard, "path": entry["path"], "error": entry["error"]})
+            for hit in entry["hits"]:
+                matched[hit] += 1
+    missing = [shard for shard in range(1, first["shards"] + 1) if shard not in shards]
+    incomplete = [shard for shard, (_, _, complete) in sorted(shards.items()) if not complete]
+    complete = not missing and not incomplete
+    report = {"directory": first["directory"], "shards": first["shards"], "method": first["method"],
+              "merged": sorted(shards), "missing": missing, "incomplete": incomplete, "complete": complete}
+    report.update(totals)
+    report["operations"] = [{"operation": step, "files": files,
+                             "found": True if files else (False if complete else None)}
+                            for step, files in zip(first["operations"], matched)]
+    report["failed"] = failed
+    return report
+
+
+def log_merge(report, log_widget):
+    log_widget.insert(END, f"ℹ Merged {len(report['merged'])} of {report['shards']} shards of {report['directory']}: "
+                           f"{report['files']} files, {report['changed']} changed, {report['cells']} cells, "
+                           f"{report['errors']} errors.\n", "info")
+    for failure in report["failed"]:
+        log_widget.insert(END, f"❌ Shard {failure['shard']}: {failure['path']}: {failure['error']}\n", "error")
+    if report["missing"]:
+        log_widget.insert(END, f"⚠ Missing shards: {', '.join(map(str, report['missing']))}.\n", "warning")
+    if report["incomplete"]:
+        log_widget.insert(END, f"⚠ Shards that did not finish: {', '.join(map(str, report['incomplete']))}; run "
+                               f"them again with resume.\n", "warning")
+    for operation in report["operations"]:
+        if operation["found"] is False:
+            log_widget.insert(END, f"⚠ Warning: {operation['operation']} did not match any file in any shard.\n",
+                              "warning")
+        elif operation["found"] is None:
+            log_widget.insert(END, f"ℹ {operation['operation']} has not matched any file in the shards merged so "
+                                   f"far.\n", "info")
@@ -0,0 +1,151 @@
+"""
+Staged pipeline for single-process runs: read, edit and save different files at once.
+
+A plain single-process run handles one file at a time, so on a network share
+the CPU sits idle while a file is read or written. The staged pipeline splits
+each file into three stages joined by bounded queues:
+
+* read: reader threads read the next files into memory ahead of the edit stage,
+* edit: the run's thread parses and edits a file from memory and serializes the
+  new workbook into memory (see process_file's data and sink),
+* write: a writer thread saves edited workbooks (see safe_write.write_replacement)
+  while the next file is being edited.
+
+Backpressure keeps memory bounded: at most depth files are read ahead and at
+most depth edited files wait to be written, and no more is read ahead or queued
+while the bytes held by the pipeline exceed max_bytes (one file is always let
+through, however large). Reading and writing release the GIL, so they overlap
+with editing even on a single core. The pipeline records how busy each stage
+was and how long the edit stage waited for the others, so a run shows which
+stage limits it.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from memory_budget import format_size
+
+END = "end"
+DEFAULT_DEPTH = 4
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_READERS = 2
+
+
+def _read(file_path):
+    started = time.perf_counter()
+    try:
+        with open(file_path, "rb") as f:
+            return f.read(), time.perf_counter() - started
+    except OSError:
+        # The edit stage reads the file itself and reports the error
+        return None, time.perf_counter() - started
+
+
+class StagedPipeline:
+    """Settings and stage statistics of a staged run; run() drives the stages."""
+
+    def __init__(self, depth=DEFAULT_DEPTH, max_bytes=DEFAULT_MAX_BYTES, readers=DEFAULT_READERS):
+        self.depth = max(1, depth)
+        self.max_bytes = max_bytes
+        self.readers = max(1, readers)
+        self.files = 0
+        self.seconds = 0.0
+        # Seconds each stage spent working, summed over its threads (see log for the share of the run)
+        self.busy = {"read": 0.0, "edit": 0.0, "write": 0.0}
+        # Seconds the edit stage waited for a file to be read, and for room in the write queue
+        self.waited = {"read": 0.0, "write": 0.0}
+        self.peak_bytes = 0
+        self._held = 0
+
+    def _hold(self, size):
+        self._held += size
+        self.peak_bytes = max(self.peak_bytes, self._held)
+
+    def _write(self, save, file_path, data, result):
+        started = time.perf_counter()
+        try:
+            return save(file_path, data, result)
+        finally:
+            self.busy["write"] += time.perf_counter() - started
+
+    def run(self, jobs, edit, save):
+        """
+        Yield the result of every job, in the order the files finish. jobs yields
+        ("done", result) for a file that needs no work, or ("file", path, size,
+        context) for one to read and edit. edit(path, data, context) runs on the
+        calling thread and returns (result, new bytes or None); data is None when
+        the file could not be read ahead. save(path, new bytes, result) runs on
+        the writer thread and returns the final result.
+        """
+        started = time.perf_counter()
+        reads = deque()
+        writes = deque()
+        jobs = iter(jobs)
+        more = True
+        readers = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="pipeline-read")
+        writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-write")
+        try:
+            while True:
+                while more and len(reads) < self.depth and (not reads or self._held < self.max_bytes):
+                    job = next(jobs, None)
+                    if job is None:
+                        more = False
+                    elif job[0] == "done":
+                        self.files += 1
+                        yield job[1]
+                    else:
+                        _, file_path, size, context = job
+                        self._hold(size)
+                        reads.append((file_path, size, context, readers.submit(_read, file_path)))
+                while writes and writes[0][1].done():
+                    yield self._saved(writes.popleft())
+                if not reads:
+                    if more:
+                        continue
+                    break
+                file_path, size, context, future = reads.popleft()
+                waiting = time.perf_counter()
+                data, read_seconds = future.result()
+                self.waited["read"] += time.perf_counter() - waiting
+                self.busy["read"] += read_seconds
+                editing = time.perf_counter()
+                result, output = edit(file_path, data, context)
+                self.busy["edit"] += time.perf_counter() - editing
+                self._held -= size
+                self.files += 1
+                if output is None:
+                    yield result
+                    continue
+                waiting = time.perf_counter()
+                saved = []
+                while writes and (len(writes) >= self.depth or self._held + len(output) > self.max_bytes):
+                    saved.append(self._saved(writes.popleft()))
+                self.waited["write"] += time.perf_counter() - waiting
+                self._hold(len(output))
+                writes.append((len(output), writer.submit(self._write, save, file_path, output, result)))
+                yield from saved
+            while writes:
+                yield self._saved(writes.popleft())
+        finally:
+            for _, _, _, future in reads:
+                future.cancel()
+            readers.shutdown(wait=True)
+            # Edited files already handed to the writer are still saved
+            writer.shutdown(wait=True)
+            self.seconds += time.perf_counter() - started
+
+    def _saved(self, write):
+        size, future = write
+        result = future.result()
+        self._held -= size
+        return result
+
+    def log(self, log_widget):
+        if not self.seconds:
+            return
+        read = self.busy["read"] / self.readers / self.seconds
+        edit, write = self.busy["edit"] / self.seconds, self.busy["write"] / self.seconds
+        log_widget.insert(END, f"ℹ Pipeline: {self.files} files in {self.seconds:.2f}s; stages busy: read {read:.0%} "
+                               f"({self.readers} threads), edit {edit:.0%}, write {write:.0%}. Editing waited "
+                               f"{self.waited['read']:.2f}s for reads and {self.waited['write']:.2f}s for writes; "
+                               f"at most {format_size(self.peak_bytes)} held in memory.\n", "info")
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+import openpyxl
+import backup_copier
+from backup_copier import BackupCopier
+from functions import process_value_in_directory
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def make_tree(directory, count):
+    paths = [os.path.join(directory, f"folder{number % 2}", f"file{number}.xlsx") for number in range(count)]
+    for file_path in paths:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    return paths
+
+
+def value(file_path):
+    return openpyxl.load_workbook(file_path).active["A1"].value
+
+
+@pytest.mark.parametrize("verify", [False, True])
+def test_current_backups_are_not_copied_again(temp_excel_dir, verify):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    paths = make_tree(source_dir, 6)
+    first = BackupCopier(source_dir, backup_dir, threads=3, verify=verify)
+    assert sorted(first.ready(paths, DummyLog())) == sorted(paths)
+    assert first.outcomes == {"copy": 6} and first.verified == (6 if verify else 0)
+    # An edited file is backed up again, the others are left as they are
+    create_dummy_excel(paths[0], cell_data={"A1": "Hi World, edited"})
+    second = BackupCopier(source_dir, backup_dir, threads=3, verify=verify)
+    second.run(paths, DummyLog())
+    assert second.outcomes == {"copy": 1, "current": 5}
+    assert value(os.path.join(backup_dir, "folder0", "file0.xlsx")) == "Hi World, edited"
+
+
+def test_verify_drops_a_backup_that_does_not_match(temp_excel_dir, monkeypatch):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    paths = make_tree(source_dir, 2)
+
+    def bad_copy(source_file, target_file):
+        with open(target_file, "wb") as target:
+            target.write(b"truncated")
+
+    monkeypatch.setattr(backup_copier.shutil, "copy2", bad_copy)
+    copier = BackupCopier(source_dir, backup_dir, verify=True)
+    log = DummyLog()
+    assert list(copier.ready(paths, log)) == []
+    assert copier.failed == 2 and not os.path.exists(copier.target_for(paths[0]))
+    copier.log(log)
+    assert any("Backup failed, file left unchanged" in message for message in log.messages)
+    assert any("2 files could not be backed up" in message for message in log.messages)
+
+
+def test_keep_existing_leaves_backups_alone(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    paths = make_tree(source_dir, 2)
+    BackupCopier(source_dir, backup_dir).run(paths, DummyLog())
+    create_dummy_excel(paths[0], cell_data={"A1": "Hi World"})
+    copier = BackupCopier(source_dir, backup_dir, keep_existing=True)
+    copier.run(paths, DummyLog())
+    assert copier.outcomes == {"kept": 2}
+    assert value(copier.target_for(paths[0])) == "Hello World"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_only_edits_files_whose_backup_is_done(temp_excel_dir, monkeypatch, workers):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    paths = make_tree(source_dir, 5)
+    real_back_up = BackupCopier.back_up
+
+    def back_up(self, source_file):
+        if source_file == paths[3]:
+            raise OSError("disk full")
+        return real_back_up(self, source_file)
+
+    monkeypatch.setattr(BackupCopier, "back_up", back_up)
+    copier = BackupCopier(source_dir, backup_dir, threads=2)
+    log = DummyLog()
+    process_value_in_directory(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(), backup_dir,
+                               workers=workers, backup_stage=copier)
+    assert [value(file_path) for file_path in paths] == ["Hi World"] * 3 + ["Hello World", "Hi World"]
+    for file_path in paths[:3] + paths[4:]:
+        assert value(copier.target_for(file_path)) == "Hello World"
+    assert any("Backed up 4 files (4 copied)" in message for message in log.messages)
+    assert any("1 files could not be backed up" in message for message in log.messages)
@@ -0,0 +1,61 @@
+import os
+import threading
+
+from event_channel import EventChannel, WidgetPump
+from functions import process_excel_files, process_value_in_directory
+from testing_helpers import DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+class FakeText:
+    """Just enough of a Tk Text widget: tagged inserts at the end, line deletes and index('end-1c')."""
+
+    def __init__(self):
+        self.text = ""
+        self.inserts = 0
+
+    def insert(self, index, *chunks):
+        self.inserts += 1
+        self.text += "".join(chunks[::2])
+
+    def delete(self, start, end):
+        if end == "end":
+            self.text = ""
+        else:
+            self.text = "".join(self.text.splitlines(keepends=True)[int(end.split(".")[0]) - 1:])
+
+    def index(self, index):
+        return f"{self.text.count(chr(10)) + 1}.0"
+
+
+def test_worker_thread_only_talks_to_the_channel(temp_excel_dir):
+    for number in range(20):
+        create_dummy_excel(os.path.join(temp_excel_dir, f"file{number}.xlsx"), cell_data={"A1": "Hello World"})
+    channel = EventChannel()
+    worker = threading.Thread(target=process_value_in_directory, args=(
+        temp_excel_dir, "Hello", "Hi", channel.log, channel.progress, channel.label))
+    worker.start()
+    worker.join()
+
+    log, progress_bar, percent_label = FakeText(), DummyProgressBar(), DummyLabel()
+    log_path = os.path.join(temp_excel_dir, "logs", "session.log")
+    pump = WidgetPump(None, channel, log, progress_bar, percent_label, log_path, max_lines=5)
+    pump.flush()
+    pump.close()
+    # One insert per tick, the widget keeps the last lines, the log file keeps everything
+    assert log.inserts == 1
+    assert log.text.count("\n") == 4
+    assert log.text.endswith("✅ Value replacement completed!\n")
+    assert progress_bar["value"] == 20 and progress_bar["maximum"] == 20
+    assert percent_label.text == "100%"
+    with open(log_path, encoding="utf-8") as f:
+        assert f.read().count("Processed cells replacing 'Hello'") == 20
+
+
+def test_popup_is_shown_by_the_pump(temp_excel_dir):
+    create_dummy_excel(os.path.join(temp_excel_dir, "test.xlsx"), cell_data={"A1": "a=1|"})
+    channel = EventChannel()
+    process_excel_files(temp_excel_dir, None, "missing", "1", False, channel.log, channel.progress, channel.label,
+                        popup=channel.popup)
+    shown = []
+    WidgetPump(None, channel, FakeText(), DummyProgressBar(), DummyLabel(), popup=shown.append).flush()
+    assert shown == ["The key 'missing' was not found in any file."]
@@ -0,0 +1,44 @@
+import os
+
+import file_index
+from file_index import FileIndex, scan_excel_files
+
+
+def touch(path, content=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def test_scan_matches_os_walk(temp_excel_dir):
+    for relative in ("a.xlsx", "notes.txt", "sub/b.xlsx", "sub/deeper/c.xlsx", "Backup/old.xlsx",
+                     "Backup/sub/old.xlsx", "other/Backup/kept.xlsx"):
+        touch(os.path.join(temp_excel_dir, relative))
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    expected = []
+    for root, dirs, files in os.walk(temp_excel_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != backup_dir]
+        expected.extend(os.path.join(root, name) for name in files if name.endswith(".xlsx"))
+    assert sorted(entry.path for entry in FileIndex(temp_excel_dir, backup_dir)) == sorted(expected)
+    assert len(expected) == 4
+    entry = next(entry for entry in scan_excel_files(temp_excel_dir) if entry.path.endswith("a.xlsx"))
+    assert entry.size == 1 and entry.mtime_ns == os.stat(entry.path).st_mtime_ns
+
+
+def test_index_walks_once_and_streams(temp_excel_dir, monkeypatch):
+    for number in range(3):
+        touch(os.path.join(temp_excel_dir, f"dir{number}", "file.xlsx"))
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(file_index.os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+    index = FileIndex(temp_excel_dir)
+    stream = iter(index)
+    first = next(stream)
+    assert len(index) == 1 and not index.complete
+    # A second reader replays what is known and then shares the same walk
+    assert [entry.path for entry in index] == [first.path] + [entry.path for entry in stream]
+    assert index.complete and len(index) == 3
+    walked = len(scans)
+    assert [entry.path for entry in index] == [entry.path for entry in index.entries]
+    assert len(scans) == walked == 4
+    assert sum(entry.size for entry in index) == 3
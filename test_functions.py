@@ -1,4 +1,8 @@
+import csv
+import json
 import os
+import subprocess
+import sys
 import tempfile
 import shutil
 from tkinter import messagebox
@@ -7,69 +11,30 @@ import pytest
 import openpyxl
 from functions import (
     fetch_latest_version,
+    refresh_latest_version,
+    read_cached_version,
     clean_pipes,
     remove_key_value_pair_from_cell,
     search_replace_or_remove_key,
     backup_excel_files,
+    snapshot_file,
+    BACKUP_MANIFEST,
     process_excel_files,
     process_value_cells,
     process_value_in_directory,
+    process_batch_in_directory,
+    process_file,
+    run_file_jobs,
+    key_operation,
+    value_operation,
     start_value_replacement,
+    dry_run_report_path,
     check_for_updates,
     VERSION, open_github_link
 )
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
 import requests
 
-# Dummy log widget to capture log messages.
-class DummyLog:
-    """A dummy log widget that stores log messages in a list."""
-    def __init__(self):
-        self.messages = []
-    def insert(self, index, text, tag=None):
-        self.messages.append(text)
-    def delete(self, start, end):
-        self.messages = []
-
-# Dummy progress bar that supports item assignment.
-class DummyProgressBar:
-    def __init__(self):
-        self.data = {}
-    def __setitem__(self, key, value):
-        self.data[key] = value
-    def __getitem__(self, key):
-        return self.data.get(key, None)
-    def grid(self):
-        pass
-    def grid_remove(self):
-        pass
-    def update_idletasks(self):
-        pass
-
-# Dummy label for percentage display.
-class DummyLabel:
-    def __init__(self):
-        self.text = ""
-    def config(self, text):
-        self.text = text
-    def grid(self):
-        pass
-
-# Fixture for temporary directory to hold Excel files.
-@pytest.fixture
-def temp_excel_dir():
-    dirpath = tempfile.mkdtemp()
-    yield dirpath
-    shutil.rmtree(dirpath)
-
-# Helper to create a dummy Excel file with openpyxl.
-def create_dummy_excel(file_path, sheet_name="Sheet1", cell_data=None):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = sheet_name
-    if cell_data:
-        for cell, value in cell_data.items():
-            ws[cell] = value
-    wb.save(file_path)
 
 def test_fetch_latest_version(monkeypatch):
     # Simulate a successful GitHub response.
@@ -84,6 +49,45 @@ def test_fetch_latest_version(monkeypatch):
     version = fetch_latest_version()
     assert version == "v1.2.3"
 
+
+def test_latest_version_cache(monkeypatch, tmp_path):
+    calls = []
+
+    class DummyResponse:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"tag_name": f"v1.{len(calls)}"}
+
+    def dummy_get(url, timeout):
+        calls.append(url)
+        return DummyResponse()
+
+    cache_path = str(tmp_path / "latest_version.json")
+    monkeypatch.setattr(requests, "get", dummy_get)
+    assert read_cached_version(cache_path=cache_path) is None
+    assert refresh_latest_version(cache_path=cache_path) == "v1.1"
+    assert refresh_latest_version(cache_path=cache_path) == "v1.1"
+    assert len(calls) == 1
+    # Past the TTL GitHub is asked again; when it is unreachable the stale tag is kept
+    assert refresh_latest_version(max_age=-1, cache_path=cache_path) == "v1.2"
+
+    def offline_get(url, timeout):
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr(requests, "get", offline_get)
+    assert refresh_latest_version(max_age=-1, cache_path=cache_path) == "v1.2"
+
+
+def test_engine_import_stays_light():
+    # Importing the engine must not touch the network or load the GUI/HTTP stacks
+    code = ("import sys, functions; "
+            "print(sorted(m for m in ('requests', 'openpyxl', 'tkinter', 'webbrowser') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert output.strip() == "[]"
+
 def test_clean_pipes():
     assert clean_pipes("|   |Hello|  |World|") == "Hello|World|"
     assert clean_pipes("|a=1||b=2|") == "a=1|b=2|"
@@ -121,6 +125,22 @@ def test_backup_excel_files(temp_excel_dir):
     assert "backup directory" in combined_log
 
 
+@pytest.mark.parametrize("engine", ["openpyxl", "xml"])
+def test_snapshot_backup_survives_edit(temp_excel_dir, engine):
+    source_file = os.path.join(temp_excel_dir, "dummy.xlsx")
+    create_dummy_excel(source_file, cell_data={"A1": "a=1|b=2|"})
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    backup_excel_files(temp_excel_dir, backup_dir, DummyLog(), mode="snapshot")
+    backup_file = os.path.join(backup_dir, "dummy.xlsx")
+    assert snapshot_file(source_file, backup_file) in ("reflink", "hardlink", "copy")
+    assert process_file(source_file, key_operation("b", "42", False), engine).changed
+    # The edit wrote a new file, so the snapshot still holds the original content
+    assert not os.path.samefile(source_file, backup_file)
+    assert openpyxl.load_workbook(backup_file).active["A1"].value == "a=1|b=2|"
+    assert openpyxl.load_workbook(source_file).active["A1"].value == "a=1|b=42|"
+    assert not [name for name in os.listdir(temp_excel_dir) if name.endswith(".tmp")]
+
+
 def test_process_excel_files(temp_excel_dir):
     # Create a dummy Excel file with content that will be processed.
     file_path = os.path.join(temp_excel_dir, "test.xlsx")
@@ -177,6 +197,155 @@ def test_process_value_in_directory(temp_excel_dir):
     assert "Replaced" in wb1.active["A1"].value
     assert "Replaced" in wb2.active["A1"].value
 
+def test_process_file_isolates_errors(temp_excel_dir):
+    bad_file = os.path.join(temp_excel_dir, "broken.xlsx")
+    with open(bad_file, "w") as f:
+        f.write("not a workbook")
+    result = process_file(bad_file, value_operation("a", "b"))
+    assert result.path == bad_file
+    assert not result.changed
+    assert result.error
+
+
+def test_run_file_jobs_with_worker_pool(temp_excel_dir):
+    paths = []
+    for i in range(4):
+        file_path = os.path.join(temp_excel_dir, f"file{i}.xlsx")
+        create_dummy_excel(file_path, cell_data={"A1": f"a={i}|b=2|", "A2": "b=3"})
+        paths.append(file_path)
+    bad_file = os.path.join(temp_excel_dir, "broken.xlsx")
+    with open(bad_file, "w") as f:
+        f.write("not a workbook")
+    results = list(run_file_jobs(paths + [bad_file], key_operation("b", "9", False), workers=2))
+    by_path = {result.path: result for result in results}
+    assert len(results) == 5
+    assert by_path[bad_file].error
+    for file_path in paths:
+        assert by_path[file_path].changed and by_path[file_path].cells == 2
+        assert openpyxl.load_workbook(file_path).active["A2"].value == "b=9|"
+
+
+def dies_on_poison(file_path, *args):
+    """process_file, except that the worker process dies on a file named poison.xlsx."""
+    if os.path.basename(file_path) == "poison.xlsx":
+        os._exit(1)
+    return process_file(file_path, *args)
+
+
+def test_dead_worker_fails_only_its_own_file(temp_excel_dir, monkeypatch):
+    import functions
+    paths = []
+    for i in range(12):
+        file_path = os.path.join(temp_excel_dir, f"file{i}.xlsx")
+        create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+        paths.append(file_path)
+    poison = os.path.join(temp_excel_dir, "poison.xlsx")
+    create_dummy_excel(poison, cell_data={"A1": "Hello World"})
+    monkeypatch.setattr(functions, "process_file", dies_on_poison)
+    results = list(run_file_jobs(paths[:6] + [poison] + paths[6:], value_operation("Hello", "Hi"), workers=3))
+    assert sorted(result.path for result in results) == sorted(paths + [poison])
+    assert [result.path for result in results if result.error] == [poison]
+    assert "worker process died" in next(result.error for result in results if result.error)
+    assert all(openpyxl.load_workbook(file_path).active["A1"].value == "Hi World" for file_path in paths)
+
+
+def test_process_value_in_directory_with_workers(temp_excel_dir):
+    file1 = os.path.join(temp_excel_dir, "file1.xlsx")
+    file2 = os.path.join(temp_excel_dir, "file2.xlsx")
+    create_dummy_excel(file1, cell_data={"A1": "Alpha Beta"})
+    create_dummy_excel(file2, cell_data={"A1": "Gamma"})
+    log = DummyLog()
+    prog = DummyProgressBar()
+    percent = DummyLabel()
+    process_value_in_directory(temp_excel_dir, "Beta", "Replaced", log, prog, percent, workers=2)
+    assert openpyxl.load_workbook(file1).active["A1"].value == "Alpha Replaced"
+    assert prog["value"] == 2
+    assert percent.text == "100%"
+    assert any("No cells containing 'Beta'" in message for message in log.messages)
+
+@pytest.mark.parametrize("driver", [
+    lambda directory, *widgets, **options: process_excel_files(directory, None, "b", "5", False, *widgets, popup=False,
+                                                               **options),
+    lambda directory, *widgets, **options: process_value_in_directory(directory, "Beta", "Replaced", *widgets,
+                                                                      **options),
+    lambda directory, *widgets, **options: process_batch_in_directory(directory, [value_operation("Beta", "X")],
+                                                                      *widgets, **options),
+])
+def test_every_driver_logs_an_error_that_stops_the_run(temp_excel_dir, driver):
+    create_dummy_excel(os.path.join(temp_excel_dir, "file.xlsx"), cell_data={"A1": "Alpha Beta"})
+    log = DummyLog()
+
+    def fail(result):
+        raise RuntimeError("disk full")
+
+    driver(temp_excel_dir, log, DummyProgressBar(), DummyLabel(), on_result=fail)
+    assert "❌ An error occurred: disk full\n" in log.messages
+    assert not any("completed" in message for message in log.messages)
+
+def test_prescan_skips_files_without_key(temp_excel_dir):
+    match_file = os.path.join(temp_excel_dir, "match.xlsx")
+    other_file = os.path.join(temp_excel_dir, "other.xlsx")
+    create_dummy_excel(match_file, cell_data={"A1": "a=1|b=2|"})
+    create_dummy_excel(other_file, cell_data={"A1": "|x=1||y=2|"})
+    before = open(other_file, "rb").read()
+    result = process_file(other_file, key_operation("b", "5", False))
+    assert result.skipped and not result.changed
+    log = DummyLog()
+    process_excel_files(temp_excel_dir, None, "b", "5", False, log, DummyProgressBar(), DummyLabel())
+    assert openpyxl.load_workbook(match_file).active["A1"].value == "a=1|b=5|"
+    assert open(other_file, "rb").read() == before
+    assert any("Pre-scan skipped 1 of 2 files" in message for message in log.messages)
+
+def test_lazy_backup_copies_only_changed_files(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    os.makedirs(os.path.join(source_dir, "sub"))
+    changed_file = os.path.join(source_dir, "sub", "changed.xlsx")
+    create_dummy_excel(changed_file, cell_data={"A1": "Hello World"})
+    create_dummy_excel(os.path.join(source_dir, "untouched.xlsx"), cell_data={"A1": "Nothing here"})
+    log = DummyLog()
+    start_value_replacement(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(), "",
+                            engine="xml", backup_mode="lazy")
+    backup_dir = os.path.join(source_dir, "Backup")
+    backup_file = os.path.join(backup_dir, "sub", "changed.xlsx")
+    assert openpyxl.load_workbook(backup_file).active["A1"].value == "Hello World"
+    assert openpyxl.load_workbook(changed_file).active["A1"].value == "Hi World"
+    assert not os.path.exists(os.path.join(backup_dir, "untouched.xlsx"))
+    with open(os.path.join(backup_dir, BACKUP_MANIFEST), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [(row["source"], row["backup"]) for row in rows] == [(os.path.abspath(changed_file), os.path.abspath(backup_file))]
+    assert any("Backed up 1 changed files" in message for message in log.messages)
+
+
+@pytest.mark.parametrize("workers, suffix", [(1, ".csv"), (2, ".jsonl")])
+def test_dry_run_writes_report_and_leaves_files(temp_excel_dir, workers, suffix):
+    changed_file = os.path.join(temp_excel_dir, "sub", "changed.xlsx")
+    os.makedirs(os.path.dirname(changed_file))
+    create_dummy_excel(changed_file, sheet_name="Data", cell_data={"A1": "Hello World", "B2": "Hello again"})
+    create_dummy_excel(os.path.join(temp_excel_dir, "untouched.xlsx"), cell_data={"A1": "Nothing here"})
+    before = os.stat(changed_file).st_mtime_ns
+    report_path = os.path.join(tempfile.mkdtemp(), "preview" + suffix)
+    log = DummyLog()
+    start_value_replacement(temp_excel_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(), "",
+                            workers=workers, backup_mode="lazy", preview_path=report_path)
+    assert os.stat(changed_file).st_mtime_ns == before
+    assert not os.path.exists(os.path.join(temp_excel_dir, "Backup"))
+    with open(report_path, newline="", encoding="utf-8") as f:
+        if suffix == ".csv":
+            rows = [tuple(row.values()) for row in csv.DictReader(f)]
+        else:
+            rows = [tuple(json.loads(line).values()) for line in f]
+    assert sorted(rows) == [(changed_file, "Data", "A1", "Hello World", "Hi World"),
+                            (changed_file, "Data", "B2", "Hello again", "Hi again")]
+    assert not [name for name in os.listdir(os.path.dirname(report_path)) if name.endswith(".part")]
+    assert any("Would change 2 cells in" in message for message in log.messages)
+    shutil.rmtree(os.path.dirname(report_path))
+
+
+def test_dry_run_report_path(temp_excel_dir):
+    path = dry_run_report_path(temp_excel_dir)
+    assert os.path.dirname(path) == temp_excel_dir and os.path.basename(path).startswith("dry_run_")
+
+
 def test_start_value_replacement(temp_excel_dir):
     file_path = os.path.join(temp_excel_dir, "test.xlsx")
     create_dummy_excel(file_path, cell_data={"A1": "Hello World", "B1": "Test"})
@@ -200,7 +369,8 @@ def test_open_github_link(monkeypatch):
         nonlocal called
         called = True
         assert "github.com" in url
-    monkeypatch.setattr("functions.webbrowser.open", dummy_open)
+    # webbrowser is imported when the link is clicked, so patch the module itself
+    monkeypatch.setattr("webbrowser.open", dummy_open)
     open_github_link()
     assert called
 
@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+
+import openpyxl
+from file_index import FileIndex
+from key_index import KeyIndex, main
+from xlsx_cli import main as cli_main
+from testing_helpers import create_dummy_excel
+
+
+def make_tree(directory):
+    paths = {}
+    for name, cells in (("one", {"A1": "VersionsNr=1|Owner=ann|", "B2": "Hello World"}),
+                        ("two", {"A1": "Owner=bob|", "C3": " VersionsNr=2|x"}),
+                        ("three", {"A1": "no keys here"})):
+        paths[name] = os.path.join(directory, "data", name + ".xlsx")
+        os.makedirs(os.path.dirname(paths[name]), exist_ok=True)
+        create_dummy_excel(paths[name], cell_data=cells)
+    return paths
+
+
+def test_refresh_and_queries(temp_excel_dir):
+    paths = make_tree(temp_excel_dir)
+    source_dir = os.path.dirname(paths["one"])
+    with KeyIndex(os.path.join(temp_excel_dir, "index.sqlite3")) as index:
+        stats = index.refresh(FileIndex(source_dir), with_values=True)
+        assert (stats.files, stats.indexed, stats.removed, stats.errors) == (3, 3, 0, [])
+        assert index.files_with_key("VersionsNr") == sorted([paths["one"], paths["two"]])
+        assert index.files_with_key("versionsnr") == [] and index.files_with_key("Owner", temp_excel_dir + "x") == []
+        assert index.locations("VersionsNr", source_dir) == [(paths["one"], "Sheet1", "A1", "1"),
+                                                             (paths["two"], "Sheet1", "C3", "2")]
+        assert index.key_values("Owner") == [("ann", 1, 1), ("bob", 1, 1)]
+        assert index.keys() == [("Owner", 2, 2), ("VersionsNr", 2, 2)]
+        assert index.files_with_text("World") == [paths["one"]] and index.files_with_text("world") == []
+        # Only new or changed files are read again; deleted files are forgotten
+        assert index.refresh(FileIndex(source_dir)).indexed == 0
+        create_dummy_excel(paths["three"], cell_data={"A1": "VersionsNr=3|"})
+        os.remove(paths["two"])
+        stats = index.refresh(FileIndex(source_dir))
+        assert (stats.files, stats.indexed, stats.removed) == (2, 1, 1)
+        assert index.files_with_key("VersionsNr") == sorted([paths["one"], paths["three"]])
+        assert len(index) == 2
+
+
+def test_unreadable_file_is_kept_as_a_target(temp_excel_dir):
+    with open(os.path.join(temp_excel_dir, "broken.xlsx"), "w") as f:
+        f.write("not a workbook")
+    with KeyIndex(os.path.join(temp_excel_dir, "index.sqlite3")) as index:
+        stats = index.refresh(FileIndex(temp_excel_dir))
+        assert stats.errors and index.unreadable_files() == [os.path.join(temp_excel_dir, "broken.xlsx")]
+
+
+def test_cli_only_opens_files_holding_the_key(temp_excel_dir, capsys):
+    paths = make_tree(temp_excel_dir)
+    source_dir = os.path.dirname(paths["one"])
+    index_path = os.path.join(temp_excel_dir, "index.sqlite3")
+    assert cli_main(["set", source_dir, "VersionsNr", "9", "--json", "--key-index", index_path]) == 0
+    captured = capsys.readouterr()
+    opened = [json.loads(line)["path"] for line in captured.out.splitlines()[:-1]]
+    assert sorted(opened) == sorted([paths["one"], paths["two"]])
+    assert "2 of 3 files hold the key 'VersionsNr'" in captured.err
+    assert openpyxl.load_workbook(paths["two"]).active["C3"].value == " |VersionsNr=9|x"
+    assert not os.path.exists(os.path.join(source_dir, "Backup", "three.xlsx"))
+    # The edited files are read again; a key no file holds is reported without opening any
+    assert cli_main(["remove", source_dir, "Missing", "--json", "--key-index", index_path]) == 0
+    captured = capsys.readouterr()
+    assert "(2 files read in" in captured.err and "'Missing' was not found in any file" in captured.err
+    assert json.loads(captured.out)["summary"]["files"] == 0
+
+
+def test_query_command(temp_excel_dir, capsys):
+    paths = make_tree(temp_excel_dir)
+    index_path = os.path.join(temp_excel_dir, "index.sqlite3")
+    main(["--index", index_path, "build", os.path.dirname(paths["one"])])
+    main(["--index", index_path, "query", "Owner", "--values"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Indexed 3 of 3 files (0 removed) in " + lines[0].split(" in ")[1]
+    assert lines[1:3] == ["ann\t1 cells\t1 files", "bob\t1 cells\t1 files"]
+    assert lines[3].startswith("2 results in ") and lines[3].endswith(" ms.")
+
+
+def test_build_leaves_out_the_backup_folder(temp_excel_dir, capsys):
+    paths = make_tree(temp_excel_dir)
+    source_dir = os.path.dirname(paths["one"])
+    os.makedirs(os.path.join(source_dir, "Backup"))
+    shutil.copy(paths["one"], os.path.join(source_dir, "Backup", "one.xlsx"))
+    index_path = os.path.join(temp_excel_dir, "index.sqlite3")
+    main(["--index", index_path, "build", source_dir])
+    assert capsys.readouterr().out.startswith("Indexed 3 of 3 files (0 removed)")
+    # The run sees the same files as the build, so it reads none of them again
+    assert cli_main(["set", source_dir, "Owner", "cy", "--key-index", index_path, "--backup-mode", "none"]) == 0
+    assert "(0 files read in" in capsys.readouterr().err
@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+import openpyxl
+from functions import batch_operation, cell_transform, process_batch_in_directory, start_batch
+from manifest import load_manifest
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def test_load_manifest_csv_and_json(temp_excel_dir):
+    csv_path = os.path.join(temp_excel_dir, "manifest.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("action,key,value,old,new\nset,b,42,,\nremove,c,,,\nreplace,,,Alpha,Omega\n")
+    json_path = os.path.join(temp_excel_dir, "manifest.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump([{"action": "set", "key": "b", "value": "42"}, {"action": "remove", "key": "c"},
+                   {"action": "replace", "old": "Alpha", "new": "Omega"}], f)
+    expected = [("key", "b", "42", False), ("key", "c", "", True), ("value", "Alpha", "Omega")]
+    assert load_manifest(csv_path) == expected
+    assert load_manifest(json_path) == expected
+
+
+def test_load_manifest_rejects_bad_rows(temp_excel_dir):
+    json_path = os.path.join(temp_excel_dir, "manifest.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump([{"action": "set", "key": "b"}], f)
+    with pytest.raises(ValueError, match="entry 1"):
+        load_manifest(json_path)
+
+
+def test_json_manifest_numbers_are_text(temp_excel_dir):
+    json_path = os.path.join(temp_excel_dir, "manifest.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump([{"action": "set", "key": "b", "value": 5}, {"action": "replace", "old": 1.5, "new": 0}], f)
+    operations = load_manifest(json_path)
+    assert operations == [("key", "b", "5", False), ("value", "1.5", "0")]
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|b=2|", "A2": "x 1.5"})
+    log = DummyLog()
+    process_batch_in_directory(temp_excel_dir, operations, log, DummyProgressBar(), DummyLabel())
+    ws = openpyxl.load_workbook(file_path).active
+    assert (ws["A1"].value, ws["A2"].value) == ("a=1|b=5|", "x 0")
+    assert not any("did not match" in message for message in log.messages)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump([{"action": "set", "key": "b", "value": [5]}], f)
+    with pytest.raises(ValueError, match="entry 1"):
+        load_manifest(json_path)
+
+
+def test_batch_transform_applies_operations_in_order():
+    hits = set()
+    transform = cell_transform(batch_operation([("key", "b", "42", False), ("key", "c", "", True),
+                                                ("value", "zzz", "y")]), hits)
+    assert transform("a=1|b=2|c=3|") == "a=1|b=42"
+    assert transform("nothing here") is None
+    assert hits == {0, 1}
+
+
+def test_process_batch_in_directory(temp_excel_dir):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|b=2|c=3|", "A2": "Alpha Beta"})
+    log = DummyLog()
+    operations = [("key", "b", "42", False), ("value", "Alpha", "Omega"), ("key", "missing", "", True)]
+    process_batch_in_directory(temp_excel_dir, operations, log, DummyProgressBar(), DummyLabel())
+    ws = openpyxl.load_workbook(file_path).active
+    assert ws["A1"].value == "a=1|b=42|c=3|"
+    assert ws["A2"].value == "Omega Beta"
+    assert any("remove 'missing' did not match any file" in message for message in log.messages)
+
+
+def test_start_batch_backs_up_once(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    os.makedirs(source_dir)
+    file_path = os.path.join(source_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|b=2|"})
+    manifest_path = os.path.join(temp_excel_dir, "manifest.csv")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        f.write("action,key,value,old,new\nset,a,9,,\nset,b,8,,\n")
+    start_batch(source_dir, manifest_path, DummyLog(), DummyProgressBar(), DummyLabel(), "")
+    assert openpyxl.load_workbook(file_path).active["A1"].value == "a=9|b=8|"
+    backup_file = os.path.join(source_dir, "Backup", "test.xlsx")
+    assert openpyxl.load_workbook(backup_file).active["A1"].value == "a=1|b=2|"
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+import openpyxl
+import functions
+from functions import RunSummary, run_file_jobs, value_operation
+from memory_budget import STREAMING_FOOTPRINT, engine_for, estimate_memory, format_size, parse_size, peak_rss
+from testing_helpers import DummyLog, create_dummy_excel
+
+
+def test_parse_size():
+    assert parse_size("512M") == 512 * 1024 ** 2
+    assert parse_size("4 GB") == 4 * 1024 ** 3
+    assert parse_size("1.5g") == int(1.5 * 1024 ** 3)
+    assert parse_size("2048") == 2048
+    with pytest.raises(ValueError):
+        parse_size("lots")
+    assert format_size(3 * 1024 ** 3) == "3.0 GB"
+
+
+def test_large_files_fall_back_to_streaming():
+    size = 500 * 1024 ** 2
+    assert estimate_memory(size, "openpyxl") > estimate_memory(size, "xml") == STREAMING_FOOTPRINT
+    assert engine_for("openpyxl", size, None) == "openpyxl"
+    assert engine_for("openpyxl", size, parse_size("4G")) == "xml"
+    assert engine_for("openpyxl", 1024, parse_size("4G")) == "openpyxl"
+    assert peak_rss() > 0
+
+
+def test_memory_budget_limits_files_in_flight(temp_excel_dir, monkeypatch):
+    for number in range(4):
+        create_dummy_excel(os.path.join(temp_excel_dir, f"file{number}.xlsx"), cell_data={"A1": "Hello World"})
+    waits = []
+    real_wait = functions.wait
+    monkeypatch.setattr(functions, "wait", lambda *args, **kwargs: waits.append(1) or real_wait(*args, **kwargs))
+    paths = sorted(os.path.join(temp_excel_dir, name) for name in os.listdir(temp_excel_dir))
+    # Room for a single streamed file: openpyxl does not fit, and files run one at a time
+    results = list(run_file_jobs(paths, value_operation("Hello", "Hi"), "openpyxl", workers=2,
+                                 memory_budget=STREAMING_FOOTPRINT))
+    assert sorted(result.path for result in results) == paths
+    assert all(result.changed and result.engine == "xml" and result.peak_rss for result in results)
+    # Three waits for room in the budget, and one for the last file
+    assert len(waits) == 4
+    assert openpyxl.load_workbook(paths[0]).active["A1"].value == "Hi World"
+
+    summary, log = RunSummary("openpyxl"), DummyLog()
+    for result in results:
+        summary.add(result)
+    summary.log(log)
+    assert any("Streamed 4 large files with the xml engine" in message for message in log.messages)
+    assert any(message.startswith("ℹ Peak memory") for message in log.messages)
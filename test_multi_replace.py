@@ -0,0 +1,58 @@
+import os
+import pickle
+
+import openpyxl
+import functions
+from functions import mapping_operation, run_file_jobs, start_value_replacement
+from multi_replace import MultiReplacer
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def test_replace_all_entries_in_one_pass():
+    replacer = MultiReplacer({"P-100": "Q-100", "P-200": "Q-200", "X": "Y"})
+    assert replacer.replace("P-100, P-200 and X") == "Q-100, Q-200 and Y"
+    assert replacer.replace("nothing to see") is None
+
+
+def test_overlapping_matches_are_leftmost_longest():
+    replacer = MultiReplacer({"he": "1", "she": "2", "hers": "3", "A": "B", "B": "C"})
+    # "she" starts before "he"/"hers"; replaced text is not scanned again
+    assert replacer.replace("ushers") == "u2rs"
+    assert replacer.replace("hers") == "3"
+    assert replacer.replace("AB") == "BC"
+
+
+def test_start_value_replacement_with_rename_table(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    os.makedirs(source_dir)
+    file_path = os.path.join(source_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "codes P-1 P-10", "A2": "P-2"})
+    mapping_path = os.path.join(temp_excel_dir, "rename.csv")
+    with open(mapping_path, "w", encoding="utf-8") as f:
+        f.write("old,new\nP-1,N-1\nP-10,N-10\nP-2,N-2\n")
+    log = DummyLog()
+    start_value_replacement(source_dir, "", "", log, DummyProgressBar(), DummyLabel(), "", mapping_path=mapping_path)
+    ws = openpyxl.load_workbook(file_path).active
+    assert ws["A1"].value == "codes N-1 N-10"
+    assert ws["A2"].value == "N-2"
+    assert mapping_operation([("a", "b")]) == ("mapping", (("a", "b"),))
+
+
+def test_rename_table_is_sent_once_per_worker(temp_excel_dir, monkeypatch):
+    submitted = []
+
+    class RecordingPool(functions.ProcessPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitted.append(args)
+            return super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(functions, "ProcessPoolExecutor", RecordingPool)
+    paths = [os.path.join(temp_excel_dir, f"file{number}.xlsx") for number in range(4)]
+    for file_path in paths:
+        create_dummy_excel(file_path, cell_data={"A1": "code P-7"})
+    pairs = [(f"P-{number}", f"N-{number}") for number in range(5000)]
+    results = list(run_file_jobs(paths, mapping_operation(pairs), workers=2))
+    assert all(result.changed and not result.error for result in results)
+    assert all(openpyxl.load_workbook(file_path).active["A1"].value == "code N-7" for file_path in paths)
+    # Only the file arguments travel with each file, not the 5000 pairs
+    assert len(submitted) == 4 and all(len(pickle.dumps(args)) < 1000 for args in submitted)
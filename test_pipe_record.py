@@ -0,0 +1,138 @@
+import random
+import re
+
+import pytest
+from functions import update_key_in_cell, update_keys_in_cell, cell_transform, batch_operation
+from pipe_record import PipeRecord
+
+
+# The regex + clean_pipes implementation the record parser replaced, kept as a reference.
+def legacy_clean_pipes(text, collapse_runs=False):
+    lines = text.splitlines()
+    new_lines = []
+    for line in lines:
+        line = re.sub(r'\|\s*\|', '|', line)
+        # The one deliberate change: runs of pipes and whitespace collapse completely
+        while collapse_runs and re.search(r'\|\s*\|', line):
+            line = re.sub(r'\|\s*\|', '|', line)
+        if line.startswith('|'):
+            line = line[1:]
+        new_lines.append(line)
+    for i in range(len(new_lines) - 1):
+        if new_lines[i].endswith('|') and new_lines[i+1].startswith('|'):
+            new_lines[i+1] = new_lines[i+1][1:]
+    return "\n".join(new_lines)
+
+
+def legacy_substitute(cell_value, key, new_value, remove_key):
+    pattern = r'\|?' + re.escape(key) + r'=[^|]*\|?'
+    if not re.search(pattern, cell_value):
+        return None
+    return re.sub(pattern, '|' if remove_key else f"|{key}={new_value}|", cell_value)
+
+
+def legacy_update_key_in_cell(cell_value, key, new_value, remove_key, collapse_runs=False):
+    substituted = legacy_substitute(cell_value, key, new_value, remove_key)
+    if substituted is None:
+        return None
+    updated_cell = legacy_clean_pipes(substituted, collapse_runs)
+    if remove_key:
+        updated_cell = updated_cell.strip('|')
+    if updated_cell and updated_cell != cell_value:
+        return updated_cell
+    return None
+
+
+# A single re.sub pass cannot collapse three or more pipes separated only by
+# whitespace ("|| |" becomes " |"); the record collapses such runs completely.
+PIPE_RUN = re.compile(r'\|\s*\|\s*\|')
+
+
+FIELDS = ["a=1", "b=2", "c=x=y", "d", "e=", "b=", "a=4", " a=5", "  b=6 "]
+SEPARATORS = ["|", "|", "|", "||", "| |"]
+
+
+def random_cell(rng):
+    lines = []
+    line_count = rng.choice([1, 1, 1, 2, 3])
+    for number in range(line_count):
+        fields = [rng.choice(FIELDS) for _ in range(rng.randint(1, 4))]
+        line = rng.choice(["|", "|", "", "", "", " ", "  |"])
+        for index, field in enumerate(fields):
+            line += field + (rng.choice(SEPARATORS) if index < len(fields) - 1 else "")
+        # The regex version lets a value run on into the next line when the line has no closing pipe
+        if number < line_count - 1 or rng.random() < 0.6:
+            line += "|"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("remove_key", [False, True])
+def test_record_matches_legacy_regex_output(remove_key):
+    rng = random.Random(6)
+    pipe_runs = indented = 0
+    for _ in range(5000):
+        cell = random_cell(rng)
+        key = rng.choice("abcde")
+        substituted = legacy_substitute(cell, key, "9", remove_key)
+        if substituted is not None and PIPE_RUN.search(substituted):
+            pipe_runs += 1
+        if re.search(r'(^|\n)\s+' + key + '=', cell):
+            indented += 1
+        expected = legacy_update_key_in_cell(cell, key, "9", remove_key, collapse_runs=True)
+        assert update_key_in_cell(cell, key, "9", remove_key) == expected, cell
+    # Both cases the old code handles differently from a single clean pass are covered
+    assert pipe_runs > 200 and indented > 200
+
+
+def test_multi_key_update_matches_sequential_updates():
+    rng = random.Random(60)
+    for _ in range(3000):
+        cell = random_cell(rng)
+        updates = [(rng.choice("abcde"), rng.choice(["7", "v w"]), rng.random() < 0.4) for _ in range(rng.randint(2, 4))]
+        expected = None
+        for key, new_value, remove_key in updates:
+            result = update_key_in_cell(cell if expected is None else expected, key, new_value, remove_key)
+            if result is not None:
+                expected = result
+        assert update_keys_in_cell(cell, updates) == (expected if expected != cell else None), (cell, updates)
+
+
+def test_record_view():
+    record = PipeRecord("|a=1||b=x=y| c=3|flag")
+    assert record.items() == [("a", "1"), ("b", "x=y"), ("c", "3")]
+    assert record.get("b") == "x=y"
+    assert "c" in record and "flag" not in record
+    assert str(record) == "a=1|b=x=y| c=3|flag"
+
+
+def test_whitespace_before_key_is_dropped_with_the_field():
+    assert update_key_in_cell("a=1| b=2|c=3|", "b", "9", False) == "a=1|b=9|c=3|"
+    assert update_key_in_cell("a=1| b=2|c=3|", "b", "", True) == "a=1|c=3"
+    assert update_key_in_cell(" b=2|b=3| b=4|", "b", "", True) == " "
+
+
+def test_whitespace_starting_a_line_is_kept():
+    assert update_key_in_cell("  a=lead spaces  ", "a", "N", False) == "  |a=N|"
+    assert update_key_in_cell("  a=lead spaces  ", "a", "", True) == "  "
+    assert update_key_in_cell("x=1|\n  a=2|", "a", "N", False) == "x=1|\n  |a=N|"
+    # After a pipe the whitespace goes with the field, as before
+    assert update_key_in_cell("| a=1|", "a", "N", False) == "a=N|"
+
+
+def test_keys_are_matched_literally():
+    # Regex metacharacters in keys are plain text
+    assert update_key_in_cell("a.b=1|axb=2|", "a.b", "9", False) == "a.b=9|axb=2|"
+    assert update_key_in_cell("x=1|", "(", "9", False) is None
+    # A key never matches inside another key or a value
+    assert update_key_in_cell("ab=1|c=b=2|", "b", "9", False) is None
+    # Backslashes in the new value are kept as typed
+    assert update_key_in_cell("path=x|", "path", r"C:\new\1", False) == "path=C:\\new\\1|"
+
+
+def test_batch_groups_key_operations():
+    hits = set()
+    transform = cell_transform(batch_operation([("key", "a", "1", False), ("key", "z", "", True),
+                                                ("value", "1", "one"), ("key", "b", "3", False)]), hits)
+    assert transform("a=0|b=2") == "a=one|b=3|"
+    assert hits == {0, 2, 3}
@@ -0,0 +1,67 @@
+import os
+
+from functions import FileResult, key_operation, value_operation, process_value_in_directory
+from run_cache import RunCache, main, operation_fingerprint
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def test_cache_matches_on_content(temp_excel_dir):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|"})
+    operation = operation_fingerprint(key_operation("b", "2", False))
+    with RunCache(os.path.join(temp_excel_dir, "cache.sqlite3")) as cache:
+        assert not cache.is_unchanged(file_path, operation)
+        cache.record(FileResult(file_path, False, 0, None), operation)
+        assert cache.is_unchanged(file_path, operation)
+        assert not cache.is_unchanged(file_path, operation_fingerprint(key_operation("b", "3", False)))
+        # A new mtime with the same content still counts as unchanged
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert cache.is_unchanged(file_path, operation)
+        create_dummy_excel(file_path, cell_data={"A1": "b=1|"})
+        assert not cache.is_unchanged(file_path, operation)
+        cache.record(FileResult(file_path, False, 0, None), operation)
+        cache.record(FileResult(file_path, True, 1, None), operation)
+        assert not cache.is_unchanged(file_path, operation)
+
+
+def test_cache_eviction_and_invalidation(temp_excel_dir):
+    cache_path = os.path.join(temp_excel_dir, "cache.sqlite3")
+    paths = []
+    for name in ("one", "two", "three"):
+        folder = os.path.join(temp_excel_dir, name)
+        os.makedirs(folder)
+        paths.append(os.path.join(folder, "test.xlsx"))
+        create_dummy_excel(paths[-1])
+    operation = operation_fingerprint(value_operation("x", "y"))
+    cache = RunCache(cache_path, max_entries=2)
+    for file_path in paths:
+        cache.record(FileResult(file_path, False, 0, None), operation)
+    cache.is_unchanged(paths[0], operation)
+    cache.close()
+    with RunCache(cache_path) as cache:
+        assert len(cache) == 2
+        assert cache.is_unchanged(paths[0], operation)
+        assert not cache.is_unchanged(paths[1], operation)
+        assert cache.invalidate(os.path.join(temp_excel_dir, "three")) == 1
+        assert cache.invalidate(os.path.join(temp_excel_dir, "on")) == 0
+    main(["clear", "--cache", cache_path])
+    with RunCache(cache_path) as cache:
+        assert len(cache) == 0
+
+
+def test_directory_run_skips_cached_files(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    os.makedirs(source_dir)
+    create_dummy_excel(os.path.join(source_dir, "match.xlsx"), cell_data={"A1": "Hello World"})
+    create_dummy_excel(os.path.join(source_dir, "other.xlsx"), cell_data={"A1": "Nothing here"})
+    cache_path = os.path.join(temp_excel_dir, "cache.sqlite3")
+    for _ in range(2):
+        log = DummyLog()
+        process_value_in_directory(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(),
+                                   cache_path=cache_path, prescan=False)
+    # The changed file is now in its final state, the other one never matched
+    assert any("Cache skipped 1 of 2 files" in message for message in log.messages)
+    log = DummyLog()
+    process_value_in_directory(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(), cache_path=cache_path)
+    assert any("Cache skipped 2 of 2 files" in message for message in log.messages)
@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+import pytest
+import openpyxl
+from functions import process_file, process_value_in_directory, value_operation
+from run_control import RunControl
+from run_cache import operation_fingerprint
+from run_journal import journal_path
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def make_files(directory, count):
+    paths = [os.path.join(directory, f"file{number}.xlsx") for number in range(count)]
+    for file_path in paths:
+        create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    return paths
+
+
+def values(paths):
+    return [openpyxl.load_workbook(file_path).active["A1"].value for file_path in paths]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cancel_stops_the_run_and_keeps_the_journal(temp_excel_dir, workers):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    journal_dir = os.path.join(temp_excel_dir, "journals")
+    os.makedirs(source_dir)
+    paths = make_files(source_dir, 6)
+    control = RunControl().start()
+    log = DummyLog()
+    process_value_in_directory(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(), workers=workers,
+                               on_result=lambda result: control.cancel(), journal_dir=journal_dir, control=control)
+    # Every file is either finished or untouched, never half edited
+    assert set(values(paths)) <= {"Hi World", "Hello World"}
+    assert "Hello World" in values(paths)
+    assert any("Run cancelled after" in message for message in log.messages)
+    assert os.path.exists(journal_path(journal_dir, source_dir, operation_fingerprint(value_operation("Hello", "Hi"))))
+    if workers == 1:
+        assert values(paths).count("Hi World") == 1
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "xml"])
+def test_cancelled_file_is_not_saved(temp_excel_dir, engine):
+    file_path = make_files(temp_excel_dir, 1)[0]
+    control = RunControl()
+    control.cancel()
+    result = process_file(file_path, value_operation("Hello", "Hi"), engine, control=control)
+    assert result.cancelled and not result.changed and result.error is None
+    assert values([file_path]) == ["Hello World"]
+    assert os.listdir(temp_excel_dir) == ["file0.xlsx"]
+
+
+def test_pause_holds_the_run_until_resumed(temp_excel_dir):
+    paths = make_files(temp_excel_dir, 2)
+    control = RunControl().start()
+    control.pause()
+    run = threading.Thread(target=process_value_in_directory, args=(
+        temp_excel_dir, "Hello", "Hi", DummyLog(), DummyProgressBar(), DummyLabel()), kwargs=dict(control=control))
+    run.start()
+    time.sleep(0.3)
+    assert run.is_alive() and values(paths) == ["Hello World", "Hello World"]
+    control.resume()
+    run.join(10)
+    assert not run.is_alive() and values(paths) == ["Hi World", "Hi World"]
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+import openpyxl
+import safe_write
+from functions import (FileResult, batch_operation, key_operation, process_batch_in_directory, process_excel_files,
+                       process_value_in_directory, start_value_replacement, value_operation)
+from run_cache import operation_fingerprint
+from run_journal import RunJournal, journal_path, read_finished
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def interrupted_run(journal_dir, directory, operation, finished, hits=()):
+    """Leave the journal of a run that was killed after finishing (and changing) the given files."""
+    journal = RunJournal(journal_dir, directory, operation_fingerprint(operation))
+    for file_path in finished:
+        journal.record(FileResult(file_path, True, 1, None, hits=hits))
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"path": "cut sho')
+
+
+def test_resume_skips_finished_files(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    journal_dir = os.path.join(temp_excel_dir, "journals")
+    os.makedirs(source_dir)
+    paths = [os.path.join(source_dir, f"file{number}.xlsx") for number in range(4)]
+    for file_path in paths:
+        create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    operation = value_operation("Hello", "Hi")
+    fingerprint = operation_fingerprint(operation)
+    interrupted_run(journal_dir, source_dir, operation, paths[:2])
+    assert set(read_finished(journal_path(journal_dir, source_dir, fingerprint))) == set(paths[:2])
+
+    log = DummyLog()
+    process_value_in_directory(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(),
+                               journal_dir=journal_dir, resume=True)
+    values = [openpyxl.load_workbook(file_path).active["A1"].value for file_path in paths]
+    assert values == ["Hello World", "Hello World", "Hi World", "Hi World"]
+    assert any("Skipped 2 of 4 files finished by the interrupted run" in message for message in log.messages)
+    # A complete run removes its journal
+    assert not os.path.exists(journal_path(journal_dir, source_dir, fingerprint))
+
+
+def test_run_without_resume_starts_over(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    journal_dir = os.path.join(temp_excel_dir, "journals")
+    os.makedirs(source_dir)
+    file_path = os.path.join(source_dir, "file.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    interrupted_run(journal_dir, source_dir, value_operation("Hello", "Hi"), [file_path])
+    log = DummyLog()
+    process_value_in_directory(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(),
+                               journal_dir=journal_dir)
+    assert openpyxl.load_workbook(file_path).active["A1"].value == "Hi World"
+    assert any("was interrupted; it was started over" in message for message in log.messages)
+
+
+def test_resume_keeps_backups_of_the_interrupted_run(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    journal_dir = os.path.join(temp_excel_dir, "journals")
+    os.makedirs(source_dir)
+    done, pending = os.path.join(source_dir, "done.xlsx"), os.path.join(source_dir, "pending.xlsx")
+    create_dummy_excel(done, cell_data={"A1": "Hi World"})
+    create_dummy_excel(pending, cell_data={"A1": "Hello World"})
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    os.makedirs(backup_dir)
+    create_dummy_excel(os.path.join(backup_dir, "done.xlsx"), cell_data={"A1": "Hello World"})
+    interrupted_run(journal_dir, source_dir, value_operation("Hello", "Hi"), [done])
+    start_value_replacement(source_dir, "Hello", "Hi", DummyLog(), DummyProgressBar(), DummyLabel(), backup_dir,
+                            journal_dir=journal_dir, resume=True)
+    assert openpyxl.load_workbook(os.path.join(backup_dir, "done.xlsx")).active["A1"].value == "Hello World"
+    assert openpyxl.load_workbook(os.path.join(backup_dir, "pending.xlsx")).active["A1"].value == "Hello World"
+    assert openpyxl.load_workbook(pending).active["A1"].value == "Hi World"
+
+
+def test_resume_without_an_interrupted_run_backs_up_again(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    journal_dir = os.path.join(temp_excel_dir, "journals")
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    os.makedirs(source_dir)
+    file_path = os.path.join(source_dir, "file.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    start_value_replacement(source_dir, "Hello", "Hi", DummyLog(), DummyProgressBar(), DummyLabel(), backup_dir,
+                            journal_dir=journal_dir, resume=True)
+    # Resume left on, but the first run completed: the second backs up the file as the first left it
+    log = DummyLog()
+    start_value_replacement(source_dir, "World", "There", log, DummyProgressBar(), DummyLabel(), backup_dir,
+                            journal_dir=journal_dir, resume=True)
+    assert openpyxl.load_workbook(file_path).active["A1"].value == "Hi There"
+    assert openpyxl.load_workbook(os.path.join(backup_dir, "file.xlsx")).active["A1"].value == "Hi World"
+    assert not any("kept from the interrupted run" in message for message in log.messages)
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_matches_of_the_interrupted_run_count_when_resuming(temp_excel_dir, batch):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    journal_dir = os.path.join(temp_excel_dir, "journals")
+    os.makedirs(source_dir)
+    # The interrupted run already changed the only file with the key
+    done, other = os.path.join(source_dir, "done.xlsx"), os.path.join(source_dir, "other.xlsx")
+    create_dummy_excel(done, cell_data={"A1": "a=1|b=9|"})
+    create_dummy_excel(other, cell_data={"A1": "x=1|"})
+    operations = [key_operation("b", "9", False)]
+    log = DummyLog()
+    if batch:
+        interrupted_run(journal_dir, source_dir, batch_operation(operations), [done], hits=(0,))
+        process_batch_in_directory(source_dir, operations, log, DummyProgressBar(), DummyLabel(),
+                                   journal_dir=journal_dir, resume=True)
+    else:
+        interrupted_run(journal_dir, source_dir, operations[0], [done])
+        process_excel_files(source_dir, None, "b", "9", False, log, DummyProgressBar(), DummyLabel(), popup=False,
+                            journal_dir=journal_dir, resume=True)
+    assert any("1 files were already finished" in message for message in log.messages)
+    assert not any("not found" in message or "did not match" in message for message in log.messages)
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "xml"])
+def test_saves_are_synced_before_the_rename(temp_excel_dir, monkeypatch, engine):
+    file_path = os.path.join(temp_excel_dir, "file.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    synced = []
+    real_replace = safe_write.os.replace
+    monkeypatch.setattr(safe_write, "fsync_file", lambda path: synced.append(path))
+    monkeypatch.setattr(safe_write.os, "replace", lambda source, target: (synced.append("replace"),
+                                                                          real_replace(source, target)))
+    process_value_in_directory(temp_excel_dir, "Hello", "Hi", DummyLog(), DummyProgressBar(), DummyLabel(),
+                               engine=engine)
+    assert synced[-1] == "replace" and synced[-2].endswith(".tmp")
+    assert [name for name in os.listdir(temp_excel_dir)] == ["file.xlsx"]
@@ -0,0 +1,42 @@
+import json
+import os
+import time
+
+import pytest
+from functions import start_value_replacement
+from run_trace import FileTimer
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def test_nested_stages_are_counted_once():
+    timer = FileTimer()
+    with timer.stage("scan"):
+        timer.timed("modify", lambda value: time.sleep(0.01), "cells_scanned")("x")
+    timer.count("cells_changed")
+    trace = timer.as_dict()
+    assert trace["stages"]["modify"] >= 0.01 > trace["stages"]["scan"]
+    assert trace["cells_scanned"] == trace["cells_changed"] == 1
+
+
+@pytest.mark.parametrize("engine, workers", [("openpyxl", 1), ("xml", 2)])
+def test_trace_and_slowest_profiles(temp_excel_dir, engine, workers):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    os.makedirs(source_dir)
+    for number in range(3):
+        create_dummy_excel(os.path.join(source_dir, f"file{number}.xlsx"), cell_data={"A1": "Hello World", "A2": "x"})
+    create_dummy_excel(os.path.join(source_dir, "miss.xlsx"), cell_data={"A1": "Nothing"})
+    trace_path = os.path.join(temp_excel_dir, "logs", "trace.json")
+    log = DummyLog()
+    start_value_replacement(source_dir, "Hello", "Hi", log, DummyProgressBar(), DummyLabel(), "", engine=engine,
+                            workers=workers, trace_path=trace_path, profile_slowest=2)
+    with open(trace_path, encoding="utf-8") as f:
+        trace = json.load(f)
+    assert {"discover", "backup"} <= set(trace["run_stages"])
+    assert {"prescan", "scan", "modify", "save"} <= set(trace["stages"])
+    assert trace["counters"]["cells_changed"] == 3
+    assert trace["counters"]["bytes_read"] > 0 and trace["counters"]["bytes_written"] > 0
+    assert len(trace["files"]) == 4
+    # Only the profiles of the two slowest files are kept
+    assert len(trace["slowest"]) == 2 and all(os.path.exists(path) for path in trace["slowest"])
+    assert len(os.listdir(os.path.join(temp_excel_dir, "logs", "trace_profiles"))) == 2
+    assert any(message.startswith("⏱ Time per stage: discover") for message in log.messages)
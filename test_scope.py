@@ -0,0 +1,127 @@
+import os
+import re
+import zipfile
+
+import pytest
+import openpyxl
+import xml_engine
+from functions import edit_string_cells, process_excel_files, update_key_in_cell
+from scope import parse_range, parse_scope
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel
+from xml_engine import SHARED_STRINGS_TYPE
+
+
+def share_strings(file_path):
+    """Move the inline strings of every sheet into one shared string table, one entry per distinct text."""
+    with zipfile.ZipFile(file_path) as archive:
+        members = {info.filename: archive.read(info) for info in archive.infolist()}
+    strings = {}
+
+    def to_shared(match):
+        index = strings.setdefault(match.group(3), len(strings))
+        return b'<c r="' + match.group(1) + b'"' + match.group(2) + b' t="s"><v>' + str(index).encode() + b"</v></c>"
+
+    for name in members:
+        if name.startswith("xl/worksheets/"):
+            members[name] = re.sub(rb'<c r="(\w+)"([^>]*?) t="inlineStr"><is><t>(.*?)</t></is></c>', to_shared,
+                                   members[name])
+    members["xl/sharedStrings.xml"] = (
+        b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="%d" uniqueCount="%d">'
+        % (len(strings), len(strings)) + b"".join(b"<si><t>" + text + b"</t></si>" for text in strings) + b"</sst>")
+    members["[Content_Types].xml"] = members["[Content_Types].xml"].replace(
+        b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType="' + SHARED_STRINGS_TYPE.encode()
+        + b'" /></Types>')
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def create_config_workbook(file_path, shared=False):
+    wb = openpyxl.Workbook()
+    config = wb.active
+    config.title = "Config"
+    config["A1"], config["B1"] = "Name", "Metadata"
+    config["A2"], config["B2"] = "a=1|b=2|", "a=1|b=2|"
+    config["A3"], config["B3"] = "a=1|", "b=5|"
+    data = wb.create_sheet("Data")
+    data["A1"], data["B2"] = "a=1|b=2|", "b=3|"
+    wb.save(file_path)
+    if shared:
+        share_strings(file_path)
+
+
+def read_values(file_path):
+    wb = openpyxl.load_workbook(file_path)
+    return {(ws.title, cell.coordinate): cell.value for ws in wb for row in ws.iter_rows() for cell in row
+            if cell.value is not None}
+
+
+def test_parse_scope():
+    assert parse_scope() is None and parse_scope(" ", "", ",") is None
+    scope = parse_scope("Config, Data*", 'b, Metadata, "ID"', "B2:D5, c:c, 3:4, e7")
+    assert scope.sheets == ("config", "data*")
+    assert scope.columns == (2,) and scope.headers == ("metadata", "id")
+    assert scope.ranges == ((2, 2, 4, 5), (3, None, 3, None), (None, 3, None, 4), (5, 7, 5, 7))
+    assert scope.selects_sheet("CONFIG") and scope.selects_sheet("Data 2") and not scope.selects_sheet("Other")
+    assert parse_range("D5:B2") == (2, 2, 4, 5)
+    for text in ("B2:5", "A0", "B2:", "XFE1", "Sheet!A1"):
+        with pytest.raises(ValueError):
+            parse_range(text)
+
+
+def test_area():
+    area = parse_scope(columns="B, Metadata", ranges="2:10, A5:F20").area(header_columns=(4,))
+    assert area.contains(2, 1) is False  # row 1 is outside both ranges
+    assert area.contains(4, 2) and area.contains(2, 12) and not area.contains(3, 5) and not area.contains(2, 21)
+    assert area.bounds(30, 100) == (2, 2, 4, 20)
+    # None of the named headers is in the sheet
+    assert parse_scope(columns="Metadata").area().empty
+
+
+@pytest.mark.parametrize("shared", [False, True])
+@pytest.mark.parametrize("fields", [("Config", "Metadata", ""), ("config", "B", "2:2"), ("Conf*", "", "B2")])
+def test_engines_only_edit_inside_the_scope(temp_excel_dir, shared, fields):
+    scope = parse_scope(*fields)
+    results = []
+    for engine in ("openpyxl", "xml"):
+        file_path = os.path.join(temp_excel_dir, f"{engine}.xlsx")
+        create_config_workbook(file_path, shared)
+        coverage = {"sheets": 0, "sheets_skipped": 0, "cells": 0}
+        changed = edit_string_cells(file_path, lambda value: update_key_in_cell(value, "a", "9", False), engine,
+                                    scope=scope, coverage=coverage)
+        assert changed == 1 and coverage["sheets"] == 1 and coverage["sheets_skipped"] == 1
+        results.append(read_values(file_path))
+    assert results[0] == results[1]
+    # The same text in A2 and on the Data sheet (a single shared string) keeps its old value
+    assert results[1][("Config", "B2")] == "a=9|b=2|"
+    assert results[1][("Config", "A2")] == results[1][("Data", "A1")] == "a=1|b=2|"
+    assert results[1][("Config", "B1")] == "Metadata"
+
+
+def test_xml_engine_does_not_read_sheets_outside_the_scope(temp_excel_dir, monkeypatch):
+    file_path = os.path.join(temp_excel_dir, "file.xlsx")
+    create_config_workbook(file_path, shared=True)
+    fed = []
+    real_feed = xml_engine._feed
+    monkeypatch.setattr(xml_engine, "_feed", lambda archive, name, rewriter: (fed.append(name),
+                                                                              real_feed(archive, name, rewriter)))
+    edit_string_cells(file_path, lambda value: update_key_in_cell(value, "b", "9", False), "xml",
+                      scope=parse_scope("Config", "B"))
+    assert fed == ["xl/worksheets/sheet1.xml", "xl/sharedStrings.xml"]
+    with zipfile.ZipFile(file_path) as archive:
+        table = archive.read("xl/sharedStrings.xml")
+    assert b'uniqueCount="8"' in table and table.endswith(b"</sst>")
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "xml"])
+def test_scoped_run_reports_what_it_read(temp_excel_dir, engine):
+    create_config_workbook(os.path.join(temp_excel_dir, "file.xlsx"))
+    log = DummyLog()
+    process_excel_files(temp_excel_dir, None, "b", "7", False, log, DummyProgressBar(), DummyLabel(), engine,
+                        popup=False, scope=parse_scope("config", "metadata"))
+    values = read_values(os.path.join(temp_excel_dir, "file.xlsx"))
+    assert values[("Config", "B2")] == "a=1|b=7|" and values[("Config", "B3")] == "b=7|"
+    assert values[("Config", "A2")] == "a=1|b=2|" and values[("Data", "B2")] == "b=3|"
+    assert any("Only editing sheets config; columns \"metadata\"" in message for message in log.messages)
+    assert any("Scope: read 2 string cells in 1 sheets of 1 files; 1 sheets outside the scope were skipped"
+               in message for message in log.messages)
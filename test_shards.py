@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+import openpyxl
+from file_index import FileEntry, FileIndex
+from shards import ShardSpec, parse_shard, shard_files, size_shards
+from xlsx_cli import main as cli_main
+from testing_helpers import create_dummy_excel
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "xlsx_cli.py")
+
+
+def make_tree(directory, count):
+    paths = [os.path.join(directory, f"folder{number % 3}", f"file{number}.xlsx") for number in range(count)]
+    for number, file_path in enumerate(paths):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        create_dummy_excel(file_path, cell_data={"A1": "a=1|" if number % 4 else "b=1|"})
+    return paths
+
+
+def test_parse_shard():
+    assert parse_shard("2/8") == ShardSpec(2, 8, "hash") and parse_shard("1/1", "size") == ShardSpec(1, 1, "size")
+    for text in ("2", "0/4", "5/4", "a/b", "1/2/3"):
+        with pytest.raises(ValueError):
+            parse_shard(text)
+    with pytest.raises(ValueError):
+        parse_shard("1/2", "random")
+
+
+@pytest.mark.parametrize("method", ["hash", "size"])
+def test_every_file_is_in_exactly_one_shard(temp_excel_dir, method):
+    paths = make_tree(temp_excel_dir, 20)
+    shards = [[entry.path for entry in shard_files(FileIndex(temp_excel_dir), ShardSpec(index, 3, method))]
+              for index in (1, 2, 3)]
+    assert sorted(sum(shards, [])) == sorted(paths)
+    # The same spec picks the same files on every node
+    assert shards[0] == [entry.path for entry in shard_files(FileIndex(temp_excel_dir), ShardSpec(1, 3, method))]
+
+
+def test_size_shards_balance_bytes():
+    entries = [FileEntry(f"/data/{number}.xlsx", size, 0) for number, size in enumerate([90, 50, 40, 30, 30, 20, 10])]
+    assigned = size_shards(entries, "/data", 2)
+    loads = [sum(entry.size for entry in entries if assigned[entry.path] == shard) for shard in (1, 2)]
+    assert sorted(loads) == [130, 140]
+
+
+def test_shard_processes_on_one_machine_merge_into_one_report(temp_excel_dir, capsys):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    paths = make_tree(source_dir, 12)
+    results = [os.path.join(temp_excel_dir, f"shard{index}.jsonl") for index in (1, 2, 3)]
+    processes = [subprocess.Popen([sys.executable, CLI, "set", source_dir, "a", "9", "--shard", f"{index}/3",
+                                   "--shard-by", "size", "--shard-results", results[index - 1], "--journal-dir",
+                                   os.path.join(temp_excel_dir, "journals"), "-q"], stderr=subprocess.PIPE)
+                 for index in (1, 2, 3)]
+    for process in processes:
+        assert process.wait(120) == 0, process.stderr.read()
+        process.stderr.close()
+    assert all(openpyxl.load_workbook(path).active["A1"].value == ("a=9|" if number % 4 else "b=1|")
+               for number, path in enumerate(paths))
+    report_path = os.path.join(temp_excel_dir, "merged.json")
+    assert cli_main(["merge"] + results + ["--report", report_path]) == 0
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+    assert (report["files"], report["changed"], report["cells"], report["errors"]) == (12, 9, 9, 0)
+    assert report["complete"] and report["operations"] == [{"operation": "set 'a' = '9'", "files": 9, "found": True}]
+    assert "Merged 3 of 3 shards" in capsys.readouterr().err
+
+
+def test_key_not_found_is_decided_by_the_merge(temp_excel_dir, capsys):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    make_tree(source_dir, 6)
+    results = [os.path.join(temp_excel_dir, f"shard{index}.jsonl") for index in (1, 2)]
+    for index in (1, 2):
+        assert cli_main(["remove", source_dir, "missing", "--shard", f"{index}/2", "--shard-results",
+                         results[index - 1], "--journal-dir", os.path.join(temp_excel_dir, "journals")]) == 0
+    err = capsys.readouterr().err
+    # No single shard can tell that the key is nowhere
+    assert "'missing' was not found in this shard" in err and "was not found in any file" not in err
+    assert cli_main(["merge", results[0]]) == 1
+    assert "has not matched any file in the shards merged so far" in capsys.readouterr().err
+    assert cli_main(["merge"] + results) == 0
+    assert "remove 'missing' did not match any file in any shard" in capsys.readouterr().err
+    assert cli_main(["merge", results[0], results[0]]) == 2
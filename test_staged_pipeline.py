@@ -0,0 +1,79 @@
+import os
+
+import pytest
+import openpyxl
+from functions import process_value_in_directory
+from run_control import RunControl
+from staged_pipeline import StagedPipeline
+from testing_helpers import DummyLog, DummyProgressBar, DummyLabel, create_dummy_excel
+
+
+def make_tree(directory, count):
+    paths = [os.path.join(directory, f"folder{number % 2}", f"file{number}.xlsx") for number in range(count)]
+    for number, file_path in enumerate(paths):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        create_dummy_excel(file_path, cell_data={"A1": "Hello World" if number % 3 else "Nothing to see"})
+    return paths
+
+
+def value(file_path):
+    return openpyxl.load_workbook(file_path).active["A1"].value
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "xml"])
+def test_staged_run_matches_a_plain_run(temp_excel_dir, engine):
+    plain = make_tree(os.path.join(temp_excel_dir, "plain"), 7)
+    staged = make_tree(os.path.join(temp_excel_dir, "staged"), 7)
+    plain_results, staged_results = [], []
+    process_value_in_directory(os.path.dirname(os.path.dirname(plain[0])), "Hello", "Hi", DummyLog(),
+                               DummyProgressBar(), DummyLabel(), engine=engine, on_result=plain_results.append)
+    log = DummyLog()
+    pipeline = StagedPipeline(depth=2)
+    process_value_in_directory(os.path.dirname(os.path.dirname(staged[0])), "Hello", "Hi", log, DummyProgressBar(),
+                               DummyLabel(), engine=engine, on_result=staged_results.append, pipeline=pipeline)
+    assert [value(path) for path in staged] == [value(path) for path in plain]
+    assert sorted((os.path.basename(r.path), r.changed, r.cells) for r in staged_results) == \
+        sorted((os.path.basename(r.path), r.changed, r.cells) for r in plain_results)
+    assert pipeline.files == 7 and not any(r.error for r in staged_results)
+    assert any(message.startswith("ℹ Pipeline: 7 files in") and "stages busy: read" in message
+               for message in log.messages)
+
+
+def test_lazy_backup_is_taken_before_the_save(temp_excel_dir):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    backup_dir = os.path.join(temp_excel_dir, "Backup")
+    paths = make_tree(source_dir, 4)
+    process_value_in_directory(source_dir, "Hello", "Hi", DummyLog(), DummyProgressBar(), DummyLabel(), backup_dir,
+                               backup_mode="lazy", pipeline=StagedPipeline())
+    assert value(paths[1]) == "Hi World"
+    assert value(os.path.join(backup_dir, "folder1", "file1.xlsx")) == "Hello World"
+    # Files without a match are neither saved nor backed up
+    assert not os.path.exists(os.path.join(backup_dir, "folder0", "file0.xlsx"))
+
+
+def test_memory_bound_limits_files_held(temp_excel_dir):
+    paths = make_tree(temp_excel_dir, 6)
+    largest = max(os.path.getsize(path) for path in paths)
+    pipeline = StagedPipeline(depth=4, max_bytes=1)
+    process_value_in_directory(temp_excel_dir, "Hello", "Hi", DummyLog(), DummyProgressBar(), DummyLabel(),
+                               pipeline=pipeline)
+    # Only one file at a time is let through, however large
+    assert 0 < pipeline.peak_bytes <= 2 * largest
+    assert all(value(path) == ("Hi World" if number % 3 else "Nothing to see") for number, path in enumerate(paths))
+
+
+def test_cancel_leaves_files_in_flight_unsaved(temp_excel_dir):
+    paths = make_tree(temp_excel_dir, 9)
+    control = RunControl().start()
+    results = []
+
+    def cancel_after_first(result):
+        results.append(result)
+        control.cancel()
+
+    process_value_in_directory(temp_excel_dir, "World", "There", DummyLog(), DummyProgressBar(), DummyLabel(),
+                               on_result=cancel_after_first, control=control, pipeline=StagedPipeline(depth=2))
+    # Every file on disk that changed was reported as saved, and the rest of the queue was never written
+    changed = {result.path for result in results if result.changed}
+    assert {path for path in paths if value(path) == "Hello There"} == changed
+    assert len(changed) < 6
@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+import openpyxl
+from functions import key_operation, value_operation
+from run_control import RunControl
+from watch_mode import InotifyWatcher, SettleQueue, open_watcher, watch_directory
+from testing_helpers import DummyLog, create_dummy_excel
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_settle_queue_waits_until_writes_stop(temp_excel_dir):
+    file_path = os.path.join(temp_excel_dir, "drop.xlsx")
+    with open(file_path, "wb") as f:
+        f.write(b"part")
+    now = [0.0]
+    queue = SettleQueue(settle=2, clock=lambda: now[0])
+    queue.note(file_path)
+    now[0] = 1.5
+    assert queue.ready() == []
+    # Still growing when it would have settled: wait another settle period
+    with open(file_path, "ab") as f:
+        f.write(b" more")
+    now[0] = 2.5
+    assert queue.ready() == [] and len(queue) == 1
+    now[0] = 4.5
+    assert queue.ready() == [file_path] and len(queue) == 0
+    queue.note(os.path.join(temp_excel_dir, "gone.xlsx"))
+    now[0] = 10
+    assert queue.ready() == [] and len(queue) == 0
+
+
+@pytest.mark.parametrize("poll", [False, True])
+def test_watch_edits_dropped_and_changed_files(temp_excel_dir, poll):
+    if not poll and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux only")
+    source_dir = os.path.join(temp_excel_dir, "share")
+    backup_dir = os.path.join(source_dir, "Backup")
+    os.makedirs(source_dir)
+    existing = os.path.join(source_dir, "existing.xlsx")
+    create_dummy_excel(existing, cell_data={"A1": "a=1|"})
+    results = []
+    control = RunControl().start()
+    log = DummyLog()
+    watcher = threading.Thread(target=watch_directory, args=(
+        source_dir, [key_operation("a", "9", False), value_operation("Hello", "Hi")], log, backup_dir),
+        kwargs=dict(settle=0.2, poll=poll, poll_interval=0.1, control=control, on_result=results.append))
+    watcher.start()
+    try:
+        wait_for(lambda: any("Watching" in message for message in log.messages))
+        # A file dropped into a new subfolder, and a change to a file that was already there
+        dropped = os.path.join(source_dir, "exports", "drop.xlsx")
+        os.makedirs(os.path.dirname(dropped))
+        create_dummy_excel(dropped, cell_data={"A1": "a=1|b=2|", "A2": "Hello World"})
+        wait_for(lambda: len(results) == 1)
+        create_dummy_excel(existing, cell_data={"A1": "a=2|"})
+        wait_for(lambda: len(results) == 2)
+        # Give the saves time to come back as events: they must not be edited again
+        time.sleep(0.8)
+    finally:
+        control.cancel()
+        watcher.join(10)
+    assert not watcher.is_alive()
+    assert [result.path for result in results] == [dropped, existing] and all(result.changed for result in results)
+    ws = openpyxl.load_workbook(dropped).active
+    assert (ws["A1"].value, ws["A2"].value) == ("a=9|b=2|", "Hi World")
+    assert openpyxl.load_workbook(existing).active["A1"].value == "a=9|"
+    assert openpyxl.load_workbook(os.path.join(backup_dir, "exports", "drop.xlsx")).active["A1"].value == "a=1|b=2|"
+    assert any("2 files checked, 2 changed" in message for message in log.messages)
+
+
+def test_falls_back_to_polling(temp_excel_dir, monkeypatch):
+    def unavailable(*args):
+        raise OSError(24, "Too many open files")
+
+    monkeypatch.setattr(InotifyWatcher, "__init__", unavailable)
+    watcher = open_watcher(temp_excel_dir)
+    assert watcher.kind == "polling"
+    watcher.close()
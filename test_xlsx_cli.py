@@ -0,0 +1,89 @@
+import json
+import os
+
+import openpyxl
+from xlsx_cli import main
+from testing_helpers import create_dummy_excel
+
+
+def test_set_key_with_json_output(temp_excel_dir, capsys):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|b=2|c=3|"})
+    create_dummy_excel(os.path.join(temp_excel_dir, "other.xlsx"), cell_data={"A1": "x=1|"})
+    assert main(["set", temp_excel_dir, "b", "42", "--json", "--engine", "xml"]) == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    results = {os.path.basename(line["path"]): line for line in lines[:-1]}
+    assert results["test.xlsx"]["changed"] and results["test.xlsx"]["cells"] == 1
+    assert results["other.xlsx"]["skipped"]
+    summary = lines[-1]["summary"]
+    assert summary["files"] == 2 and summary["changed"] == 1 and summary["cells"] == 1
+    assert {"files_per_second", "mb_per_second", "changed_cells_per_second"} <= set(summary)
+    # The file the pre-scan skipped was not read, so its bytes do not count
+    assert summary["processed"] == 1 and summary["bytes"] == os.path.getsize(file_path)
+    assert openpyxl.load_workbook(file_path).active["A1"].value == "a=1|b=42|c=3|"
+    assert os.path.exists(os.path.join(temp_excel_dir, "Backup", "test.xlsx"))
+
+
+def test_remove_and_replace(temp_excel_dir, capsys):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|b=2|", "A2": "Hello World"})
+    assert main(["remove", temp_excel_dir, "b", "--backup-mode", "none"]) == 0
+    assert main(["replace", temp_excel_dir, "Hello", "Hi", "--backup-mode", "none", "-q"]) == 0
+    ws = openpyxl.load_workbook(file_path).active
+    assert ws["A1"].value == "a=1"
+    assert ws["A2"].value == "Hi World"
+    assert not os.path.exists(os.path.join(temp_excel_dir, "Backup"))
+    assert "changed cells/s" in capsys.readouterr().err
+
+
+def test_errors_set_exit_code(temp_excel_dir):
+    with open(os.path.join(temp_excel_dir, "broken.xlsx"), "w") as f:
+        f.write("not a workbook")
+    assert main(["replace", temp_excel_dir, "a", "b", "--backup-mode", "none", "--no-prescan"]) == 1
+    assert main(["replace", os.path.join(temp_excel_dir, "missing"), "a", "b"]) == 2
+
+
+def test_error_that_stops_the_run_sets_exit_code(temp_excel_dir, capsys):
+    source_dir = os.path.join(temp_excel_dir, "data")
+    os.makedirs(source_dir)
+    create_dummy_excel(os.path.join(source_dir, "test.xlsx"), cell_data={"A1": "a=1|b=2|"})
+    not_a_folder = os.path.join(temp_excel_dir, "file.txt")
+    with open(not_a_folder, "w") as f:
+        f.write("x")
+    assert main(["set", source_dir, "b", "3", "--dry-run", os.path.join(not_a_folder, "preview.csv"), "-q"]) == 1
+    assert main(["set", source_dir, "b", "3", "--journal-dir", not_a_folder, "--backup-mode", "none", "-q"]) == 1
+    err = capsys.readouterr().err
+    assert err.count("❌ An error occurred") == 2 and "completed" not in err
+
+
+def test_dry_run_report(temp_excel_dir, capsys):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|b=2|"})
+    report_path = os.path.join(temp_excel_dir, "preview.jsonl")
+    assert main(["set", temp_excel_dir, "b", "42", "--dry-run", report_path, "-q"]) == 0
+    with open(report_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == [{"file": file_path, "sheet": "Sheet1", "cell": "A1", "before": "a=1|b=2|", "after": "a=1|b=42|"}]
+    assert openpyxl.load_workbook(file_path).active["A1"].value == "a=1|b=2|"
+    assert not os.path.exists(os.path.join(temp_excel_dir, "Backup"))
+
+
+def test_memory_budget_reports_peak_rss(temp_excel_dir, capsys):
+    create_dummy_excel(os.path.join(temp_excel_dir, "test.xlsx"), cell_data={"A1": "Hello World"})
+    assert main(["replace", temp_excel_dir, "Hello", "Hi", "--memory-budget", "64M", "--backup-mode", "none",
+                 "--json", "-q"]) == 0
+    result, summary = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert result["engine"] == "xml" and result["peak_rss"] > 0
+    assert summary["summary"]["peak_rss"] == result["peak_rss"]
+
+
+def test_scope_options(temp_excel_dir, capsys):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, "Config", cell_data={"A2": "b=2|", "B2": "b=2|"})
+    assert main(["set", temp_excel_dir, "b", "42", "--sheets", "config", "--columns", "B", "--range", "2:9",
+                 "--backup-mode", "none", "--json", "-q"]) == 0
+    summary = json.loads(capsys.readouterr().out.splitlines()[-1])["summary"]
+    assert summary["cells"] == 1 and summary["cells_scanned"] == 1 and summary["sheets_skipped"] == 0
+    sheet = openpyxl.load_workbook(file_path).active
+    assert (sheet["A2"].value, sheet["B2"].value) == ("b=2|", "b=42|")
+    assert main(["set", temp_excel_dir, "b", "42", "--range", "B2:9", "--backup-mode", "none", "-q"]) == 2
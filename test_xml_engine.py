@@ -0,0 +1,113 @@
+import io
+import os
+import re
+import zipfile
+
+import pytest
+import openpyxl
+from functions import update_key_in_cell, edit_string_cells, process_value_cells
+from testing_helpers import DummyLog, create_dummy_excel
+from xml_engine import SHARED_STRINGS_TYPE, StringRegionRewriter, may_contain, rewrite_string_cells
+
+
+def convert_to_shared_strings(file_path, rich_cell=None):
+    """Rewrite the inline strings written by openpyxl into a shared string table."""
+    with zipfile.ZipFile(file_path) as archive:
+        members = {info.filename: archive.read(info) for info in archive.infolist()}
+    strings = []
+
+    def to_shared(match):
+        strings.append(match.group(3))
+        return (b'<c r="' + match.group(1) + b'"' + match.group(2) + b' t="s"><v>'
+                + str(len(strings) - 1).encode() + b"</v></c>")
+
+    sheet = "xl/worksheets/sheet1.xml"
+    members[sheet] = re.sub(rb'<c r="(\w+)"([^>]*?) t="inlineStr"><is><t>(.*?)</t></is></c>', to_shared, members[sheet])
+    items = []
+    for index, text in enumerate(strings):
+        if rich_cell == index:
+            half = len(text) // 2
+            items.append(b"<si><r><t>" + text[:half] + b"</t></r><r><rPr><b/></rPr><t>" + text[half:]
+                         + b'</t></r><rPh sb="0" eb="1"><t>ignored</t></rPh></si>')
+        else:
+            items.append(b"<si><t>" + text + b"</t></si>")
+    members["xl/sharedStrings.xml"] = (
+        b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">' + b"".join(items) + b"</sst>")
+    members["[Content_Types].xml"] = members["[Content_Types].xml"].replace(
+        b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType="' + SHARED_STRINGS_TYPE.encode()
+        + b'" /></Types>')
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def read_values(file_path):
+    wb = openpyxl.load_workbook(file_path)
+    return {(ws.title, cell.coordinate): cell.value for ws in wb for row in ws.iter_rows() for cell in row}
+
+
+def test_rewriter_streams_in_small_chunks():
+    xml = (b'<sst xmlns="x"><si><t>a=1|b=2|</t></si><si/><si><r><t>b=</t></r><r><t>3</t></r></si>'
+           b'<si><t>keep &amp; me</t></si></sst>')
+    out = io.BytesIO()
+    rewriter = StringRegionRewriter("si", lambda value: update_key_in_cell(value, "b", "9", False), out, shared=True)
+    for i in range(0, len(xml), 3):
+        rewriter.feed(xml[i:i + 3])
+    rewriter.close()
+    assert rewriter.changed == 2
+    assert out.getvalue() == (b'<sst xmlns="x"><si><t xml:space="preserve">a=1|b=9|</t></si><si/>'
+                              b'<si><t xml:space="preserve">b=9|</t></si><si><t>keep &amp; me</t></si></sst>')
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_xml_engine_matches_openpyxl(temp_excel_dir, shared):
+    cells = {"A1": "a=1|b=2|c=3|", "A2": "b=7", "B1": 42, "B2": "x < y & z", "C1": "  b=spaces|", "C3": "no key"}
+    paths = []
+    for engine in ("openpyxl", "xml"):
+        file_path = os.path.join(temp_excel_dir, f"{engine}.xlsx")
+        create_dummy_excel(file_path, cell_data=cells)
+        if shared:
+            convert_to_shared_strings(file_path, rich_cell=0)
+        changed = edit_string_cells(file_path, lambda value: update_key_in_cell(value, "b", "1&2", False), engine)
+        assert changed
+        paths.append(file_path)
+    assert read_values(paths[0]) == read_values(paths[1])
+    assert read_values(paths[1])[("Sheet1", "A1")] == "a=1|b=1&2|c=3|"
+
+
+def test_xml_engine_leaves_unmatched_file_untouched(temp_excel_dir):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    before = open(file_path, "rb").read()
+    assert rewrite_string_cells(file_path, lambda value: None) == 0
+    assert open(file_path, "rb").read() == before
+    assert os.listdir(temp_excel_dir) == ["test.xlsx"]
+
+
+def test_xml_engine_copies_other_members(temp_excel_dir):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "Hello World"})
+    convert_to_shared_strings(file_path)
+    with zipfile.ZipFile(file_path) as archive:
+        before = {name: archive.read(name) for name in archive.namelist()}
+    log = DummyLog()
+    process_value_cells(file_path, "World", "Universe", log, engine="xml")
+    with zipfile.ZipFile(file_path) as archive:
+        after = {name: archive.read(name) for name in archive.namelist()}
+    assert list(after) == list(before)
+    assert [name for name in before if before[name] != after[name]] == ["xl/sharedStrings.xml"]
+    assert openpyxl.load_workbook(file_path).active["A1"].value == "Hello Universe"
+
+
+def test_may_contain(temp_excel_dir):
+    file_path = os.path.join(temp_excel_dir, "test.xlsx")
+    create_dummy_excel(file_path, cell_data={"A1": "a=1|VersionsNr=2|", "A2": "R&D"})
+    assert may_contain(file_path, ["VersionsNr="])
+    assert may_contain(file_path, ["R&D"])
+    assert not may_contain(file_path, ["Missing="])
+    convert_to_shared_strings(file_path, rich_cell=0)
+    # The rich text runs split "VersionsNr" across two <t> elements
+    with zipfile.ZipFile(file_path) as archive:
+        assert b"VersionsNr=" not in archive.read("xl/sharedStrings.xml")
+    assert may_contain(file_path, ["VersionsNr="])
+    assert not may_contain(file_path, ["Missing="])
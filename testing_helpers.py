@@ -0,0 +1,47 @@
+"""Dummy Tk widgets and workbook helpers shared by the tests."""
+import openpyxl
+
+
+# Dummy log widget to capture log messages.
+class DummyLog:
+    """A dummy log widget that stores log messages in a list."""
+    def __init__(self):
+        self.messages = []
+    def insert(self, index, text, tag=None):
+        self.messages.append(text)
+    def delete(self, start, end):
+        self.messages = []
+
+# Dummy progress bar that supports item assignment.
+class DummyProgressBar:
+    def __init__(self):
+        self.data = {}
+    def __setitem__(self, key, value):
+        self.data[key] = value
+    def __getitem__(self, key):
+        return self.data.get(key, None)
+    def grid(self):
+        pass
+    def grid_remove(self):
+        pass
+    def update_idletasks(self):
+        pass
+
+# Dummy label for percentage display.
+class DummyLabel:
+    def __init__(self):
+        self.text = ""
+    def config(self, text):
+        self.text = text
+    def grid(self):
+        pass
+
+# Helper to create a dummy Excel file with openpyxl.
+def create_dummy_excel(file_path, sheet_name="Sheet1", cell_data=None):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    if cell_data:
+        for cell, value in cell_data.items():
+            ws[cell] = value
+    wb.save(file_path)
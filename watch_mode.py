@@ -0,0 +1,266 @@
+"""
+Watch mode: apply a set of rules to every workbook that appears or changes in a folder.
+
+Exports dropped into a share all day would otherwise need a full run after
+each drop. watch_directory keeps running, learns about new or changed .xlsx
+files from the operating system and edits just those files with the same
+per-file logic as a directory run (process_file), so a dropped file is fixed
+seconds after it lands.
+
+* On Linux changes come from inotify: nothing is rescanned, and folders created
+  later are watched as they appear. Elsewhere, or with poll, the tree's sizes
+  and mtimes are compared every few seconds instead. inotify only sees writes
+  made through this machine, so a network share written by other machines
+  needs polling.
+* Events are debounced: a file is only edited once it has had no event for
+  settle seconds and its size and mtime stayed the same over that time, so a
+  copy in progress is never opened half written.
+* The file each edit saves is not edited again, and Excel's "~$" lock files
+  are ignored. Files are backed up lazily into backup_dir just before they are
+  first saved and listed in its backup manifest, as with the "lazy" backup mode.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from file_index import EXCEL_SUFFIX, scan_excel_files
+from functions import BackupManifest, batch_operation, log_file_result, process_file
+
+END = "end"
+DEFAULT_SETTLE = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+# Longest wait for events before checking for settled files and a cancel
+TICK = 0.5
+
+# inotify(7) flags
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+EVENT_BUFFER = 64 * 1024
+
+
+def is_workbook_name(name):
+    """True for .xlsx names other than Excel's "~$" lock files."""
+    return name.endswith(EXCEL_SUFFIX) and not name.startswith("~$")
+
+
+def file_state(file_path):
+    """(size, mtime_ns) of a file, or None when it is gone."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _excluded(path, exclude):
+    return exclude is not None and os.path.normcase(os.path.abspath(path)) == exclude
+
+
+class PollingWatcher:
+    """Find new or changed workbooks by comparing the tree's sizes and mtimes every interval seconds."""
+
+    kind = "polling"
+
+    def __init__(self, directory, exclude=None, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.exclude = exclude
+        self.interval = interval
+        self._states = self._scan()
+        self._next_poll = time.monotonic() + interval
+
+    def _scan(self):
+        return {entry.path: (entry.size, entry.mtime_ns) for entry in scan_excel_files(self.directory, self.exclude)
+                if is_workbook_name(os.path.basename(entry.path))}
+
+    def changes(self, timeout):
+        """Paths that are new or changed since the last call, waiting at most timeout seconds for them."""
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, delay))
+        self._next_poll = time.monotonic() + self.interval
+        states, self._states = self._states, self._scan()
+        return [path for path, state in self._states.items() if states.get(path) != state]
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Find new or changed workbooks from Linux inotify events, watching every folder of the tree."""
+
+    kind = "inotify"
+
+    def __init__(self, directory, exclude=None):
+        self.exclude = exclude
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        # Watch descriptor -> folder
+        self._folders = {}
+        try:
+            self._watch_tree(directory, strict=True)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, folder, strict=False):
+        """Watch folder and its subfolders; returns the workbooks already in them."""
+        found = []
+        for root, subfolders, names in os.walk(folder):
+            subfolders[:] = [name for name in subfolders if not _excluded(os.path.join(root, name), self.exclude)]
+            watch = self._libc.inotify_add_watch(self._fd, os.fsencode(root), WATCH_MASK)
+            if watch < 0:
+                errno = ctypes.get_errno()
+                if strict:
+                    # e.g. ENOSPC: fs.inotify.max_user_watches is used up
+                    raise OSError(errno, f"Cannot watch {root}: {os.strerror(errno)}")
+                continue
+            self._folders[watch] = root
+            found.extend(os.path.join(root, name) for name in names if is_workbook_name(name))
+        return found
+
+    def changes(self, timeout):
+        """Paths with a write, create or move event, waiting at most timeout seconds for one."""
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self._fd, EVENT_BUFFER)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: fall back to every workbook of the tree once
+                for root in set(self._folders.values()):
+                    try:
+                        paths.extend(os.path.join(root, entry) for entry in os.listdir(root) if is_workbook_name(entry))
+                    except OSError:
+                        continue
+                continue
+            if mask & IN_IGNORED:
+                self._folders.pop(watch, None)
+                continue
+            folder = self._folders.get(watch)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not _excluded(path, self.exclude):
+                    paths.extend(self._watch_tree(path))
+            elif is_workbook_name(name):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+def open_watcher(directory, exclude=None, poll=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """An InotifyWatcher where inotify is available and poll is not set, else a PollingWatcher."""
+    exclude = os.path.normcase(os.path.abspath(exclude)) if exclude else None
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory, exclude)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory, exclude, poll_interval)
+
+
+class SettleQueue:
+    """
+    Debounce file events: a noted path becomes ready once it has had no event for
+    settle seconds and its size and mtime did not change over that time.
+    """
+
+    def __init__(self, settle=DEFAULT_SETTLE, clock=time.monotonic):
+        self.settle = settle
+        self.clock = clock
+        # Path -> (time of its last event or change, its (size, mtime_ns) then)
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def note(self, path):
+        self._pending[path] = (self.clock(), file_state(path))
+
+    def ready(self):
+        """Pop and return the paths that have settled, in the order they were noted."""
+        now = self.clock()
+        settled = []
+        for path, (noted, state) in list(self._pending.items()):
+            if now - noted < self.settle:
+                continue
+            current = file_state(path)
+            if current is None:
+                del self._pending[path]
+            elif current != state:
+                # Still being written
+                self._pending[path] = (now, current)
+            else:
+                del self._pending[path]
+                settled.append(path)
+        return settled
+
+
+def watch_directory(directory, operations, log_widget, backup_dir=None, engine="openpyxl", settle=DEFAULT_SETTLE,
+                    poll=False, poll_interval=DEFAULT_POLL_INTERVAL, control=None, on_result=None):
+    """
+    Apply operations (see manifest.py) to every workbook under directory that is
+    created or changed from now on, until control (a RunControl) is cancelled.
+    Changed files are backed up lazily into backup_dir, which is not watched;
+    without one nothing is backed up. on_result is called with each FileResult.
+    Returns the number of files edited.
+    """
+    operation = batch_operation(operations)
+    watcher = open_watcher(directory, backup_dir, poll, poll_interval)
+    backups = BackupManifest(directory, backup_dir) if backup_dir else None
+    pending = SettleQueue(settle)
+    # Path -> (size, mtime_ns) of the file as the last edit left it, so its own save is not edited again
+    edited = {}
+    handled = changed = 0
+    log_widget.insert(END, f"👀 Watching {directory} for new or changed workbooks ({watcher.kind}, "
+                           f"{len(operations)} rules)...\n", "info")
+    try:
+        while control is None or control.wait():
+            for path in watcher.changes(min(TICK, settle)):
+                pending.note(path)
+            for path in pending.ready():
+                state = file_state(path)
+                if state is None or edited.get(path) == state:
+                    continue
+                result = process_file(path, operation, engine, lazy_backup=backups and backups.lazy_backup,
+                                      control=control)
+                log_file_result(result, operation, log_widget)
+                if backups:
+                    backups.add(result)
+                if on_result:
+                    on_result(result)
+                edited[path] = file_state(path)
+                handled += 1
+                changed += bool(result.changed)
+    finally:
+        watcher.close()
+    log_widget.insert(END, f"⏹ Stopped watching: {handled} files checked, {changed} changed.\n", "info")
+    return changed
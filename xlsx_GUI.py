@@ -1,14 +1,37 @@
-from tkinter import Tk, Frame, Label, Entry, Button, Text, Scrollbar, VERTICAL, END, IntVar, Checkbutton
-from tkinter.ttk import Notebook, Progressbar
+from tkinter import Tk, Frame, Label, Entry, Button, Text, Scrollbar, VERTICAL, END, IntVar, Checkbutton, Spinbox
+from tkinter.ttk import Notebook, Progressbar, Combobox
+import multiprocessing
+import os
 import threading
+import time
 from functions import (
     VERSION,
+    ENGINES,
+    BACKUP_MODES,
+    DEFAULT_CACHE_PATH,
+    DEFAULT_JOURNAL_DIR,
+    DEFAULT_BACKUP_THREADS,
+    DEFAULT_INDEX_PATH,
     start_processing,
     start_value_replacement,
+    start_batch,
+    dry_run_report_path,
     check_for_updates,
+    refresh_latest_version,
+    show_custom_warning_popup,
+    LOG_DIR,
+    clear_run_cache,
+    parse_worker_count,
+    parse_memory_budget,
+    trace_file_path,
+    RunControl,
+    toggle_pause,
+    cancel_run,
     browse_directory,
+    browse_file,
     open_github_link
 )
+from event_channel import EventChannel, WidgetPump
 from tooltip import CreateToolTip
 
 
@@ -16,6 +39,23 @@ def launch_gui():
     root = Tk()
     root.title(f"xlxs fixer - v{VERSION}")
 
+    # Every log line of the session, including those trimmed from the log widgets
+    session_log = os.path.join(LOG_DIR, time.strftime("xlsx_fixer-%Y%m%d-%H%M%S.log"))
+
+    def cache_path():
+        return DEFAULT_CACHE_PATH if use_cache_var.get() else None
+
+    def run_settings():
+        """The options of the Settings tab, as keyword arguments of the start_* functions."""
+        return dict(engine=engine_combo.get(), workers=parse_worker_count(workers_spinbox.get()),
+                    backup_mode=backup_mode_combo.get(), cache_path=cache_path(),
+                    memory_budget=parse_memory_budget(memory_budget_entry.get()),
+                    trace_path=trace_file_path() if trace_var.get() else None, journal_dir=DEFAULT_JOURNAL_DIR,
+                    resume=bool(resume_var.get()),
+                    scope_fields=(scope_sheets_entry.get(), scope_columns_entry.get(), scope_ranges_entry.get()),
+                    backup_threads=parse_worker_count(backup_threads_spinbox.get()),
+                    verify_backups=bool(verify_backups_var.get()), staged=bool(staged_var.get()))
+
     notebook = Notebook(root)
     notebook.pack(expand=True, fill="both")
 
@@ -76,6 +116,9 @@ def launch_gui():
     percent_label = Label(flat_tab, text="")
     percent_label.grid(row=6, column=0, columnspan=4, pady=5)
     percent_label.grid_remove()
+    flat_channel = EventChannel()
+    WidgetPump(root, flat_channel, log_widget, progress_bar, percent_label, session_log,
+               popup=show_custom_warning_popup).start()
 
     flat_tab.grid_columnconfigure(0, weight=1, uniform="col")
     flat_tab.grid_columnconfigure(1, weight=1, uniform="col")
@@ -83,14 +126,31 @@ def launch_gui():
     flat_tab.grid_columnconfigure(3, weight=1, uniform="col")
 
     Button(flat_tab, text="Start Processing", command=lambda: start_processing(
-        directory_entry, key_entry, value_entry, remove_key_var, log_widget, progress_bar, percent_label,
-        backup_entry_settings.get()
+        directory_entry, key_entry, value_entry, remove_key_var, flat_channel.log, flat_channel.progress,
+        flat_channel.label,
+        backup_entry_settings.get(),
+        popup=flat_channel.popup,
+        preview_path=dry_run_report_path(directory_entry.get()) if dry_run_var.get() else None,
+        key_index_path=DEFAULT_INDEX_PATH if key_index_var.get() else None,
+        control=flat_control.start(),
+        **run_settings()
     )).grid(row=7, column=1, columnspan=2, pady=10)
+    dry_run_var = IntVar()
+    Checkbutton(flat_tab, text="Dry Run", variable=dry_run_var).grid(row=7, column=3, padx=10, pady=10, sticky="w")
+    CreateToolTip(flat_tab.grid_slaves(row=7, column=3)[0],
+                  "Save nothing: list every cell that would change in a dry_run_*.csv report in the processing folder.")
 
-    Button(flat_tab, text="Check for Updates", command=check_for_updates).grid(row=8, column=1, columnspan=2, pady=5)
+    flat_control = RunControl()
+    pause_button_flat = Button(flat_tab, text="Pause", command=lambda: toggle_pause(flat_control, pause_button_flat))
+    pause_button_flat.grid(row=8, column=1, pady=5)
+    Button(flat_tab, text="Cancel", command=lambda: cancel_run(flat_control, pause_button_flat)).grid(row=8, column=2,
+                                                                                               pady=5)
+    CreateToolTip(pause_button_flat, "Pause the running job between files and sheets, or resume it.")
+
+    Button(flat_tab, text="Check for Updates", command=check_for_updates).grid(row=9, column=1, columnspan=2, pady=5)
 
     github_label = Label(flat_tab, text="View on GitHub", fg="blue", cursor="hand2")
-    github_label.grid(row=9, column=1, columnspan=2, pady=10)
+    github_label.grid(row=10, column=1, columnspan=2, pady=10)
     github_label.bind("<Button-1>", lambda e: open_github_link())
 
     # ----- Cell value fixer Tab (Dynamic Replacement) -----
@@ -121,10 +181,20 @@ def launch_gui():
     new_value_entry_value.grid(row=2, column=2, padx=10, pady=5)
     CreateToolTip(cell_tab.grid_slaves(row=2, column=0)[0], "Enter the new text to insert.")
 
+    Label(cell_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=3, column=0, padx=2, pady=5,
+                                                                                     sticky="e")
+    Label(cell_tab, text="Rename Table (optional):").grid(row=3, column=1, padx=10, pady=5, sticky="w")
+    mapping_entry = Entry(cell_tab, width=40)
+    mapping_entry.grid(row=3, column=2, padx=10, pady=5)
+    Button(cell_tab, text="Browse", command=lambda: browse_file(
+        mapping_entry, [("Rename table", "*.csv *.json"), ("All files", "*.*")])).grid(row=3, column=3, padx=10, pady=5)
+    CreateToolTip(cell_tab.grid_slaves(row=3, column=0)[0],
+                  "CSV (old,new) or JSON file of many replacements applied in one pass. Overrides the fields above.")
+
     log_widget_value = Text(cell_tab, height=10, width=70)
-    log_widget_value.grid(row=3, column=0, columnspan=4, padx=10, pady=10)
+    log_widget_value.grid(row=4, column=0, columnspan=4, padx=10, pady=10)
     scrollbar_value = Scrollbar(cell_tab, orient=VERTICAL, command=log_widget_value.yview)
-    scrollbar_value.grid(row=3, column=4, sticky="ns")
+    scrollbar_value.grid(row=4, column=4, sticky="ns")
     log_widget_value.config(yscrollcommand=scrollbar_value.set)
     log_widget_value.tag_config("error", foreground="red")
     log_widget_value.tag_config("warning", foreground="orange")
@@ -132,11 +202,13 @@ def launch_gui():
     log_widget_value.tag_config("info", foreground="blue")
 
     progress_bar_value = Progressbar(cell_tab, orient="horizontal", mode="determinate", length=400)
-    progress_bar_value.grid(row=4, column=0, columnspan=4, padx=10, pady=5)
+    progress_bar_value.grid(row=5, column=0, columnspan=4, padx=10, pady=5)
     progress_bar_value.grid_remove()
     percent_label_value = Label(cell_tab, text="")
-    percent_label_value.grid(row=5, column=0, columnspan=4, pady=5)
+    percent_label_value.grid(row=6, column=0, columnspan=4, pady=5)
     percent_label_value.grid_remove()
+    cell_channel = EventChannel()
+    WidgetPump(root, cell_channel, log_widget_value, progress_bar_value, percent_label_value, session_log).start()
 
     cell_tab.grid_columnconfigure(0, weight=1, uniform="col")
     cell_tab.grid_columnconfigure(1, weight=1, uniform="col")
@@ -147,11 +219,99 @@ def launch_gui():
         directory_entry_value.get(),
         current_value_entry.get(),
         new_value_entry_value.get(),
-        log_widget_value,
-        progress_bar_value,
-        percent_label_value,
-        backup_entry_settings.get()
-    )).start()).grid(row=6, column=1, columnspan=2, pady=10)
+        cell_channel.log,
+        cell_channel.progress,
+        cell_channel.label,
+        backup_entry_settings.get(),
+    ), kwargs=dict(
+        mapping_path=mapping_entry.get(),
+        preview_path=dry_run_report_path(directory_entry_value.get()) if dry_run_var_value.get() else None,
+        control=cell_control.start(),
+        **run_settings()
+    )).start()).grid(row=7, column=1, columnspan=2, pady=10)
+    dry_run_var_value = IntVar()
+    Checkbutton(cell_tab, text="Dry Run", variable=dry_run_var_value).grid(row=7, column=3, padx=10, pady=10, sticky="w")
+    CreateToolTip(cell_tab.grid_slaves(row=7, column=3)[0],
+                  "Save nothing: list every cell that would change in a dry_run_*.csv report in the processing folder.")
+
+    cell_control = RunControl()
+    pause_button_cell = Button(cell_tab, text="Pause", command=lambda: toggle_pause(cell_control, pause_button_cell))
+    pause_button_cell.grid(row=8, column=1, pady=5)
+    Button(cell_tab, text="Cancel", command=lambda: cancel_run(cell_control, pause_button_cell)).grid(row=8, column=2,
+                                                                                               pady=5)
+    CreateToolTip(pause_button_cell, "Pause the running job between files and sheets, or resume it.")
+
+    # ----- Batch Tab (Manifest of many edits in one pass) -----
+    batch_tab = Frame(notebook)
+    notebook.add(batch_tab, text="Batch")
+
+    Label(batch_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=0, column=0, padx=2, pady=5,
+                                                                                      sticky="e")
+    Label(batch_tab, text="Select Processing Directory:").grid(row=0, column=1, padx=10, pady=5, sticky="w")
+    directory_entry_batch = Entry(batch_tab, width=40)
+    directory_entry_batch.grid(row=0, column=2, padx=10, pady=5)
+    Button(batch_tab, text="Browse", command=lambda: browse_directory(directory_entry_batch)).grid(row=0, column=3,
+                                                                                                  padx=10, pady=5)
+    CreateToolTip(batch_tab.grid_slaves(row=0, column=0)[0],
+                  "Choose the folder containing the Excel files to process.")
+
+    Label(batch_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=1, column=0, padx=2, pady=5,
+                                                                                      sticky="e")
+    Label(batch_tab, text="Manifest File:").grid(row=1, column=1, padx=10, pady=5, sticky="w")
+    manifest_entry = Entry(batch_tab, width=40)
+    manifest_entry.grid(row=1, column=2, padx=10, pady=5)
+    Button(batch_tab, text="Browse", command=lambda: browse_file(
+        manifest_entry, [("Manifest", "*.csv *.json"), ("All files", "*.*")])).grid(row=1, column=3, padx=10, pady=5)
+    CreateToolTip(batch_tab.grid_slaves(row=1, column=0)[0],
+                  "CSV (action,key,value,old,new) or JSON list of set / remove / replace operations.")
+
+    log_widget_batch = Text(batch_tab, height=10, width=70)
+    log_widget_batch.grid(row=2, column=0, columnspan=4, padx=10, pady=10)
+    scrollbar_batch = Scrollbar(batch_tab, orient=VERTICAL, command=log_widget_batch.yview)
+    scrollbar_batch.grid(row=2, column=4, sticky="ns")
+    log_widget_batch.config(yscrollcommand=scrollbar_batch.set)
+    log_widget_batch.tag_config("error", foreground="red")
+    log_widget_batch.tag_config("warning", foreground="orange")
+    log_widget_batch.tag_config("success", foreground="green")
+    log_widget_batch.tag_config("info", foreground="blue")
+
+    progress_bar_batch = Progressbar(batch_tab, orient="horizontal", mode="determinate", length=400)
+    progress_bar_batch.grid(row=3, column=0, columnspan=4, padx=10, pady=5)
+    progress_bar_batch.grid_remove()
+    percent_label_batch = Label(batch_tab, text="")
+    percent_label_batch.grid(row=4, column=0, columnspan=4, pady=5)
+    percent_label_batch.grid_remove()
+    batch_channel = EventChannel()
+    WidgetPump(root, batch_channel, log_widget_batch, progress_bar_batch, percent_label_batch, session_log).start()
+
+    batch_tab.grid_columnconfigure(0, weight=1, uniform="col")
+    batch_tab.grid_columnconfigure(1, weight=1, uniform="col")
+    batch_tab.grid_columnconfigure(2, weight=1, uniform="col")
+    batch_tab.grid_columnconfigure(3, weight=1, uniform="col")
+
+    Button(batch_tab, text="Run Manifest", command=lambda: threading.Thread(target=start_batch, args=(
+        directory_entry_batch.get(),
+        manifest_entry.get(),
+        batch_channel.log,
+        batch_channel.progress,
+        batch_channel.label,
+        backup_entry_settings.get(),
+    ), kwargs=dict(
+        preview_path=dry_run_report_path(directory_entry_batch.get()) if dry_run_var_batch.get() else None,
+        control=batch_control.start(),
+        **run_settings()
+    )).start()).grid(row=5, column=1, columnspan=2, pady=10)
+    dry_run_var_batch = IntVar()
+    Checkbutton(batch_tab, text="Dry Run", variable=dry_run_var_batch).grid(row=5, column=3, padx=10, pady=10, sticky="w")
+    CreateToolTip(batch_tab.grid_slaves(row=5, column=3)[0],
+                  "Save nothing: list every cell that would change in a dry_run_*.csv report in the processing folder.")
+
+    batch_control = RunControl()
+    pause_button_batch = Button(batch_tab, text="Pause", command=lambda: toggle_pause(batch_control, pause_button_batch))
+    pause_button_batch.grid(row=6, column=1, pady=5)
+    Button(batch_tab, text="Cancel", command=lambda: cancel_run(batch_control, pause_button_batch)).grid(row=6, column=2,
+                                                                                               pady=5)
+    CreateToolTip(pause_button_batch, "Pause the running job between files and sheets, or resume it.")
 
     # ----- Settings Tab (Backup, Check Updates, GitHub) -----
     settings_tab = Frame(notebook)
@@ -168,6 +328,134 @@ def launch_gui():
     CreateToolTip(settings_tab.grid_slaves(row=0, column=0)[0],
                   "Choose the folder where backup copies of your Excel files will be stored.")
 
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=3, column=0, padx=2,
+                                                                                         pady=5, sticky="e")
+    Label(settings_tab, text="Processing Engine:").grid(row=3, column=1, padx=10, pady=5, sticky="w")
+    engine_combo = Combobox(settings_tab, values=ENGINES, state="readonly", width=37)
+    engine_combo.set(ENGINES[0])
+    engine_combo.grid(row=3, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=3, column=0)[0],
+                  "openpyxl loads every workbook; xml streams only the string cells and is much faster on large files.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=4, column=0, padx=2,
+                                                                                         pady=5, sticky="e")
+    Label(settings_tab, text="Worker Processes:").grid(row=4, column=1, padx=10, pady=5, sticky="w")
+    workers_spinbox = Spinbox(settings_tab, from_=1, to=os.cpu_count() or 1, width=38)
+    workers_spinbox.grid(row=4, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=4, column=0)[0],
+                  "Number of files processed in parallel. 1 processes files one after another.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=5, column=0, padx=2,
+                                                                                         pady=5, sticky="e")
+    Label(settings_tab, text="Backup Mode:").grid(row=5, column=1, padx=10, pady=5, sticky="w")
+    backup_mode_combo = Combobox(settings_tab, values=BACKUP_MODES, state="readonly", width=37)
+    backup_mode_combo.set(BACKUP_MODES[0])
+    backup_mode_combo.grid(row=5, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=5, column=0)[0],
+                  "copy duplicates every file; snapshot hard-links or reflinks them, so backups are instant and "
+                  "take no extra space until a file is edited; lazy backs up only the files a run changes, "
+                  "right before they are saved, and lists them in backup_manifest.csv.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=6, column=0, padx=2,
+                                                                                         pady=5, sticky="e")
+    Label(settings_tab, text="Skip Unchanged Files:").grid(row=6, column=1, padx=10, pady=5, sticky="w")
+    use_cache_var = IntVar()
+    Checkbutton(settings_tab, variable=use_cache_var).grid(row=6, column=2, padx=10, pady=5, sticky="w")
+    Button(settings_tab, text="Clear Cache", command=clear_run_cache).grid(row=6, column=3, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=6, column=0)[0],
+                  "Remember files an operation left unchanged and skip them when the same operation runs again "
+                  "on the unchanged file.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=7, column=0, padx=2,
+                                                                                         pady=5, sticky="e")
+    Label(settings_tab, text="Memory Budget:").grid(row=7, column=1, padx=10, pady=5, sticky="w")
+    memory_budget_entry = Entry(settings_tab, width=40)
+    memory_budget_entry.grid(row=7, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=7, column=0)[0],
+                  "Memory a run may use, e.g. 4G. Workbooks too large for openpyxl within it are streamed with "
+                  "the xml engine, and fewer large files are processed in parallel. Leave empty for no limit.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=8, column=0, padx=2,
+                                                                                         pady=5, sticky="e")
+    Label(settings_tab, text="Record Timings:").grid(row=8, column=1, padx=10, pady=5, sticky="w")
+    trace_var = IntVar()
+    Checkbutton(settings_tab, variable=trace_var).grid(row=8, column=2, padx=10, pady=5, sticky="w")
+    CreateToolTip(settings_tab.grid_slaves(row=8, column=0)[0],
+                  "Log how long each stage (walk, backup, load, scan, modify, save) took and write a JSON trace of "
+                  "every file to the logs folder in ~/.xlsx_fixer.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=9, column=0, padx=2,
+                                                                                         pady=5, sticky="e")
+    Label(settings_tab, text="Resume Interrupted Runs:").grid(row=9, column=1, padx=10, pady=5, sticky="w")
+    resume_var = IntVar()
+    Checkbutton(settings_tab, variable=resume_var).grid(row=9, column=2, padx=10, pady=5, sticky="w")
+    CreateToolTip(settings_tab.grid_slaves(row=9, column=0)[0],
+                  "Every run journals the files it has finished. If a run was interrupted, running the same operation "
+                  "on the same folder with this ticked skips those files and keeps their backups.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=10, column=0, padx=2,
+                                                                                          pady=5, sticky="e")
+    Label(settings_tab, text="Only Sheets:").grid(row=10, column=1, padx=10, pady=5, sticky="w")
+    scope_sheets_entry = Entry(settings_tab, width=40)
+    scope_sheets_entry.grid(row=10, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=10, column=0)[0],
+                  "Comma-separated sheet names to edit; * and ? match any text, e.g. Config, Data*. "
+                  "Leave empty for all sheets.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=11, column=0, padx=2,
+                                                                                          pady=5, sticky="e")
+    Label(settings_tab, text="Only Columns:").grid(row=11, column=1, padx=10, pady=5, sticky="w")
+    scope_columns_entry = Entry(settings_tab, width=40)
+    scope_columns_entry.grid(row=11, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=11, column=0)[0],
+                  "Comma-separated column letters or header texts from row 1, e.g. B, Metadata. A header that "
+                  "looks like column letters goes in quotes. Leave empty for all columns.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=12, column=0, padx=2,
+                                                                                          pady=5, sticky="e")
+    Label(settings_tab, text="Only Ranges:").grid(row=12, column=1, padx=10, pady=5, sticky="w")
+    scope_ranges_entry = Entry(settings_tab, width=40)
+    scope_ranges_entry.grid(row=12, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=12, column=0)[0],
+                  "Comma-separated A1 ranges, e.g. B2:B500, 2:100. Leave empty for the whole sheet.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=13, column=0, padx=2,
+                                                                                          pady=5, sticky="e")
+    Label(settings_tab, text="Backup Threads:").grid(row=13, column=1, padx=10, pady=5, sticky="w")
+    backup_threads_spinbox = Spinbox(settings_tab, from_=1, to=32, width=38)
+    backup_threads_spinbox.delete(0, END)
+    backup_threads_spinbox.insert(0, DEFAULT_BACKUP_THREADS)
+    backup_threads_spinbox.grid(row=13, column=2, padx=10, pady=5)
+    CreateToolTip(settings_tab.grid_slaves(row=13, column=0)[0],
+                  "Number of files backed up at once. Files are edited as soon as their own backup is done, and "
+                  "backups that already match their file are not copied again.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=14, column=0, padx=2,
+                                                                                          pady=5, sticky="e")
+    Label(settings_tab, text="Verify Backups:").grid(row=14, column=1, padx=10, pady=5, sticky="w")
+    verify_backups_var = IntVar()
+    Checkbutton(settings_tab, variable=verify_backups_var).grid(row=14, column=2, padx=10, pady=5, sticky="w")
+    CreateToolTip(settings_tab.grid_slaves(row=14, column=0)[0],
+                  "Compare every new backup with its file. A file whose backup does not match is left unchanged.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=15, column=0, padx=2,
+                                                                                          pady=5, sticky="e")
+    Label(settings_tab, text="Use Key Index:").grid(row=15, column=1, padx=10, pady=5, sticky="w")
+    key_index_var = IntVar()
+    Checkbutton(settings_tab, variable=key_index_var).grid(row=15, column=2, padx=10, pady=5, sticky="w")
+    CreateToolTip(settings_tab.grid_slaves(row=15, column=0)[0],
+                  "Flat file fixer: keep an index of the keys in every file (in ~/.xlsx_fixer) and only back up and "
+                  "open the files that hold the key. Only files changed since the last run are read again.")
+
+    Label(settings_tab, text="?", bg="blue", fg="white", font=("Arial", 8, "bold")).grid(row=16, column=0, padx=2,
+                                                                                          pady=5, sticky="e")
+    Label(settings_tab, text="Staged Pipeline:").grid(row=16, column=1, padx=10, pady=5, sticky="w")
+    staged_var = IntVar()
+    Checkbutton(settings_tab, variable=staged_var).grid(row=16, column=2, padx=10, pady=5, sticky="w")
+    CreateToolTip(settings_tab.grid_slaves(row=16, column=0)[0],
+                  "With one worker, read the next files and save edited ones while a file is edited. Helps most "
+                  "on network shares; the log shows how busy reading, editing and writing were.")
+
     settings_tab.grid_columnconfigure(0, weight=1, uniform="col")
     settings_tab.grid_columnconfigure(1, weight=1, uniform="col")
     settings_tab.grid_columnconfigure(2, weight=1, uniform="col")
@@ -179,8 +467,21 @@ def launch_gui():
     github_label_settings.grid(row=2, column=1, columnspan=2, pady=10)
     github_label_settings.bind("<Button-1>", lambda e: open_github_link())
 
+    # Ask GitHub for the latest version off the Tk thread; the window shows the cached one meanwhile
+    latest = []
+    threading.Thread(target=lambda: latest.append(refresh_latest_version()), daemon=True).start()
+
+    def show_latest_version():
+        if not latest:
+            root.after(500, show_latest_version)
+        elif latest[0] != VERSION:
+            root.title(f"xlxs fixer - v{latest[0]}")
+            log_widget.insert(END, f"🛠 Version: {latest[0]}\n", "info")
+
+    root.after(500, show_latest_version)
     root.mainloop()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     launch_gui()
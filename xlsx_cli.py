@@ -0,0 +1,387 @@
+"""
+Command line entry point for running the fixer without a display.
+
+    python xlsx_cli.py set DIRECTORY KEY VALUE
+    python xlsx_cli.py remove DIRECTORY KEY
+    python xlsx_cli.py replace DIRECTORY OLD NEW
+    python xlsx_cli.py replace DIRECTORY --mapping renames.csv
+    python xlsx_cli.py batch DIRECTORY manifest.csv
+    python xlsx_cli.py set DIRECTORY KEY VALUE --dry-run changes.csv
+    python xlsx_cli.py set DIRECTORY KEY VALUE --sheets Config --columns B
+    python xlsx_cli.py watch DIRECTORY rules.csv
+    python xlsx_cli.py set DIRECTORY KEY VALUE --shard 2/8
+    python xlsx_cli.py merge shard-*-of-8.jsonl --report merged.json
+
+The same directory drivers as the GUI do the work; the log goes to stderr. With
+--json every processed file is written to stdout as one JSON object per line,
+followed by a summary line with the throughput of the run. The first Ctrl+C
+cancels the run cleanly (exit code 130), a second one stops it at once. watch
+keeps running and applies a manifest of rules to every workbook dropped into
+or changed in the directory (see watch_mode) until it is stopped with Ctrl+C.
+With --shard only one shard of the tree is processed and its results are
+written to a file; merge combines the files of all shards (see shards).
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+
+from functions import (
+    ENGINES,
+    BACKUP_MODES,
+    DEFAULT_CACHE_PATH,
+    DEFAULT_JOURNAL_DIR,
+    DEFAULT_BACKUP_THREADS,
+    mapping_operation,
+    key_not_found,
+    narrow_to_key,
+    resolve_backup_dir,
+    prepare_backup,
+    process_excel_files,
+    process_value_in_directory,
+    process_batch_in_directory,
+)
+from manifest import load_manifest, load_mapping
+from file_index import FileIndex
+from key_index import DEFAULT_INDEX_PATH
+from memory_budget import parse_size
+from run_control import RunControl
+from scope import parse_scope
+from run_trace import RunTrace
+from staged_pipeline import DEFAULT_DEPTH, DEFAULT_MAX_BYTES, StagedPipeline
+from shards import SHARD_METHODS, default_results_path, log_merge, merge_shards, parse_shard
+from watch_mode import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE, watch_directory
+
+
+class ConsoleLog:
+    """Stands in for the GUI log Text widget and writes the log lines to a stream."""
+
+    def __init__(self, stream=None, quiet=False):
+        self.stream = stream
+        self.quiet = quiet
+
+    def insert(self, index, text, tag=None):
+        if not self.quiet or tag == "error":
+            stream = self.stream or sys.stderr
+            stream.write(text)
+            stream.flush()
+
+    def delete(self, *args):
+        pass
+
+
+class ConsoleProgress:
+    """Stands in for the GUI progress bar and percent label."""
+
+    def __init__(self, stream=None, show=False):
+        self.stream = stream
+        self.show = show
+        self.options = {}
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def __getitem__(self, key):
+        return self.options[key]
+
+    def config(self, text=""):
+        if self.show and text:
+            stream = self.stream or sys.stderr
+            stream.write(f"\r{text}")
+            stream.flush()
+
+    def grid(self):
+        pass
+
+    def update_idletasks(self):
+        pass
+
+
+class Throughput:
+    """
+    Collect FileResults and report files/s, MB/s and changed cells/s of a run.
+    MB/s counts only the files that were processed: files the cache, the journal
+    or the pre-scan let the run skip, and files stopped by a cancel, are not read.
+    """
+
+    def __init__(self, output=None):
+        self.output = output
+        self.started = time.perf_counter()
+        self.files = 0
+        self.processed = 0
+        self.changed = 0
+        self.errors = 0
+        self.bytes = 0
+        self.cells = 0
+        self.peak_rss = 0
+        # Filled by scoped runs only (see FileResult.coverage)
+        self.cells_scanned = None
+        self.sheets_skipped = None
+
+    def add(self, result):
+        try:
+            size = os.path.getsize(result.path)
+        except OSError:
+            size = 0
+        self.files += 1
+        if not (result.cached or result.resumed or result.skipped or result.cancelled):
+            self.processed += 1
+            self.bytes += size
+            # Files resumed from a journal report the cells the interrupted run changed
+            self.cells += result.cells
+        self.changed += bool(result.changed)
+        self.errors += bool(result.error)
+        self.peak_rss = max(self.peak_rss, result.peak_rss or 0)
+        if result.coverage:
+            self.cells_scanned = (self.cells_scanned or 0) + result.coverage[2]
+            self.sheets_skipped = (self.sheets_skipped or 0) + result.coverage[1]
+        if self.output:
+            self.output.write(json.dumps({
+                "path": result.path, "changed": result.changed, "cells": result.cells, "error": result.error,
+                "skipped": result.skipped, "cached": result.cached, "backup": result.backup,
+                "seconds": round(result.seconds, 6), "bytes": size, "engine": result.engine,
+                "peak_rss": result.peak_rss,
+            }) + "\n")
+            self.output.flush()
+
+    def summary(self):
+        seconds = time.perf_counter() - self.started
+        rate = 1 / seconds if seconds > 0 else 0.0
+        return {
+            "files": self.files, "processed": self.processed, "changed": self.changed, "errors": self.errors,
+            "cells": self.cells, "bytes": self.bytes, "seconds": round(seconds, 3), "peak_rss": self.peak_rss or None,
+            "cells_scanned": self.cells_scanned, "sheets_skipped": self.sheets_skipped,
+            "files_per_second": round(self.files * rate, 2),
+            "mb_per_second": round(self.bytes / 1e6 * rate, 2),
+            "changed_cells_per_second": round(self.cells * rate, 2),
+        }
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--engine", choices=ENGINES, default=ENGINES[0])
+    common.add_argument("--workers", type=int, default=1, help="worker processes (default: 1)")
+    common.add_argument("--no-prescan", dest="prescan", action="store_false",
+                        help="open every workbook instead of skipping files that cannot match")
+    common.add_argument("--backup-dir", default="", help="backup folder (default: DIRECTORY/Backup)")
+    common.add_argument("--backup-mode", choices=BACKUP_MODES + ("none",), default=BACKUP_MODES[0])
+    common.add_argument("--backup-threads", type=int, default=DEFAULT_BACKUP_THREADS, metavar="N",
+                        help="files backed up at once (default: %(default)s)")
+    common.add_argument("--verify-backups", action="store_true",
+                        help="compare every new backup with its file by hash; files that fail are left unchanged")
+    common.add_argument("--pipeline", action="store_true",
+                        help="with one worker, read the next files and save edited ones while a file is edited")
+    common.add_argument("--pipeline-depth", type=int, default=DEFAULT_DEPTH, metavar="N",
+                        help="with --pipeline, files read ahead and edited files waiting to be saved "
+                             "(default: %(default)s)")
+    common.add_argument("--pipeline-memory", type=parse_size, default=DEFAULT_MAX_BYTES, metavar="SIZE",
+                        help="with --pipeline, most file data held in memory at once (default: 256M)")
+    common.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, default=None, metavar="PATH",
+                        help="skip files left unchanged by an identical earlier run (default cache: %(const)s)")
+    common.add_argument("--memory-budget", type=parse_size, metavar="SIZE",
+                        help="e.g. 4G: stream files too large for openpyxl and limit how many run at once")
+    common.add_argument("--sheets", default="", metavar="GLOBS",
+                        help="only edit these sheets, comma-separated names or globs (e.g. 'Config,Data*')")
+    common.add_argument("--columns", default="", metavar="COLUMNS",
+                        help="only edit these columns, comma-separated letters or row 1 headers (e.g. 'B,Metadata')")
+    common.add_argument("--range", dest="ranges", default="", metavar="RANGES",
+                        help="only edit these comma-separated A1 ranges (e.g. 'B2:B500,2:100')")
+    common.add_argument("--shard", metavar="I/N",
+                        help="only process shard I of N of the tree, e.g. 2/8, and write its results for merge")
+    common.add_argument("--shard-by", choices=SHARD_METHODS, default=SHARD_METHODS[0],
+                        help="split the tree by path hash or into shards of equal size (default: %(default)s)")
+    common.add_argument("--shard-results", metavar="PATH",
+                        help="result file of the shard (default: shard-I-of-N.jsonl)")
+    common.add_argument("--resume", action="store_true",
+                        help="skip the files an interrupted run of the same operation already finished")
+    common.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="run journals (default: %(default)s)")
+    common.add_argument("--trace", metavar="PATH", help="write the time of every stage of every file to a JSON trace")
+    common.add_argument("--profile-slowest", type=int, default=0, metavar="N",
+                        help="with --trace, keep cProfile profiles of the N slowest files next to the trace")
+    common.add_argument("--dry-run", metavar="REPORT",
+                        help="save nothing; write every cell that would change to REPORT (.csv or .jsonl)")
+    common.add_argument("--json", action="store_true", help="write one JSON line per file and a summary to stdout")
+    common.add_argument("--progress", action="store_true", help="show the percentage done on stderr")
+    common.add_argument("-q", "--quiet", action="store_true", help="only log errors")
+
+    parser = argparse.ArgumentParser(description="Edit the cells of every .xlsx file in a directory tree.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    set_parser = commands.add_parser("set", parents=[common], help="set a key of pipe-separated cells")
+    set_parser.add_argument("directory")
+    set_parser.add_argument("key")
+    set_parser.add_argument("value")
+    remove_parser = commands.add_parser("remove", parents=[common], help="remove a key of pipe-separated cells")
+    remove_parser.add_argument("directory")
+    remove_parser.add_argument("key")
+    for keyed_parser in (set_parser, remove_parser):
+        keyed_parser.add_argument("--key-index", nargs="?", const=DEFAULT_INDEX_PATH, default=None, metavar="PATH",
+                                  help="only open the files a key index lists for KEY, refreshing it first "
+                                       "(default index: %(const)s; see key_index.py)")
+    replace_parser = commands.add_parser("replace", parents=[common], help="replace text in every cell")
+    replace_parser.add_argument("directory")
+    replace_parser.add_argument("old", nargs="?", default="")
+    replace_parser.add_argument("new", nargs="?", default="")
+    replace_parser.add_argument("--mapping", help="CSV (old,new) or JSON rename table applied in one pass")
+    batch_parser = commands.add_parser("batch", parents=[common], help="apply a manifest of edits in one pass")
+    batch_parser.add_argument("directory")
+    batch_parser.add_argument("manifest")
+    watch_parser = commands.add_parser("watch", help="apply a manifest to every new or changed workbook until Ctrl+C")
+    watch_parser.add_argument("directory")
+    watch_parser.add_argument("manifest", help="the rules, a manifest as for batch")
+    watch_parser.add_argument("--engine", choices=ENGINES, default=ENGINES[0])
+    watch_parser.add_argument("--backup-dir", default="", help="backup folder (default: DIRECTORY/Backup)")
+    watch_parser.add_argument("--no-backup", dest="backup", action="store_false",
+                              help="do not back up files before they are changed")
+    watch_parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE, metavar="SECONDS",
+                              help="edit a file once it has not changed for this long (default: %(default)s)")
+    watch_parser.add_argument("--poll", nargs="?", type=float, const=DEFAULT_POLL_INTERVAL, default=None,
+                              metavar="SECONDS", help="look for changes every SECONDS instead of using inotify "
+                                                      "(needed for shares written by other machines; "
+                                                      "default interval: %(const)s)")
+    watch_parser.add_argument("-q", "--quiet", action="store_true", help="only log errors")
+    merge_parser = commands.add_parser("merge", help="combine the result files of the shards of a run")
+    merge_parser.add_argument("results", nargs="+", help="the result files written with --shard")
+    merge_parser.add_argument("--report", metavar="PATH", help="also write the merged report to PATH as JSON")
+    merge_parser.add_argument("--json", action="store_true", help="write the merged report to stdout")
+    merge_parser.add_argument("-q", "--quiet", action="store_true", help="only log errors")
+    return parser
+
+
+def cancel_on_interrupt(control, log):
+    """Make the first Ctrl+C cancel the run before the next file or sheet; a second one interrupts at once."""
+    def interrupt(signum, frame):
+        log.insert(None, "⏹ Cancelling: finishing the files being saved. Press Ctrl+C again to stop at once.\n", "warning")
+        control.cancel()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    return signal.signal(signal.SIGINT, interrupt)
+
+
+def watch(args, log):
+    try:
+        operations = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        log.insert(None, f"❌ Could not read {args.manifest}: {e}\n", "error")
+        return 2
+    backup_dir = resolve_backup_dir(args.directory, args.backup_dir, log) if args.backup else None
+    control = RunControl()
+    previous_handler = cancel_on_interrupt(control, log)
+    try:
+        watch_directory(args.directory, operations, log, backup_dir, args.engine, args.settle, args.poll is not None,
+                        args.poll or DEFAULT_POLL_INTERVAL, control)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+    return 0
+
+
+def merge(args, log):
+    try:
+        report = merge_shards(args.results)
+    except (OSError, ValueError, KeyError) as e:
+        log.insert(None, f"❌ Could not merge the shard results: {e}\n", "error")
+        return 2
+    log_merge(report, log)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report))
+    return 1 if report["errors"] or not report["complete"] else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    log = ConsoleLog(quiet=args.quiet)
+    if args.command == "merge":
+        return merge(args, log)
+    directory = args.directory
+    if not os.path.isdir(directory):
+        log.insert(None, f"❌ Not a directory: {directory}\n", "error")
+        return 2
+    if args.command == "watch":
+        return watch(args, log)
+    progress = ConsoleProgress(show=args.progress)
+    try:
+        if args.command == "batch":
+            operations = load_manifest(args.manifest)
+        elif args.command == "replace" and args.mapping:
+            operations = [mapping_operation(load_mapping(args.mapping))]
+        elif args.command == "replace" and not args.old:
+            log.insert(None, "❌ Give OLD and NEW or a --mapping file.\n", "error")
+            return 2
+        else:
+            operations = None
+    except (OSError, ValueError) as e:
+        log.insert(None, f"❌ Could not read {args.manifest if args.command == 'batch' else args.mapping}: {e}\n", "error")
+        return 2
+    try:
+        scope = parse_scope(args.sheets, args.columns, args.ranges)
+    except ValueError as e:
+        log.insert(None, f"❌ Invalid scope: {e}\n", "error")
+        return 2
+    try:
+        shard = parse_shard(args.shard, args.shard_by) if args.shard else None
+    except ValueError as e:
+        log.insert(None, f"❌ Invalid shard: {e}\n", "error")
+        return 2
+
+    backup_dir = resolve_backup_dir(directory, args.backup_dir, log)
+    backup_mode = "copy" if args.backup_mode == "none" else args.backup_mode
+    file_index = FileIndex(directory, backup_dir)
+    trace = RunTrace(args.trace, args.profile_slowest) if args.trace else None
+    control = RunControl()
+    previous_handler = cancel_on_interrupt(control, log)
+    backup_stage = None
+    pipeline = StagedPipeline(args.pipeline_depth, args.pipeline_memory) if args.pipeline and args.workers <= 1 else None
+    throughput = Throughput(sys.stdout if args.json else None)
+    # False when an error stopped the whole run, not just one file
+    completed = True
+    try:
+        if getattr(args, "key_index", None):
+            file_index = narrow_to_key(file_index, args.key, args.key_index, log, trace, control)
+            if control.cancelled:
+                return 130
+        if not file_index.complete or len(file_index):
+            if args.backup_mode != "none" or args.dry_run:
+                backup_stage = prepare_backup(directory, backup_dir, log, backup_mode, args.dry_run,
+                                              args.backup_threads, args.verify_backups)
+            options = dict(engine=args.engine, workers=max(1, args.workers), prescan=args.prescan,
+                           backup_mode=backup_mode, cache_path=args.cache, on_result=throughput.add,
+                           file_index=file_index, preview_path=args.dry_run, memory_budget=args.memory_budget,
+                           trace=trace, journal_dir=args.journal_dir, resume=args.resume, control=control,
+                           scope=scope, backup_stage=backup_stage, pipeline=pipeline, shard=shard,
+                           shard_results=shard and (args.shard_results or default_results_path(shard)))
+            if operations is not None:
+                completed = process_batch_in_directory(directory, operations, log, progress, progress, backup_dir,
+                                                       **options)
+            elif args.command == "replace":
+                completed = process_value_in_directory(directory, args.old, args.new, log, progress, progress,
+                                                       backup_dir, **options)
+            else:
+                remove_key = args.command == "remove"
+                completed = process_excel_files(directory, backup_dir, args.key, "" if remove_key else args.value,
+                                                remove_key, log, progress, progress, popup=False, **options)
+        else:
+            # The key index lists no file with the key: nothing to open
+            key_not_found(args.key, log, popup=False)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if trace:
+            trace.close()
+    if args.progress:
+        sys.stderr.write("\n")
+    summary = throughput.summary()
+    if args.json:
+        print(json.dumps({"summary": summary}))
+    else:
+        log.insert(None, f"ℹ {summary['files']} files ({summary['processed']} processed) in {summary['seconds']}s: "
+                         f"{summary['files_per_second']} files/s, {summary['mb_per_second']} MB/s, "
+                         f"{summary['changed_cells_per_second']} changed cells/s.\n", "info")
+    if control.cancelled:
+        return 130
+    return 1 if summary["errors"] or not completed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,637 @@
+"""
+Streaming rewrite engine for the string cells of .xlsx workbooks.
+
+Instead of loading the whole workbook with openpyxl, the .xlsx file is opened as
+a zip archive. Only the shared string table and the inline-string cells of the
+worksheets are fed through an incremental expat parser; every other byte of
+those parts, and every other member of the archive, is copied across unchanged.
+With a scope (see scope.py) only the worksheets inside it are read at all.
+"""
+import io
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+from run_trace import NULL_TIMER
+from safe_write import durable_replace
+from scope import split_reference
+
+CHUNK_SIZE = 1024 * 1024
+SPOOL_SIZE = 16 * 1024 * 1024
+
+CONTENT_TYPES = "[Content_Types].xml"
+SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+WORKSHEET_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+# Fallbacks for packages without a usable [Content_Types].xml
+SHARED_STRINGS_NAME = re.compile(r"^xl/sharedStrings\.xml$")
+WORKSHEET_NAME = re.compile(r"^xl/worksheets/[^/]+\.xml$")
+
+_TAG_PREFIX = re.compile(rb"<([\w.-]+:)?")
+_SST_START = re.compile(rb"<([\w.-]+:)?sst\b[^>]*>")
+_UNIQUE_COUNT = re.compile(rb'\buniqueCount="(\d+)"')
+
+# Raw bytes that mean the text of a part cannot be searched literally:
+# rich text runs split strings across several <t> elements, and character
+# references or openpyxl escape markers encode text differently.
+_RUN_TAG = re.compile(rb"<([\w.-]+:)?r[\s>]")
+_INEXACT_MARKERS = (b"&#", b"&quot;", b"&apos;", b"x005F_")
+
+
+def string_parts(archive):
+    """
+    Return the members of an open .xlsx archive that can hold cell strings,
+    as (member name, region tag) pairs: "si" for the shared string table and
+    "is" for the inline strings of a worksheet.
+    """
+    names = set(archive.namelist())
+    shared, sheets = [], []
+    if CONTENT_TYPES in names:
+        try:
+            types = ElementTree.fromstring(archive.read(CONTENT_TYPES))
+        except ElementTree.ParseError:
+            types = None
+        if types is not None:
+            for override in types:
+                part = override.get("PartName", "").lstrip("/")
+                if part not in names:
+                    continue
+                if override.get("ContentType") == SHARED_STRINGS_TYPE:
+                    shared.append(part)
+                elif override.get("ContentType") == WORKSHEET_TYPE:
+                    sheets.append(part)
+    if not shared and not sheets:
+        shared = [name for name in names if SHARED_STRINGS_NAME.match(name)]
+        sheets = [name for name in names if WORKSHEET_NAME.match(name)]
+    return [(name, "si") for name in sorted(shared)] + [(name, "is") for name in sorted(sheets)]
+
+
+def _local_name(tag):
+    return tag.rpartition("}")[2]
+
+
+def _read_xml(archive, name):
+    try:
+        return ElementTree.fromstring(archive.read(name))
+    except (KeyError, ElementTree.ParseError):
+        return None
+
+
+def _relationships(archive, name):
+    root = _read_xml(archive, name)
+    return [] if root is None else [element for element in root if _local_name(element.tag) == "Relationship"]
+
+
+def _resolve_target(target, base):
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(base, target))
+
+
+def sheet_parts(archive):
+    """
+    Return the worksheets of an open .xlsx archive as (sheet name, member name)
+    pairs, in workbook order. Chart sheets are left out.
+    """
+    workbook = "xl/workbook.xml"
+    for relationship in _relationships(archive, "_rels/.rels"):
+        if relationship.get("Type", "").endswith("/officeDocument"):
+            workbook = _resolve_target(relationship.get("Target", ""), "")
+    folder, base_name = posixpath.split(workbook)
+    targets = {relationship.get("Id"): _resolve_target(relationship.get("Target", ""), folder)
+               for relationship in _relationships(archive, posixpath.join(folder, "_rels", base_name + ".rels"))
+               if relationship.get("Type", "").endswith("/worksheet")}
+    names = set(archive.namelist())
+    root = _read_xml(archive, workbook)
+    parts = []
+    for element in root.iter() if root is not None else ():
+        if _local_name(element.tag) != "sheet":
+            continue
+        # The r:id attribute, whatever the prefix of its namespace
+        relationship_id = next((value for key, value in element.attrib.items() if _local_name(key) == "id"), None)
+        part = targets.get(relationship_id)
+        if part in names:
+            parts.append((element.get("name", ""), part))
+    return parts
+
+
+def escape_text(value):
+    """Escape a string for use as the text of a <t> element."""
+    return (value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            .replace("\r", "&#13;"))
+
+
+def _region_xml(prefix, region, value):
+    prefix = prefix.decode("ascii")
+    return (f'<{prefix}{region}><{prefix}t xml:space="preserve">{escape_text(value)}</{prefix}t>'
+            f'</{prefix}{region}>').encode("utf-8")
+
+
+class StringRegionRewriter:
+    """
+    Incrementally rewrite the string regions (<si> or <is> elements) of one XML part.
+
+    Bytes are fed in chunks with feed(). The text of each region is collected the
+    way openpyxl reads it (the plain <t> plus the <t> of every rich text run,
+    phonetic runs excluded) and handed to transform; regions for which transform
+    returns a new string are replaced by a plain string, everything else is
+    written to out verbatim.
+    """
+
+    def __init__(self, region, transform, out, shared=False):
+        self.region = region
+        self.transform = transform
+        self.out = out
+        self.shared = shared
+        self.changed = 0
+        self._buffer = bytearray()
+        self._base = 0
+        self._region_start = None
+        self._text = None
+        self._in_text = False
+        self._phonetic = 0
+        self._just_started = False
+        self._completed = []
+        self._parser = expat.ParserCreate(namespace_separator=" ")
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._data
+
+    def feed(self, chunk):
+        self._buffer.extend(chunk)
+        self._parser.Parse(chunk, False)
+        self._rewrite()
+
+    def close(self):
+        self._parser.Parse(b"", True)
+        self._rewrite()
+        self._write_through(self._base + len(self._buffer))
+
+    def _start(self, name, attrs):
+        self._just_started = True
+        local = name.rpartition(" ")[2]
+        if self._region_start is None:
+            if local == self.region:
+                self._region_start = self._parser.CurrentByteIndex
+                self._text = []
+        elif local == "rPh":
+            self._phonetic += 1
+        elif local == "t" and not self._phonetic:
+            self._in_text = True
+
+    def _end(self, name):
+        just_started, self._just_started = self._just_started, False
+        if self._region_start is None:
+            return
+        local = name.rpartition(" ")[2]
+        if local == self.region:
+            self._completed.append((self._region_start, self._region_end(just_started), "".join(self._text)))
+            self._region_start = None
+        elif local == "rPh":
+            self._phonetic -= 1
+        elif local == "t":
+            self._in_text = False
+
+    def _data(self, data):
+        self._just_started = False
+        if self._in_text:
+            self._text.append(data)
+
+    def _region_end(self, just_started):
+        """Absolute position just past the end tag of the element that just ended."""
+        index = self._parser.CurrentByteIndex - self._base
+        if just_started and self._buffer[index - 2:index] == b"/>":
+            # Empty element: expat reports the position just past "<si/>"
+            return self._base + index
+        return self._base + self._buffer.index(b">", index) + 1
+
+    def _updated(self, region):
+        """New text of a completed (start, end, text) region, or None to keep it."""
+        text = region[2]
+        if self.shared:
+            # openpyxl strips this escape marker when reading the shared string table
+            text = text.replace("x005F_", "")
+        return self.transform(text)
+
+    def _region_bytes(self, region, prefix, updated):
+        return _region_xml(prefix, self.region, updated)
+
+    def _rewrite(self):
+        for region in self._completed:
+            start, end = region[:2]
+            updated = self._updated(region)
+            if updated is None:
+                continue
+            self.changed += 1
+            self._write_through(start)
+            prefix = _TAG_PREFIX.match(self._buffer).group(1) or b""
+            self.out.write(self._region_bytes(region, prefix, updated))
+            del self._buffer[:end - self._base]
+            self._base = end
+        self._completed.clear()
+        if self._region_start is None:
+            # A start tag may still be incomplete at the end of the buffer
+            pending = self._buffer.rfind(b"<")
+            self._write_through(self._base + (pending if pending >= 0 else len(self._buffer)))
+        else:
+            self._write_through(self._region_start)
+
+    def _write_through(self, position):
+        size = position - self._base
+        if size > 0:
+            self.out.write(self._buffer[:size])
+            del self._buffer[:size]
+            self._base = position
+
+
+def _shared_position(text):
+    text = text.strip()
+    return int(text) if text.isdigit() else None
+
+
+class ScopedCellRewriter(StringRegionRewriter):
+    """
+    Incrementally rewrite the string cells of one worksheet part that lie inside a
+    scope (see scope.Scope).
+
+    Inline strings are handed to transform like StringRegionRewriter does. A cell
+    holding a shared string is pointed at the index shared_strings.remap returns
+    for its old one, so cells outside the scope that use the same shared string
+    keep it. The header texts of row 1 are read as they stream past, for columns
+    the scope names by header. scanned counts the string cells inside the scope.
+    """
+
+    def __init__(self, scope, transform, shared_strings, out):
+        super().__init__("is", transform, out)
+        self.scope = scope
+        self.shared_strings = shared_strings
+        self.scanned = 0
+        # Columns named by a header start below row 1, so row 1 needs no headers
+        self._area = scope.area()
+        self._headers = [] if scope.headers else None
+        self._row = 0
+        self._column = 0
+        self._cell_type = None
+        self._cell_inside = False
+        self._kind = None
+
+    def _start(self, name, attrs):
+        self._just_started = True
+        local = name.rpartition(" ")[2]
+        if self._region_start is not None:
+            if local == "rPh":
+                self._phonetic += 1
+            elif local == "t" and not self._phonetic and self._kind == "is":
+                self._in_text = True
+            return
+        if local == "row":
+            self._row = int(attrs["r"]) if attrs.get("r", "").isdigit() else self._row + 1
+            self._column = 0
+            if self._row > 1 and self._headers is not None:
+                self._area = self.scope.area(self.scope.header_columns(self._headers))
+                self._headers = None
+        elif local == "c":
+            position = split_reference(attrs.get("r", ""))
+            if position:
+                self._column, self._row = position
+            else:
+                self._column += 1
+            self._cell_type = attrs.get("t", "n")
+            self._cell_inside = self._area.contains(self._column, self._row)
+        elif (local, self._cell_type) in (("is", "inlineStr"), ("v", "s")):
+            if self._cell_inside or (self._headers is not None and self._row == 1):
+                self._kind = local
+                self._region_start = self._parser.CurrentByteIndex
+                self._text = []
+                self._in_text = local == "v"
+
+    def _end(self, name):
+        just_started, self._just_started = self._just_started, False
+        if self._region_start is None:
+            return
+        local = name.rpartition(" ")[2]
+        if local == self._kind:
+            text = "".join(self._text)
+            if self._headers is not None and self._row == 1:
+                position = _shared_position(text) if self._kind == "v" else None
+                self._headers.append((self._column, self.shared_strings.text(position) if position is not None
+                                      else text))
+            self._completed.append((self._region_start, self._region_end(just_started), text, self._kind,
+                                    self._cell_inside))
+            self._region_start = None
+            self._in_text = False
+        elif local == "rPh":
+            self._phonetic -= 1
+        elif local == "t":
+            self._in_text = False
+
+    def _updated(self, region):
+        _, _, text, kind, inside = region
+        if not inside:
+            return None
+        self.scanned += 1
+        if kind == "is":
+            return self.transform(text)
+        position = _shared_position(text)
+        index = self.shared_strings.remap(position) if position is not None else None
+        return None if index is None else str(index)
+
+    def _region_bytes(self, region, prefix, updated):
+        if region[3] == "is":
+            return super()._region_bytes(region, prefix, updated)
+        prefix = prefix.decode("ascii")
+        return f"<{prefix}v>{updated}</{prefix}v>".encode("ascii")
+
+
+class SharedStrings:
+    """
+    The shared string table of a package, read on first use, and the strings
+    transform added to it for the cells of a scoped rewrite.
+    """
+
+    def __init__(self, archive, name, transform):
+        self.archive = archive
+        self.name = name
+        self.transform = transform
+        # Rewritten string -> its index at the end of the table
+        self.added = {}
+        self._texts = None
+        self._remapped = {}
+
+    def text(self, index):
+        if self._texts is None:
+            self._texts = []
+            if self.name:
+                _feed(self.archive, self.name, StringRegionRewriter("si", lambda text: self._texts.append(text),
+                                                                   _NullSink(), shared=True))
+        return self._texts[index] if index < len(self._texts) else None
+
+    def remap(self, index):
+        """Index of the rewritten shared string index, or None when transform leaves it alone."""
+        if index not in self._remapped:
+            text = self.text(index)
+            updated = self.transform(text) if text is not None else None
+            self._remapped[index] = (None if updated is None
+                                     else self.added.setdefault(updated, len(self._texts) + len(self.added)))
+        return self._remapped[index]
+
+    def write(self, out):
+        """Copy the table to out with the added strings at its end."""
+        prefix = None
+        tail = b""
+        with self.archive.open(self.name) as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                data = tail + chunk
+                if prefix is None:
+                    match = _SST_START.search(data)
+                    if match:
+                        prefix = match.group(1) or b""
+                        start_tag = _UNIQUE_COUNT.sub(
+                            lambda count: b'uniqueCount="%d"' % (int(count.group(1)) + len(self.added)), match.group())
+                        data = data[:match.start()] + start_tag + data[match.end():]
+                # Hold back the end tag of the table
+                out.write(data[:-64])
+                tail = data[-64:]
+        end = tail.rfind(b"</")
+        if prefix is None or end < 0:
+            raise ValueError(f"Malformed shared string table: {self.name}")
+        out.write(tail[:end])
+        for text in self.added:
+            out.write(_region_xml(prefix, "si", text))
+        out.write(tail[end:])
+
+
+def _copy_info(info):
+    copy = zipfile.ZipInfo(info.filename, info.date_time)
+    copy.compress_type = info.compress_type
+    copy.create_system = info.create_system
+    copy.external_attr = info.external_attr
+    copy.comment = info.comment
+    copy.extra = info.extra
+    return copy
+
+
+def _write_archive(archive, rewritten, target_path):
+    """
+    Write a copy of archive to target_path (or a binary file object), taking the
+    members in rewritten from their spool files.
+    """
+    with zipfile.ZipFile(target_path, "w") as out:
+        for info in archive.infolist():
+            spool = rewritten.get(info.filename)
+            if spool is not None:
+                size = spool.tell()
+                spool.seek(0)
+                source = spool
+            else:
+                size = info.file_size
+                source = archive.open(info)
+            try:
+                with out.open(_copy_info(info), "w", force_zip64=size > zipfile.ZIP64_LIMIT) as target:
+                    shutil.copyfileobj(source, target, CHUNK_SIZE)
+            finally:
+                if spool is None:
+                    source.close()
+
+
+def _new_spool():
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+
+
+def _feed(archive, name, rewriter):
+    with archive.open(name) as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            rewriter.feed(chunk)
+    rewriter.close()
+
+
+def _rewrite_package(file_path, rewrite_parts, before_replace, timer, checkpoint, source=None, sink=None):
+    """
+    Call rewrite_parts(archive, rewritten) on the open package; it puts the spool
+    files of the members it rewrote into rewritten and returns the number of
+    changes. If there are any, the package is saved with those members replaced.
+    The package is read from source (a binary file object holding file_path's
+    content) when given. With sink, the new package is built in memory and
+    handed to sink as bytes instead of being saved.
+    """
+    changed = 0
+    rewritten = {}
+    temp_path = None
+    try:
+        with zipfile.ZipFile(source or file_path) as archive:
+            with timer.stage("scan"):
+                changed = rewrite_parts(archive, rewritten)
+            if changed and checkpoint:
+                checkpoint()
+            if changed and sink:
+                with timer.stage("save"):
+                    package = io.BytesIO()
+                    _write_archive(archive, rewritten, package)
+                sink(package.getvalue())
+            elif changed:
+                with timer.stage("save"):
+                    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(file_path)))
+                    os.close(fd)
+                    _write_archive(archive, rewritten, temp_path)
+        if temp_path:
+            with timer.stage("save"):
+                shutil.copymode(file_path, temp_path)
+                if before_replace:
+                    before_replace()
+                durable_replace(temp_path, file_path)
+            temp_path = None
+    finally:
+        for spool in rewritten.values():
+            spool.close()
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    return changed
+
+
+def rewrite_string_cells(file_path, transform, before_replace=None, timer=NULL_TIMER, checkpoint=None, source=None,
+                         sink=None):
+    """
+    Apply transform to every string cell of an .xlsx file without loading it into openpyxl.
+
+    transform receives the cell text and returns the new text, or None to leave the
+    cell alone. Shared strings are rewritten once per distinct string, so the return
+    value is the number of rewritten strings rather than the number of cells. The
+    file is only rewritten (through a temporary file in the same directory, synced
+    and renamed over the original, see safe_write) when at least one string changed; before_replace, if given, is called right before the
+    rewritten file replaces the original. timer (see run_trace.FileTimer) records
+    the time spent streaming the parts ("scan") and writing the new file ("save").
+    checkpoint, if given, is called before each part and before the new file is
+    written; it may raise to abandon the file unchanged (see run_control).
+    source and sink read the file from and write it to memory (see _rewrite_package).
+    """
+    def rewrite_parts(archive, rewritten):
+        changed = 0
+        for name, region in string_parts(archive):
+            if checkpoint:
+                checkpoint()
+            spool = _new_spool()
+            rewriter = StringRegionRewriter(region, transform, spool, shared=region == "si")
+            _feed(archive, name, rewriter)
+            if rewriter.changed:
+                changed += rewriter.changed
+                rewritten[name] = spool
+            else:
+                spool.close()
+        return changed
+
+    return _rewrite_package(file_path, rewrite_parts, before_replace, timer, checkpoint, source, sink)
+
+
+def rewrite_scoped_cells(file_path, transform, scope, before_replace=None, timer=NULL_TIMER, checkpoint=None,
+                         coverage=None, source=None, sink=None):
+    """
+    Like rewrite_string_cells, but only for the string cells inside scope (see scope.Scope).
+
+    The parts of worksheets outside the scope are not read at all, and the shared
+    string table only when a cell inside the scope uses it. A shared string that
+    changes is added to the end of the table and only the cells inside the scope
+    are pointed at the new one, so cells elsewhere that share it keep the old text.
+    Returns the number of changed cells. coverage, a dict, counts the "sheets" read,
+    the "sheets_skipped" and the string "cells" inside the scope.
+    """
+    def rewrite_parts(archive, rewritten):
+        shared_part = next((name for name, region in string_parts(archive) if region == "si"), None)
+        shared_strings = SharedStrings(archive, shared_part, transform)
+        changed = 0
+        for sheet_name, name in sheet_parts(archive):
+            if not scope.selects_sheet(sheet_name):
+                if coverage is not None:
+                    coverage["sheets_skipped"] += 1
+                continue
+            if checkpoint:
+                checkpoint()
+            spool = _new_spool()
+            rewriter = ScopedCellRewriter(scope, transform, shared_strings, spool)
+            _feed(archive, name, rewriter)
+            if coverage is not None:
+                coverage["sheets"] += 1
+                coverage["cells"] += rewriter.scanned
+            if rewriter.changed:
+                changed += rewriter.changed
+                rewritten[name] = spool
+            else:
+                spool.close()
+        if shared_strings.added:
+            spool = _new_spool()
+            rewritten[shared_part] = spool
+            shared_strings.write(spool)
+        return changed
+
+    return _rewrite_package(file_path, rewrite_parts, before_replace, timer, checkpoint, source, sink)
+
+
+class _Found(Exception):
+    pass
+
+
+class _NullSink:
+    def write(self, data):
+        pass
+
+
+def _part_texts_contain(archive, name, region, literals):
+    """Exact check: parse the string regions of a part and look for literals in their text."""
+    def check(text):
+        if any(literal in text for literal in literals):
+            raise _Found()
+        return None
+
+    rewriter = StringRegionRewriter(region, check, _NullSink(), shared=region == "si")
+    try:
+        _feed(archive, name, rewriter)
+    except _Found:
+        return True
+    return False
+
+
+def _scan_part(archive, name, needles):
+    """
+    Search the raw bytes of a part for needles. Returns (found, inexact) where
+    inexact tells that a miss cannot be trusted without an exact check.
+    """
+    overlap = max(len(needle) for needle in needles) + 8
+    inexact = False
+    tail = b""
+    with archive.open(name) as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            window = tail + chunk
+            if any(needle in window for needle in needles):
+                return True, inexact
+            if not inexact:
+                inexact = bool(_RUN_TAG.search(window)) or any(marker in window for marker in _INEXACT_MARKERS)
+            tail = window[-overlap:]
+    return False, inexact
+
+
+def may_contain(file_path, literals):
+    """
+    Cheap pre-scan of an .xlsx file (a path or a binary file object): return False
+    only when no string cell can contain any of literals, without building the workbook.
+
+    The raw bytes of the shared string table and worksheets are searched for the
+    XML-escaped literals. A part is only parsed when its bytes cannot be trusted
+    (rich text runs, character references, or literals spanning lines).
+    """
+    literals = [literal for literal in literals if literal]
+    if not literals:
+        return True
+    needles = [escape_text(literal).encode("utf-8") for literal in literals]
+    multiline = any("\n" in literal or "\r" in literal for literal in literals)
+    with zipfile.ZipFile(file_path) as archive:
+        for name, region in string_parts(archive):
+            found, inexact = _scan_part(archive, name, needles)
+            if found:
+                return True
+            if (inexact or multiline) and _part_texts_contain(archive, name, region, literals):
+                return True
+    return False